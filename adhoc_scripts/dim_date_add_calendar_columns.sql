@@ -0,0 +1,17 @@
+-- Adds the calendar columns introduced in 01_dim_date.sql to an existing dim_date table.
+ALTER TABLE ecommerce_dw.dim_date
+  ADD COLUMN IF NOT EXISTS day_of_week INT64,
+  ADD COLUMN IF NOT EXISTS day_name STRING,
+  ADD COLUMN IF NOT EXISTS month_name STRING,
+  ADD COLUMN IF NOT EXISTS iso_year INT64,
+  ADD COLUMN IF NOT EXISTS fiscal_year INT64,
+  ADD COLUMN IF NOT EXISTS fiscal_quarter INT64,
+  ADD COLUMN IF NOT EXISTS fiscal_month INT64,
+  ADD COLUMN IF NOT EXISTS is_holiday BOOL,
+  ADD COLUMN IF NOT EXISTS holiday_name STRING,
+  ADD COLUMN IF NOT EXISTS is_month_start BOOL,
+  ADD COLUMN IF NOT EXISTS is_month_end BOOL,
+  ADD COLUMN IF NOT EXISTS is_quarter_start BOOL,
+  ADD COLUMN IF NOT EXISTS is_quarter_end BOOL,
+  ADD COLUMN IF NOT EXISTS is_year_start BOOL,
+  ADD COLUMN IF NOT EXISTS is_year_end BOOL;
@@ -0,0 +1,96 @@
+"""Benchmark schema-driven coercion against the legacy fact_sales transform.
+
+Builds a synthetic order-items frame shaped like the psycopg2 output (ids as
+bytes, dates as objects, fulfillment_time as timedelta) and times the old
+per-cell ``apply`` transform against ``coerce_to_schema``.
+
+Usage:
+    python benchmarks/bench_coercion.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.coercion import coerce_to_schema
+
+
+def legacy_transform(df):
+    """fact_sales.transform() before the coercion module, kept verbatim for comparison."""
+    df['sales_id'] = df['sales_id'].astype(str)
+    df['order_id'] = df['order_id'].astype(str)
+    df['customer_id'] = df['customer_id'].astype(str)
+    df['product_id'] = df['product_id'].astype(str)
+    df['seller_id'] = df['seller_id'].astype(str)
+    df['date_id'] = pd.to_datetime(df['date_id'])
+    df['order_date'] = pd.to_datetime(df['order_date'])
+    df['delivery_date'] = pd.to_datetime(df['delivery_date'])
+    # Robustly decode any bytes columns to string
+    for col in df.columns:
+        if df[col].dtype == object:
+            if df[col].apply(lambda x: isinstance(x, bytes)).any():
+                df[col] = df[col].apply(lambda x: x.decode('utf-8') if isinstance(x, bytes) else x)
+    for col in df.columns:
+        if str(df[col].dtype) == 'bytes' or df[col].apply(lambda x: isinstance(x, bytes)).any():
+            df[col] = df[col].apply(lambda x: x.decode('utf-8') if isinstance(x, bytes) else str(x))
+    if 'fulfillment_time' in df:
+        if pd.api.types.is_timedelta64_dtype(df['fulfillment_time']):
+            df['fulfillment_time'] = df['fulfillment_time'].dt.days
+        else:
+            df['fulfillment_time'] = df['fulfillment_time'].astype('Int64')
+    df = df.reset_index(drop=True)
+    return df
+
+
+def make_frame(rows, seed=42):
+    rng = np.random.default_rng(seed)
+    order_dates = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365 * 24 * 3600, rows), unit='s')
+    delivery = order_dates + pd.to_timedelta(rng.integers(1, 10, rows), unit='D')
+
+    def ids(prefix, n):
+        return pd.Series([f"{prefix}{i}".encode('utf-8') for i in rng.integers(0, n, rows)], dtype=object)
+
+    return pd.DataFrame({
+        'sales_id': pd.Series([f"si{i}".encode('utf-8') for i in range(rows)], dtype=object),
+        'order_id': ids('o', rows // 3 + 1),
+        'customer_id': ids('c', 100000),
+        'product_id': ids('p', 20000),
+        'seller_id': ids('s', 2000),
+        'date_id': pd.Series(order_dates.date, dtype=object),
+        'order_date': order_dates,
+        'delivery_date': delivery,
+        'fulfillment_time': delivery - order_dates,
+        'quantity': rng.integers(1, 5, rows),
+        'unit_price': rng.uniform(1, 500, rows).round(2),
+        'total_price': rng.uniform(1, 2000, rows).round(2),
+        'order_status': ids('status', 5),
+        'payment_method': ids('method', 4),
+    })
+
+
+def time_it(label, func, df):
+    start = time.perf_counter()
+    func(df.copy())
+    elapsed = time.perf_counter() - start
+    print(f"{label:<20} {elapsed:8.3f}s  ({len(df) / elapsed:,.0f} rows/s)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fact_sales dtype coercion")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    print(f"Benchmarking {args.rows:,} fact_sales rows")
+    legacy = time_it('legacy apply loops', legacy_transform, df)
+    coerced = time_it('coerce_to_schema', lambda d: coerce_to_schema(d, 'fact_sales'), df)
+    print(f"Speedup: {legacy / coerced:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Guard the import cost of the Airflow DAG and the pipeline runner CLI.
+
+The Airflow scheduler re-parses the DAG file constantly, so everything it
+imports at module level is paid on every parse. This script runs each target
+``--repeat`` times in a fresh interpreter under ``python -X importtime`` and
+reports:
+
+- wall time (median), including interpreter startup
+- import time of the modules the target itself pulls in, excluding the
+  interpreter's own startup imports and Airflow (``--exclude``)
+- any heavy module (``--heavy``) among those imports
+
+It exits with status 1 if a target imports a heavy module or its import time
+exceeds ``--budget-ms``. The DAG is skipped if Airflow is not installed.
+
+Usage:
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --repeat 10 --budget-ms 100
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+TARGETS = {
+    'dag': [os.path.join(ROOT, 'dags', 'ecommerce_data_pipeline.py')],
+    'run_pipelines --help': [os.path.join(ROOT, 'pipelines', 'run_pipelines.py'), '--help'],
+}
+
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow', 'google.cloud.bigquery', 'pandas_gbq', 'sqlalchemy',
+                 'psycopg2', 'duckdb', 'yaml']
+
+
+def parse_importtime(stderr):
+    """Return ``[(depth, module, cumulative_us)]`` from ``-X importtime`` output."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((depth, name.strip(), int(cumulative)))
+    return imports
+
+
+def attributed_imports(imports, skip):
+    """Return ``(total_us, modules)`` of the top-level imports not in ``skip``, with their subtrees."""
+    total, modules, counted = 0, [], False
+    # Each module is listed after the modules it imported
+    for depth, name, cumulative in reversed(imports):
+        if depth == 0:
+            counted = name.split('.')[0] not in skip and name not in skip
+            if counted:
+                total += cumulative
+        if counted:
+            modules.append(name)
+    return total, modules
+
+
+def run_target(args):
+    """Run a target once; returns ``(returncode, seconds, stderr)``."""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return result.returncode, time.perf_counter() - start, result.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Guard DAG parse and CLI startup import time")
+    parser.add_argument('--targets', nargs='+', choices=sorted(TARGETS), default=list(TARGETS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=150.0,
+                        help="Largest allowed median import time of a target's own imports")
+    parser.add_argument('--heavy', nargs='*', default=HEAVY_MODULES, help="Modules a target must not import")
+    parser.add_argument('--exclude', nargs='*', default=['airflow'], help="Top-level imports not attributed")
+    args = parser.parse_args()
+
+    _, _, startup = run_target(['-c', 'pass'])
+    skip = {name for _, name, _ in parse_importtime(startup)} | set(args.exclude)
+
+    failures = []
+    print(f"{'target':<24} {'wall ms':>9} {'import ms':>10}  heavy imports")
+    for target in args.targets:
+        walls, totals, heavy = [], [], set()
+        for _ in range(args.repeat):
+            returncode, seconds, stderr = run_target(TARGETS[target])
+            if returncode != 0:
+                break
+            total, modules = attributed_imports(parse_importtime(stderr), skip)
+            walls.append(seconds)
+            totals.append(total / 1000)
+            heavy.update(m for m in modules for h in args.heavy if m == h or m.startswith(h + '.'))
+        if returncode != 0:
+            error = stderr.strip().splitlines()[-1] if stderr.strip() else f"exit status {returncode}"
+            if target == 'dag' and 'airflow' in error:
+                print(f"{target:<24} skipped: Airflow is not installed ({error})")
+                continue
+            print(f"{target:<24} FAILED: {error}")
+            failures.append(target)
+            continue
+
+        heavy_roots = sorted({m for m in heavy if not any(m.startswith(h + '.') for h in heavy)})
+        wall, total = statistics.median(walls) * 1000, statistics.median(totals)
+        print(f"{target:<24} {wall:9.1f} {total:10.1f}  {', '.join(heavy_roots) or '-'}")
+        if heavy_roots or total > args.budget_ms:
+            failures.append(target)
+
+    if failures:
+        print(f"Import-time regression in: {', '.join(failures)} (budget {args.budget_ms:.0f} ms, no heavy imports)")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""Benchmark key-range parallel extraction against a local Postgres.
+
+Seeds the benchmark database (see run_benchmarks.py), then streams the full
+extract of each pipeline with an increasing number of concurrent key-range
+queries and reports rows/sec and the speedup over the first setting (a
+single query by default). Each setting is run ``--repeat`` times after a
+warm-up read, and the fastest run counts, so all settings read from a warm
+buffer cache.
+
+Usage:
+    python benchmarks/bench_parallel_extract.py --scale 1
+    python benchmarks/bench_parallel_extract.py --skip-seed --pipelines fact_sales --parallelism 1 2 4 8 16
+    python benchmarks/bench_parallel_extract.py --skip-seed --transform
+"""
+import argparse
+import importlib
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from run_benchmarks import configure_database, seed_database
+
+PIPELINES = ['fact_sales', 'fact_cart']
+
+
+def time_extract(module, parallelism, transform):
+    """Stream a full extract; returns ``(rows, seconds)``."""
+    start = time.perf_counter()
+    rows = 0
+    for chunk in module.extract_chunks(parallelism=parallelism):
+        if transform:
+            chunk = module.transform(chunk)
+        rows += len(chunk)
+    return rows, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark key-range parallel extraction")
+    parser.add_argument('--pipelines', nargs='+', choices=PIPELINES, default=PIPELINES)
+    parser.add_argument('--parallelism', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per setting; the fastest counts")
+    parser.add_argument('--transform', action='store_true', help="Include transform() in the timed loop")
+    parser.add_argument('--scale', type=float, default=1.0, help="Scale factor to seed")
+    parser.add_argument('--skip-seed', action='store_true', help="Benchmark the database as it is")
+    parser.add_argument('--seed', type=int, default=42, help="Generator seed")
+    parser.add_argument('--host', default=os.environ.get('PGHOST', 'localhost'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PGPORT', 5432)))
+    parser.add_argument('--user', default=os.environ.get('PGUSER', 'postgres'))
+    parser.add_argument('--password', default=os.environ.get('PGPASSWORD', 'postgres'))
+    parser.add_argument('--database', default='ecommerce_bench')
+    args = parser.parse_args()
+
+    db = {'host': args.host, 'port': args.port, 'user': args.user,
+          'password': args.password, 'database': args.database}
+    if not args.skip_seed:
+        seed_database(db, args.scale, args.seed, chunk_size=100_000)
+    configure_database(db)
+
+    from common.db_utils import get_shared_engine
+    get_shared_engine(min_pool_size=max(args.parallelism))
+
+    print(f"{'pipeline':<12} {'workers':>7} {'rows':>10} {'seconds':>8} {'rows/s':>12} {'speedup':>8}")
+    for pipeline in args.pipelines:
+        module = importlib.import_module(f"pipelines.{pipeline}")
+        time_extract(module, 1, False)
+        single = None
+        for parallelism in args.parallelism:
+            rows, seconds = min((time_extract(module, parallelism, args.transform) for _ in range(args.repeat)),
+                                key=lambda result: result[1])
+            single = single or seconds
+            print(f"{pipeline:<12} {parallelism:>7} {rows:>10} {seconds:>8.2f} {rows / seconds:>12,.0f} "
+                  f"{single / seconds:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark cart-event sessionization on a synthetic event stream.
+
+Generates ``--events`` cart events for ``--customers`` customers over
+``--days`` days, ordered per customer like fact_cart's extract, and streams
+them through ``Sessionizer.assign`` in ``--chunk-size`` chunks (the extract's
+fetch size), so sessions span chunk boundaries. Generation is not timed.
+``--verify`` checks that the chunked ids equal a single pass over the first
+``--verify-events`` events.
+
+Usage:
+    python benchmarks/bench_sessionization.py --events 20000000
+    python benchmarks/bench_sessionization.py --events 1000000 --verify
+"""
+import argparse
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.sessionization import Sessionizer
+
+
+def make_events(events, customers, days, seed=42):
+    """Return customer ids and event times (ns) sorted by customer and time."""
+    rng = np.random.default_rng(seed)
+    customer = rng.integers(0, customers, events)
+    # Bursty activity: each customer's events cluster around a few visits
+    visit = (customer * 7919 + rng.integers(0, 4, events) * 37) % (days * 4) * (6 * 3600)
+    offset = rng.exponential(600, events).astype('int64')
+    event_time = (pd.Timestamp('2024-01-01').value + (visit + offset) * 10 ** 9).astype('int64')
+    order = np.lexsort((event_time, customer))
+    return customer[order], event_time[order]
+
+
+def iter_chunks(customer, event_time, chunk_size):
+    for start in range(0, len(customer), chunk_size):
+        yield pd.DataFrame({
+            'customer_id': customer[start:start + chunk_size].astype(str),
+            'event_time': pd.to_datetime(event_time[start:start + chunk_size]),
+        })
+
+
+def sessionize(chunks):
+    """Assign session ids chunk by chunk; returns ``(ids, seconds)``."""
+    sessionizer = Sessionizer('bench')
+    ids, elapsed = [], 0.0
+    for chunk in chunks:
+        start = time.perf_counter()
+        ids.append(sessionizer.assign(chunk))
+        elapsed += time.perf_counter() - start
+    return ids, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cart-event sessionization")
+    parser.add_argument('--events', type=int, default=20_000_000)
+    parser.add_argument('--customers', type=int, default=1_000_000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--chunk-size', type=int, default=50_000)
+    parser.add_argument('--verify', action='store_true', help="Compare chunked ids with a single pass")
+    parser.add_argument('--verify-events', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    customer, event_time = make_events(args.events, args.customers, args.days)
+    print(f"Sessionizing {args.events:,} events of {args.customers:,} customers in {args.chunk_size:,}-row chunks")
+    ids, elapsed = sessionize(iter_chunks(customer, event_time, args.chunk_size))
+    sessions = sum(int((chunk.ne(chunk.shift())).sum()) for chunk in ids)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{elapsed:8.2f}s  {args.events / elapsed:,.0f} events/s  ~{sessions:,} sessions  peak RSS {peak:,.0f} MB")
+
+    if args.verify:
+        n = min(args.verify_events, args.events)
+        single, _ = sessionize(iter_chunks(customer[:n], event_time[:n], n))
+        chunked, _ = sessionize(iter_chunks(customer[:n], event_time[:n], args.chunk_size))
+        same = pd.concat(chunked, ignore_index=True).equals(single[0].reset_index(drop=True))
+        print(f"Chunked ids {'match' if same else 'DIFFER from'} a single pass over {n:,} events")
+
+
+if __name__ == '__main__':
+    main()
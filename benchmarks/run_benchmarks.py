@@ -0,0 +1,361 @@
+"""End-to-end pipeline benchmarks against a local Postgres.
+
+For each scale factor the harness seeds a local Postgres database with
+project_setup/scripts/generate_data.py, then runs every pipeline's
+``extract()``, ``transform()``, ``run_dq_checks()`` and ``load()`` in a fresh
+process and records per-stage latency, rows/sec and peak RSS.
+
+``load()`` runs the pipeline's own load code, but the pipeline's sink
+(common/sinks.py) is replaced by a local one for the duration of the run, so
+nothing leaves the machine:
+
+* ``parquet`` (default): stages the chunks to Parquet exactly like a real
+  BigQuery load (common/staging.py) and stops before the load job
+* ``duckdb``: loads into a DuckDB database in the work directory with the
+  table's load strategy (common/sinks.py ``DuckDBSink``)
+* ``null``: only consumes and counts the rows
+
+Results are written as JSON to benchmarks/results/. With a baseline file
+(``--baseline``, default benchmarks/baseline.json) every pipeline whose
+rows/sec drops, or whose peak RSS grows, by more than ``--tolerance`` is
+reported as a regression and the script exits with status 1.
+
+Usage:
+    python benchmarks/run_benchmarks.py --scales 0.1 1
+    python benchmarks/run_benchmarks.py --scales 1 --skip-seed --pipelines fact_sales fact_cart
+    python benchmarks/run_benchmarks.py --scales 1 --update-baseline
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, 'project_setup', 'scripts'))
+
+RESULTS_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', 'results')
+DEFAULT_BASELINE = os.path.join(PROJECT_ROOT, 'benchmarks', 'baseline.json')
+DEFAULT_TOLERANCE = 0.2
+SQL_DIR = os.path.join(PROJECT_ROOT, 'project_setup', 'sql')
+
+PIPELINES = [
+    'dim_date',
+    'dim_customer',
+    'dim_product',
+    'dim_seller',
+    'dim_campaign',
+    'fact_sales',
+    'fact_inventory',
+    'fact_cart',
+    'fact_marketing',
+]
+
+
+# --- local sinks ---------------------------------------------------------------
+
+class NullSink:
+    """Consumes chunks and counts rows."""
+
+    name = 'null'
+
+    def __init__(self, work_dir):
+        self.rows = 0
+        self.bytes_staged = 0
+
+    def table_id(self, table):
+        return table
+
+    def load(self, chunks, table, strategy=None):
+        rows = sum(len(chunk) for chunk in chunks)
+        self.rows += rows
+        return rows
+
+
+class ParquetSink(NullSink):
+    """Stages chunks to Parquet like a real load, without the load job."""
+
+    def __init__(self, work_dir):
+        super().__init__(work_dir)
+        self.work_dir = work_dir
+
+    def load(self, chunks, table, strategy=None):
+        from common.staging import LocalStagingBackend, stage_chunks
+
+        stager = stage_chunks(chunks, table, backend=LocalStagingBackend(self.work_dir))
+        try:
+            self.rows += stager.rows
+            self.bytes_staged += stager.bytes_staged
+        finally:
+            stager.cleanup()
+        return stager.rows
+
+
+class DuckDBBenchSink(NullSink):
+    """Loads into a throwaway DuckDB database with the table's load strategy."""
+
+    name = 'duckdb'
+
+    def __init__(self, work_dir):
+        from common.sinks import DuckDBSink
+
+        super().__init__(work_dir)
+        self.sink = DuckDBSink(path=os.path.join(work_dir, 'warehouse.duckdb'))
+
+    def table_id(self, table):
+        return self.sink.table_id(table)
+
+    def load(self, chunks, table, strategy=None):
+        rows = self.sink.load(chunks, table, strategy)
+        self.rows += rows
+        return rows
+
+
+SINKS = {'null': NullSink, 'parquet': ParquetSink, 'duckdb': DuckDBBenchSink}
+
+
+# --- database ------------------------------------------------------------------
+
+def configure_database(db):
+    """Point the pipelines' shared engine at the benchmark database."""
+    from common.config import PIPELINE_CONFIG
+    from common.db_utils import dispose_shared_engine
+
+    PIPELINE_CONFIG['oltp_db'].update(db)
+    PIPELINE_CONFIG['oltp_db'].pop('sslmode', None)
+    dispose_shared_engine()
+
+
+def connect(db, database=None):
+    import psycopg2
+
+    return psycopg2.connect(host=db['host'], port=db['port'], user=db['user'],
+                            password=db['password'], database=database or db['database'])
+
+
+def seed_database(db, scale, seed, chunk_size):
+    """(Re)create the OLTP schema in the benchmark database and fill it at ``scale``."""
+    from generate_data import PostgresSink, generate_all
+    from load_data import TABLE_LOAD_ORDER
+
+    conn = connect(db, database='postgres')
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (db['database'],))
+        if not cur.fetchone():
+            cur.execute(f'CREATE DATABASE "{db["database"]}"')
+    conn.close()
+
+    conn = connect(db)
+    with conn.cursor() as cur:
+        for table in reversed(TABLE_LOAD_ORDER):
+            cur.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+        for sql_file in sorted(f for f in os.listdir(SQL_DIR) if f.endswith('.sql')):
+            with open(os.path.join(SQL_DIR, sql_file), 'r') as f:
+                cur.execute(f.read())
+    conn.commit()
+    conn.close()
+
+    start = time.perf_counter()
+    sink = PostgresSink(db)
+    rows = 0
+    try:
+        for table, df in generate_all(scale, seed=seed, chunk_size=chunk_size):
+            rows += len(df)
+            sink.write(table, df)
+    finally:
+        sink.close()
+    with connect(db) as conn, conn.cursor() as cur:
+        cur.execute("ANALYZE")
+    print(f"Seeded SF{scale:g}: {rows} rows in {time.perf_counter() - start:.1f}s")
+
+
+# --- measurement -----------------------------------------------------------------
+
+def peak_rss_mb():
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def benchmark_pipeline(pipeline, db, sink_name, work_dir):
+    """Run one pipeline's stages in this process and return its measurements."""
+    configure_database(db)
+    from common.dq_checks import run_dq_checks
+
+    module = importlib.import_module(f"pipelines.{pipeline}")
+    sink = SINKS[sink_name](work_dir)
+    module.get_sink = lambda: sink
+
+    stages = {}
+    rss_after_import = peak_rss_mb()
+
+    def timed(stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        stages[stage] = {'seconds': round(time.perf_counter() - start, 4), 'peak_rss_mb': round(peak_rss_mb(), 1)}
+        return result
+
+    df = timed('extract', module.extract)
+    rows = len(df)
+    df_t = timed('transform', module.transform, df)
+    # Every pipeline loads the warehouse table of the same name
+    timed('dq', run_dq_checks, df_t, table=pipeline)
+    timed('load', module.load, df_t)
+
+    for stage in stages.values():
+        stage['rows_per_sec'] = round(rows / stage['seconds']) if stage['seconds'] else None
+    total = sum(stage['seconds'] for stage in stages.values())
+    return {
+        'pipeline': pipeline,
+        'rows': rows,
+        'rows_loaded': sink.rows,
+        'bytes_staged': sink.bytes_staged,
+        'stages': stages,
+        'total_seconds': round(total, 4),
+        'rows_per_sec': round(rows / total) if total else None,
+        'import_rss_mb': round(rss_after_import, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def _child(pipeline, db, sink_name, work_dir, conn):
+    try:
+        conn.send(benchmark_pipeline(pipeline, db, sink_name, work_dir))
+    except Exception as e:
+        conn.send({'pipeline': pipeline, 'error': f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def run_in_subprocess(pipeline, db, sink_name, work_dir):
+    """Benchmark a pipeline in a fresh process so peak RSS is its own."""
+    ctx = multiprocessing.get_context('spawn')
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_child, args=(pipeline, db, sink_name, work_dir, child_conn))
+    process.start()
+    child_conn.close()
+    try:
+        result = parent_conn.recv()
+    except EOFError:
+        result = {'pipeline': pipeline, 'error': 'benchmark process exited without a result'}
+    process.join()
+    return result
+
+
+# --- baseline --------------------------------------------------------------------
+
+def result_key(result):
+    return f"{result['pipeline']}@sf{result['scale']:g}"
+
+
+def find_regressions(results, baseline, tolerance):
+    """Compare results with a baseline; returns a list of human-readable regressions."""
+    previous = {result_key(r): r for r in baseline.get('results', []) if 'error' not in r}
+    regressions = []
+    for result in results:
+        base = previous.get(result_key(result))
+        if base is None or 'error' in result:
+            continue
+        if base.get('rows_per_sec') and result['rows_per_sec'] < base['rows_per_sec'] * (1 - tolerance):
+            regressions.append(f"{result_key(result)}: rows/sec {result['rows_per_sec']} vs baseline {base['rows_per_sec']}")
+        if base.get('peak_rss_mb') and result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{result_key(result)}: peak RSS {result['peak_rss_mb']} MB vs baseline {base['peak_rss_mb']} MB")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def print_results(results):
+    print(f"\n{'pipeline':<16}{'scale':>7}{'rows':>11}{'extract':>9}{'transform':>10}{'dq':>8}{'load':>8}{'rows/s':>11}{'peak MB':>9}")
+    for r in results:
+        if 'error' in r:
+            print(f"{r['pipeline']:<16}{r['scale']:>7g}  ERROR {r['error']}")
+            continue
+        s = r['stages']
+        print(f"{r['pipeline']:<16}{r['scale']:>7g}{r['rows']:>11}{s['extract']['seconds']:>9.2f}{s['transform']['seconds']:>10.2f}"
+              f"{s['dq']['seconds']:>8.2f}{s['load']['seconds']:>8.2f}{r['rows_per_sec'] or 0:>11}{r['peak_rss_mb']:>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipelines against a local Postgres")
+    parser.add_argument('--scales', type=float, nargs='+', default=[0.1], help="Scale factors to seed and benchmark")
+    parser.add_argument('--pipelines', nargs='+', choices=PIPELINES, default=PIPELINES)
+    parser.add_argument('--sink', choices=sorted(SINKS), default='parquet', help="Local stand-in for the warehouse load")
+    parser.add_argument('--host', default=os.environ.get('PGHOST', 'localhost'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PGPORT', 5432)))
+    parser.add_argument('--user', default=os.environ.get('PGUSER', 'postgres'))
+    parser.add_argument('--password', default=os.environ.get('PGPASSWORD', 'postgres'))
+    parser.add_argument('--database', default='ecommerce_bench')
+    parser.add_argument('--skip-seed', action='store_true', help="Benchmark the database as it is (single scale only)")
+    parser.add_argument('--seed', type=int, default=42, help="Generator seed")
+    parser.add_argument('--chunk-size', type=int, default=100_000, help="Generator chunk size")
+    parser.add_argument('--output', help="Results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed relative slowdown or memory growth before flagging a regression")
+    parser.add_argument('--update-baseline', action='store_true', help="Write these results as the new baseline")
+    args = parser.parse_args()
+
+    if args.skip_seed and len(args.scales) > 1:
+        parser.error("--skip-seed benchmarks the existing database, so only one scale can be given")
+
+    db = {'host': args.host, 'port': args.port, 'user': args.user, 'password': args.password, 'database': args.database}
+    work_dir = os.path.join(RESULTS_DIR, 'staging')
+    results = []
+    for scale in args.scales:
+        if not args.skip_seed:
+            seed_database(db, scale, args.seed, args.chunk_size)
+        for pipeline in args.pipelines:
+            print(f"Benchmarking {pipeline} at SF{scale:g}...")
+            result = run_in_subprocess(pipeline, db, args.sink, work_dir)
+            result['scale'] = scale
+            results.append(result)
+    print_results(results)
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'sink': args.sink,
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one.")
+        return
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    regressions = find_regressions(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against baseline {baseline.get('git_commit')}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"No regressions against baseline {baseline.get('git_commit')} (tolerance {args.tolerance:.0%}).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Date-range runs of the fact pipelines, and sharded backfills of them.
+
+Every fact pipeline's ``run(start, end)`` reloads the inclusive day range
+``[start, end]``: it extracts only those days and overwrites their date
+partitions (``replace_partitions``), leaving the watermarks, snapshot and
+session state, extract cache and DQ baselines of the incremental runs alone.
+Days without source rows keep whatever the warehouse already holds.
+
+``run_pipelines.py --backfill START END`` splits a range into day or week
+shards (``split_shards``) and runs the (pipeline, shard) pairs on a process
+pool. Finished shards are recorded in a progress file under
+``<state_dir>/backfills/``, so rerunning an interrupted or failed backfill
+with the same arguments only runs the shards that have not finished.
+"""
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from common.watermarks import get_state_dir
+
+BACKFILL_DIR = 'backfills'
+RANGE_LOAD_STRATEGY = 'replace_partitions'
+SHARD_DAYS = {'day': 1, 'week': 7}
+
+# DQ checks that compare whole incremental runs, meaningless for a date range
+RUN_LEVEL_CHECKS = {'row_count_delta'}
+
+
+def day_bounds(start: date, end: date) -> Tuple[datetime, datetime]:
+    """Return ``(since, until)``: the inclusive days ``[start, end]`` as a half-open datetime range."""
+    if end < start:
+        raise ValueError(f"Date range ends before it starts: {start}..{end}")
+    since = datetime(start.year, start.month, start.day)
+    return since, datetime(end.year, end.month, end.day) + timedelta(days=1)
+
+
+def split_shards(start: date, end: date, unit: str = 'day') -> List[Tuple[date, date]]:
+    """Split ``[start, end]`` into consecutive inclusive ``(start, end)`` shards of a day or a week.
+
+    Week shards are seven days from ``start``; the last one may be shorter.
+    """
+    if unit not in SHARD_DAYS:
+        raise ValueError(f"Unknown shard unit {unit!r}; expected one of {', '.join(SHARD_DAYS)}")
+    day_bounds(start, end)
+    step = timedelta(days=SHARD_DAYS[unit])
+    shards = []
+    while start <= end:
+        shards.append((start, min(end, start + step - timedelta(days=1))))
+        start += step
+    return shards
+
+
+def range_checker(table: str):
+    """Return a DQChecker for a date-range run of ``table``, without the run-level checks."""
+    from common.dq_checks import DQChecker, load_rules
+    return DQChecker(table, rules=[r for r in load_rules(table) if r['check'] not in RUN_LEVEL_CHECKS])
+
+
+class BackfillProgress:
+    """The finished shards of one backfill, persisted after every shard.
+
+    The file is keyed by the backfill's range and shard unit, and maps each
+    pipeline to its finished shards (by first day) and their row counts.
+    """
+
+    def __init__(self, start: date, end: date, unit: str = 'day'):
+        self.path = os.path.join(get_state_dir(), BACKFILL_DIR, f"{start}_{end}_{unit}.json")
+        self._lock = threading.Lock()
+        self._done: Dict[str, Dict[str, int]] = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self._done = json.load(f)
+
+    def is_done(self, pipeline: str, shard: Tuple[date, date]) -> bool:
+        return shard[0].isoformat() in self._done.get(pipeline, {})
+
+    def mark_done(self, pipeline: str, shard: Tuple[date, date], rows: Optional[int]) -> None:
+        """Record a finished shard; the file is replaced atomically."""
+        with self._lock:
+            self._done.setdefault(pipeline, {})[shard[0].isoformat()] = rows or 0
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self._done, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+    def rows(self) -> int:
+        """Rows loaded by all finished shards."""
+        return sum(sum(shards.values()) for shards in self._done.values())
@@ -1,17 +1,419 @@
-from google.cloud import bigquery
-from google.oauth2 import service_account
+import atexit
+import threading
+import time
+import uuid
+import pandas as pd
 from common.config import PIPELINE_CONFIG
-import pandas_gbq
+from common.bq_schema import get_table_schema
+from common.staging import stage_chunks
+from common.instrumentation import record_bq_job, record_rows
+from common.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+# google-cloud-bigquery is slow to import and only needed to talk to
+# BigQuery, so the functions that do import it themselves
+WRITE_APPEND = 'WRITE_APPEND'
+WRITE_TRUNCATE = 'WRITE_TRUNCATE'
+
+_client = None
+_client_lock = threading.Lock()
 
 
 def get_bq_client():
-    credentials = service_account.Credentials.from_service_account_file(
-        PIPELINE_CONFIG['bigquery']['key_path']
-    )
-    return bigquery.Client(credentials=credentials, project=PIPELINE_CONFIG['bigquery']['project_id'])
+    """Return the process-wide BigQuery client.
+
+    The service-account key is read and the client built on first use only;
+    every later call (from any pipeline or thread) gets the same client.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from google.cloud import bigquery
+            from google.oauth2 import service_account
+            credentials = service_account.Credentials.from_service_account_file(
+                PIPELINE_CONFIG['bigquery']['key_path']
+            )
+            _client = bigquery.Client(credentials=credentials, project=PIPELINE_CONFIG['bigquery']['project_id'])
+        return _client
+
+
+def close_bq_client():
+    """Close the shared BigQuery client's HTTP session, if one was created."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+atexit.register(close_bq_client)
+
+def get_bq_schema(table):
+    """Return the BigQuery schema of a table as defined in its DDL."""
+    from google.cloud import bigquery
+    return [
+        bigquery.SchemaField(column.name, column.type, mode='NULLABLE' if column.nullable else 'REQUIRED')
+        for column in get_table_schema(table)
+    ]
+
+def load_to_bq(client, df, dataset, table, write_disposition=WRITE_APPEND):
+    return load_chunks_to_bq(client, [df], dataset, table, write_disposition=write_disposition)
+
+def load_chunks_to_bq(client, chunks, dataset, table, write_disposition=WRITE_APPEND,
+                      destination=None):
+    """Stage an iterable of DataFrame chunks as Parquet and load them in one job.
+
+    Chunks are consumed lazily and written to a single staged Parquet file
+    (see common/staging.py) using the table's schema from the DDL, so only
+    one chunk is held in memory at a time and the table gets exactly one load
+    job. Nothing is loaded if any chunk fails, so a failed run leaves the
+    table untouched. ``destination`` loads into a different table (e.g. a
+    merge staging table) while still using ``table``'s schema. Returns the
+    total number of rows loaded.
+    """
+    table_id = f"{PIPELINE_CONFIG['bigquery']['project_id']}.{dataset}.{destination or table}"
+    stager = stage_chunks(chunks, table)
+    try:
+        if stager.rows == 0:
+            return 0
+        from google.cloud import bigquery
+        job_config = bigquery.LoadJobConfig(
+            source_format=bigquery.SourceFormat.PARQUET,
+            write_disposition=write_disposition,
+            schema=get_bq_schema(table),
+        )
+        if destination is None:
+            # Keeps the table's layout when a load creates or truncates it
+            job_config.time_partitioning = get_time_partitioning(table)
+            job_config.clustering_fields = get_clustering_fields(table)
+        start = time.perf_counter()
+        job = stager.backend.load(client, stager.uri, table_id, job_config)
+        load_seconds = time.perf_counter() - start
+    finally:
+        stager.cleanup()
+    record_bq_job(job)
+    record_rows(stager.rows, stager.bytes_staged)
+    logger.info(f"Loaded {stager.rows} rows to {table_id} "
+                f"({stager.bytes_staged} bytes staged, {stager.serialize_seconds:.2f}s serializing, {load_seconds:.2f}s loading)")
+    return stager.rows
+
+
+def get_table_config(table):
+    """Return the ``tables.<table>`` section of the pipeline config (may be empty)."""
+    return (PIPELINE_CONFIG.get('tables') or {}).get(table) or {}
+
+
+PARTITION_TYPES = ('HOUR', 'DAY', 'MONTH', 'YEAR')
+_PARTITION_STEPS = {
+    'HOUR': pd.Timedelta(hours=1),
+    'DAY': pd.Timedelta(days=1),
+    'MONTH': pd.DateOffset(months=1),
+    'YEAR': pd.DateOffset(years=1),
+}
+
+
+def get_partitioning(table):
+    """Return ``(column, column_type, partition_type)`` for a partitioned table, else None.
+
+    ``tables.<table>.partition_field`` names a DATE, DATETIME or TIMESTAMP
+    column; ``partition_type`` (default DAY) is one of HOUR, DAY, MONTH, YEAR.
+    """
+    config = get_table_config(table)
+    field = config.get('partition_field')
+    if not field:
+        return None
+    partition_type = config.get('partition_type', 'DAY').upper()
+    if partition_type not in PARTITION_TYPES:
+        raise ValueError(f"Unknown partition_type for {table}: {partition_type}")
+    column_types = {column.name: column.type for column in get_table_schema(table)}
+    column_type = column_types.get(field)
+    if column_type not in ('DATE', 'DATETIME', 'TIMESTAMP'):
+        raise ValueError(f"Partition field {table}.{field} must be a DATE, DATETIME or TIMESTAMP column, got {column_type}")
+    if column_type == 'DATE' and partition_type == 'HOUR':
+        raise ValueError(f"Partition field {table}.{field} is a DATE and cannot be partitioned by HOUR")
+    return field, column_type, partition_type
+
+
+def get_time_partitioning(table):
+    """Return the table's ``bigquery.TimePartitioning`` (None if unpartitioned)."""
+    from google.cloud import bigquery
+    partitioning = get_partitioning(table)
+    if partitioning is None:
+        return None
+    field, _, partition_type = partitioning
+    return bigquery.TimePartitioning(type_=partition_type, field=field)
+
+
+def get_clustering_fields(table):
+    """Return the table's configured clustering columns (None if unclustered)."""
+    return list(get_table_config(table).get('clustering_fields') or []) or None
+
+
+def _partition_expr(column, column_type, partition_type):
+    if column_type == 'DATE' and partition_type == 'DAY':
+        return f"`{column}`"
+    return f"{column_type}_TRUNC(`{column}`, {partition_type})"
+
+
+def build_table_options_ddl(table):
+    """Return the ``PARTITION BY ... CLUSTER BY ...`` clauses configured for a table ('' if none)."""
+    clauses = []
+    partitioning = get_partitioning(table)
+    if partitioning is not None:
+        clauses.append(f"PARTITION BY {_partition_expr(*partitioning)}")
+    clustering = get_clustering_fields(table)
+    if clustering:
+        clauses.append(f"CLUSTER BY {', '.join(f'`{c}`' for c in clustering)}")
+    return '\n'.join(clauses)
+
+
+def partition_starts(values, partition_type):
+    """Return the start of the partition each value falls into (NaT for nulls)."""
+    values = pd.to_datetime(pd.Series(values), errors='coerce')
+    if values.dt.tz is not None:
+        values = values.dt.tz_convert('UTC').dt.tz_localize(None)
+    if partition_type == 'HOUR':
+        return values.dt.floor('h')
+    if partition_type == 'DAY':
+        return values.dt.normalize()
+    return values.dt.to_period('M' if partition_type == 'MONTH' else 'Y').dt.to_timestamp()
+
 
-def load_to_bq(client, df, dataset, table):
+def _sql_literal(value, column_type):
+    if column_type == 'DATE':
+        return f"DATE '{value:%Y-%m-%d}'"
+    return f"{column_type} '{value:%Y-%m-%d %H:%M:%S}'"
+
+
+def build_replace_partitions_sql(target_id, source_id, columns, partitioning, partitions, include_null=False):
+    """Build a transaction replacing ``partitions`` of ``target_id`` with ``source_id``'s rows.
+
+    The DELETE bounds the partition column by the batch's first and last
+    partition, so BigQuery prunes to that range, then keeps only the listed
+    partitions, so gaps inside the range are left untouched.
+    """
+    column, column_type, partition_type = partitioning
+    partitions = sorted(partitions)
+    conditions = []
+    if partitions:
+        expr = _partition_expr(column, column_type, partition_type)
+        low = _sql_literal(partitions[0], column_type)
+        high = _sql_literal(partitions[-1] + _PARTITION_STEPS[partition_type], column_type)
+        listed = ', '.join(_sql_literal(p, column_type) for p in partitions)
+        conditions.append(f"(`{column}` >= {low} AND `{column}` < {high} AND {expr} IN ({listed}))")
+    if include_null:
+        conditions.append(f"`{column}` IS NULL")
+    column_list = ', '.join(f"`{c}`" for c in columns)
+    return f"""
+    BEGIN TRANSACTION;
+    DELETE FROM `{target_id}` WHERE {' OR '.join(conditions)};
+    INSERT INTO `{target_id}` ({column_list}) SELECT {column_list} FROM `{source_id}`;
+    COMMIT TRANSACTION;
+    """
+
+
+def build_merge_sql(target_id, source_id, columns, key_columns, hash_exclude=()):
+    """Build a MERGE that upserts ``source_id`` into ``target_id`` on the natural key.
+
+    Matched rows are only updated when a fingerprint of their non-key content
+    differs, so unchanged rows are not rewritten. Columns in ``hash_exclude``
+    (e.g. load timestamps) are still written but do not count as a change.
+    Duplicate keys in the source are collapsed to one row, since MERGE
+    rejects a target row matching several source rows.
+    """
+    hashed = [c for c in columns if c not in key_columns and c not in hash_exclude]
+    keys = ', '.join(f"`{k}`" for k in key_columns)
+    on = ' AND '.join(f"T.`{k}` = S.`{k}`" for k in key_columns)
+    update_set = ', '.join(f"`{c}` = S.`{c}`" for c in columns if c not in key_columns)
+    insert_columns = ', '.join(f"`{c}`" for c in columns)
+    insert_values = ', '.join(f"S.`{c}`" for c in columns)
+
+    def row_hash(alias):
+        return f"FARM_FINGERPRINT(TO_JSON_STRING(STRUCT({', '.join(f'{alias}.`{c}`' for c in hashed)})))"
+
+    when_matched = ''
+    if hashed and update_set:
+        when_matched = f"""
+    WHEN MATCHED AND {row_hash('T')} != {row_hash('S')} THEN
+      UPDATE SET {update_set}"""
+    return f"""
+    MERGE `{target_id}` T
+    USING (
+      SELECT * FROM `{source_id}`
+      WHERE TRUE
+      QUALIFY ROW_NUMBER() OVER (PARTITION BY {keys}) = 1
+    ) S
+    ON {on}{when_matched}
+    WHEN NOT MATCHED THEN
+      INSERT ({insert_columns}) VALUES ({insert_values})
+    """
+
+
+def merge_chunks_to_bq(client, chunks, dataset, table, key_columns, hash_exclude=()):
+    """Upsert chunks into a table via a temporary staging table and MERGE.
+
+    The batch is loaded into ``<table>__staging_<id>`` in the same dataset,
+    merged on ``key_columns`` and the staging table is dropped afterwards.
+    Re-running with the same data is a no-op. Returns the number of rows in
+    the batch.
+    """
+    project = PIPELINE_CONFIG['bigquery']['project_id']
+    staging_table = f"{table}__staging_{uuid.uuid4().hex[:12]}"
+    staging_id = f"{project}.{dataset}.{staging_table}"
+    try:
+        rows = load_chunks_to_bq(client, chunks, dataset, table,
+                                 write_disposition=WRITE_TRUNCATE,
+                                 destination=staging_table)
+        if rows == 0:
+            return 0
+        columns = [column.name for column in get_table_schema(table)]
+        sql = build_merge_sql(f"{project}.{dataset}.{table}", staging_id, columns, key_columns, hash_exclude)
+        job = client.query(sql)
+        job.result()
+        record_bq_job(job)
+        logger.info(f"Merged {rows} rows into {project}.{dataset}.{table} "
+                    f"({job.num_dml_affected_rows} rows inserted or updated)")
+        return rows
+    finally:
+        client.delete_table(staging_id, not_found_ok=True)
+
+
+def replace_partitions_in_bq(client, chunks, dataset, table):
+    """Replace the partitions touched by a batch with the batch's rows.
+
+    The batch is loaded into a temporary staging table while the partitions
+    it covers are collected; then, in one transaction, those partitions are
+    deleted from the target and the staged rows inserted. Partitions the
+    batch does not touch are never read or rewritten, and a failure rolls
+    the whole replacement back. The batch must contain every row of each
+    partition it touches. Returns the number of rows in the batch.
+    """
+    partitioning = get_partitioning(table)
+    if partitioning is None:
+        raise ValueError(f"Table {table} uses the replace_partitions load strategy but has no partition_field configured")
+    column, _, partition_type = partitioning
+    partitions = set()
+
+    def observed(chunks):
+        for chunk in chunks:
+            starts = partition_starts(chunk[column], partition_type)
+            partitions.update(starts.dropna().unique())
+            if starts.isna().any():
+                partitions.add(None)
+            yield chunk
+
+    project = PIPELINE_CONFIG['bigquery']['project_id']
+    staging_table = f"{table}__staging_{uuid.uuid4().hex[:12]}"
+    staging_id = f"{project}.{dataset}.{staging_table}"
+    try:
+        rows = load_chunks_to_bq(client, observed(chunks), dataset, table,
+                                 write_disposition=WRITE_TRUNCATE,
+                                 destination=staging_table)
+        if rows == 0:
+            return 0
+        include_null = None in partitions
+        partitions = [pd.Timestamp(p) for p in partitions if p is not None]
+        columns = [c.name for c in get_table_schema(table)]
+        sql = build_replace_partitions_sql(f"{project}.{dataset}.{table}", staging_id, columns, partitioning,
+                                           partitions, include_null=include_null)
+        job = client.query(sql)
+        job.result()
+        record_bq_job(job)
+        logger.info(f"Replaced {len(partitions) + include_null} {partition_type.lower()} partitions of "
+                    f"{project}.{dataset}.{table} with {rows} rows")
+        return rows
+    finally:
+        client.delete_table(staging_id, not_found_ok=True)
+
+
+def _keys_parameter(table, column, keys):
+    """Build the ``@keys`` array parameter for a key column of a table."""
+    from google.cloud import bigquery
+    column_type = {c.name: c.type for c in get_table_schema(table)}[column]
+    param_type = {'INTEGER': 'INT64', 'FLOAT': 'FLOAT64', 'BOOLEAN': 'BOOL'}.get(column_type, column_type)
+    values = [str(k) for k in keys] if param_type == 'STRING' else list(keys)
+    return bigquery.ArrayQueryParameter('keys', param_type, values)
+
+
+def _keys_job_config(table, column, keys):
+    from google.cloud import bigquery
+    return bigquery.QueryJobConfig(query_parameters=[_keys_parameter(table, column, keys)])
+
+
+def delete_rows_in_bq(client, dataset, table, key_column, keys):
+    """Delete every row of a table whose ``key_column`` is in ``keys``; returns the rows deleted."""
+    if not len(keys):
+        return 0
     table_id = f"{PIPELINE_CONFIG['bigquery']['project_id']}.{dataset}.{table}"
-    job = client.load_table_from_dataframe(df, table_id)
+    job_config = _keys_job_config(table, key_column, keys)
+    job = client.query(f"DELETE FROM `{table_id}` WHERE `{key_column}` IN UNNEST(@keys)", job_config=job_config)
     job.result()
-    print(f"Loaded {len(df)} rows to {table_id}")
+    record_bq_job(job)
+    logger.info(f"Deleted {job.num_dml_affected_rows} rows from {table_id}")
+    return job.num_dml_affected_rows
+
+
+def replace_rows_in_bq(client, chunks, dataset, table, key_column, keys):
+    """Replace every row whose ``key_column`` is in ``keys`` with the rows of the batch.
+
+    The batch is loaded into a temporary staging table, then the old rows are
+    deleted and the batch inserted in one transaction. Keys with no rows in
+    the batch are deleted, so the call applies inserts, updates and deletes
+    of the source rows behind ``keys``. Returns the number of rows in the batch.
+    """
+    project = PIPELINE_CONFIG['bigquery']['project_id']
+    target_id = f"{project}.{dataset}.{table}"
+    staging_table = f"{table}__staging_{uuid.uuid4().hex[:12]}"
+    staging_id = f"{project}.{dataset}.{staging_table}"
+    try:
+        rows = load_chunks_to_bq(client, chunks, dataset, table,
+                                 write_disposition=WRITE_TRUNCATE,
+                                 destination=staging_table)
+        if rows == 0:
+            delete_rows_in_bq(client, dataset, table, key_column, keys)
+            return 0
+        column_list = ', '.join(f"`{c.name}`" for c in get_table_schema(table))
+        sql = f"""
+        BEGIN TRANSACTION;
+        DELETE FROM `{target_id}` WHERE `{key_column}` IN UNNEST(@keys);
+        INSERT INTO `{target_id}` ({column_list}) SELECT {column_list} FROM `{staging_id}`;
+        COMMIT TRANSACTION;
+        """
+        job_config = _keys_job_config(table, key_column, keys)
+        job = client.query(sql, job_config=job_config)
+        job.result()
+        record_bq_job(job)
+        logger.info(f"Replaced rows for {len(keys)} {key_column} values in {target_id} with {rows} rows")
+        return rows
+    finally:
+        client.delete_table(staging_id, not_found_ok=True)
+
+
+def load_with_strategy(client, chunks, dataset, table, strategy=None):
+    """Load chunks using the table's configured load strategy.
+
+    ``tables.<table>.load_strategy`` in the pipeline config selects one of:
+
+    * ``append`` (default): add the batch to the table
+    * ``truncate``: replace the table's contents with the batch
+    * ``merge``: upsert on ``merge_keys``, updating only rows whose content
+      changed (ignoring ``hash_exclude`` columns)
+    * ``replace_partitions``: overwrite only the ``partition_field``
+      partitions present in the batch
+
+    Returns the number of rows in the batch.
+    """
+    config = get_table_config(table)
+    strategy = strategy or config.get('load_strategy', 'append')
+    if strategy == 'append':
+        return load_chunks_to_bq(client, chunks, dataset, table, WRITE_APPEND)
+    if strategy == 'truncate':
+        return load_chunks_to_bq(client, chunks, dataset, table, WRITE_TRUNCATE)
+    if strategy == 'merge':
+        if not config.get('merge_keys'):
+            raise ValueError(f"Table {table} uses the merge load strategy but has no merge_keys configured")
+        return merge_chunks_to_bq(client, chunks, dataset, table, config['merge_keys'], config.get('hash_exclude', []))
+    if strategy == 'replace_partitions':
+        return replace_partitions_in_bq(client, chunks, dataset, table)
+    raise ValueError(f"Unknown load strategy for {table}: {strategy}")
@@ -0,0 +1,82 @@
+"""Warehouse table schemas parsed from the BigQuery DDL.
+
+The ``CREATE TABLE`` scripts in ``project_setup/bigquery_sql`` are the single
+source of truth for column names and types. They are parsed once per process
+and shared by everything that needs a typed view of a table (Parquet staging,
+dtype coercion).
+"""
+import os
+import re
+import threading
+from collections import namedtuple
+from typing import Dict, List
+
+from common.config import PIPELINE_CONFIG
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_DDL_DIR = 'project_setup/bigquery_sql'
+
+Column = namedtuple('Column', ['name', 'type', 'nullable'])
+
+_CREATE_TABLE_RE = re.compile(
+    r'CREATE\s+TABLE\s+`?(?:[\w-]+\.)*(?P<table>\w+)`?\s*\((?P<body>.*)\)',
+    re.IGNORECASE | re.DOTALL,
+)
+_COLUMN_RE = re.compile(r'^\s*(?P<name>\w+)\s+(?P<type>\w+)(?P<rest>.*)$', re.IGNORECASE)
+
+_schemas = None
+_schemas_lock = threading.Lock()
+
+
+def get_ddl_dir() -> str:
+    """Return the absolute path of the BigQuery DDL directory."""
+    ddl_dir = PIPELINE_CONFIG.get('bigquery', {}).get('ddl_dir', DEFAULT_DDL_DIR)
+    if not os.path.isabs(ddl_dir):
+        ddl_dir = os.path.join(PROJECT_ROOT, ddl_dir)
+    return ddl_dir
+
+
+def parse_ddl(ddl: str) -> Dict[str, List[Column]]:
+    """Parse a ``CREATE TABLE`` statement into ``{table: [Column, ...]}``."""
+    match = _CREATE_TABLE_RE.search(ddl)
+    if not match:
+        raise ValueError(f"Not a CREATE TABLE statement: {ddl[:80]!r}")
+    columns = []
+    for line in match.group('body').split(','):
+        column = _COLUMN_RE.match(line.strip())
+        if not column:
+            continue
+        nullable = 'NOT NULL' not in column.group('rest').upper()
+        columns.append(Column(column.group('name'), column.group('type').upper(), nullable))
+    return {match.group('table'): columns}
+
+
+def load_table_schemas(ddl_dir: str = None) -> Dict[str, List[Column]]:
+    """Parse every ``*.sql`` file in the DDL directory."""
+    ddl_dir = ddl_dir or get_ddl_dir()
+    schemas = {}
+    for sql_file in sorted(f for f in os.listdir(ddl_dir) if f.endswith('.sql')):
+        with open(os.path.join(ddl_dir, sql_file), 'r') as f:
+            schemas.update(parse_ddl(f.read()))
+    return schemas
+
+
+def _get_schemas() -> Dict[str, List[Column]]:
+    global _schemas
+    with _schemas_lock:
+        if _schemas is None:
+            _schemas = load_table_schemas()
+        return _schemas
+
+
+def get_table_names() -> List[str]:
+    """Return the names of every warehouse table defined in the DDL directory."""
+    return list(_get_schemas())
+
+
+def get_table_schema(table: str) -> List[Column]:
+    """Return the columns of a warehouse table, parsing the DDL on first use."""
+    schemas = _get_schemas()
+    if table not in schemas:
+        raise KeyError(f"No DDL found for table {table} in {get_ddl_dir()}")
+    return schemas[table]
@@ -0,0 +1,183 @@
+"""Content-hash change detection for full-extract dimension loads.
+
+Dimension pipelines extract their whole source table, but on most days
+almost nothing in it changes. :class:`ChangeDetector` keeps a snapshot of
+the previous run's rows, as one 64-bit content hash per key, in
+``<state_dir>/snapshots/<table>.parquet`` and sends only what differs to
+the loader::
+
+    detector = ChangeDetector('dim_seller', 'sellers', 'seller_id')
+    if detector.source_unchanged():    # one catalog lookup, no extract
+        return
+    changes = detector.diff(df)        # after transform()
+    load(changes.rows)                 # inserted + changed rows only
+    detector.commit()                  # after the load succeeded
+
+Row hashes are computed with pandas' vectorized hashing over the columns in
+name order, after ``coerce_to_schema`` has fixed their types; the table's
+``hash_exclude`` columns are ignored as in the merge strategy. The source
+fingerprint is read from Postgres' statistics catalog rather than the table:
+the cumulative inserted, updated and deleted tuple counts of
+``pg_stat_user_tables`` plus the table's file node, which TRUNCATE (and
+VACUUM FULL) replace. Any committed write moves it, so an unchanged source is
+detected without scanning or transferring any rows. Statistics reach the
+catalog shortly after commit, so a write made moments before the check may
+only be picked up by the next run; a statistics reset just causes one full
+extract.
+
+The snapshot only stands for the warehouse while the warehouse still holds
+its rows. Before it is used, the target table's row count is checked (a
+metadata lookup in BigQuery): if
+the table holds fewer rows than the snapshot (it was truncated or rebuilt,
+or the snapshot belongs to another warehouse), the snapshot is ignored and
+every row is loaded.
+
+Rows deleted in the source are counted but stay in the warehouse, like
+with the merge strategy. Delete a table's snapshot to force a full load.
+"""
+import os
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from common.bigquery_client import get_table_config
+from common.coercion import to_string
+from common.db_utils import get_shared_engine
+from common.logging_utils import get_logger
+from common.sinks import get_sink
+from common.watermarks import get_state_dir
+
+SNAPSHOT_DIR = 'snapshots'
+FINGERPRINT_METADATA_KEY = b'change_detection.fingerprint'
+
+logger = get_logger(__name__)
+
+
+def get_snapshot_path(table: str) -> str:
+    directory = os.path.join(get_state_dir(), SNAPSHOT_DIR)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{table}.parquet")
+
+
+def row_hashes(df: pd.DataFrame, exclude: Iterable[str] = ()) -> np.ndarray:
+    """Return a uint64 content hash per row over all columns but ``exclude``, in name order."""
+    columns = sorted(column for column in df.columns if column not in set(exclude))
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+
+def get_source_fingerprint(source_table: str) -> str:
+    """Return a fingerprint that changes whenever a source table is written to, from the statistics catalog.
+
+    The tuple counters only grow, so different edits cannot cancel each other
+    out; the file node covers TRUNCATE, which the counters do not record.
+    """
+    query = ("SELECT n_tup_ins, n_tup_upd, n_tup_del, pg_relation_filenode(relid) "
+             "FROM pg_stat_user_tables WHERE relid = %(table)s::regclass")
+    conn = get_shared_engine().raw_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(query, {'table': source_table})
+            row = cursor.fetchone()
+        if row is None:
+            raise ValueError(f"No statistics for source table {source_table}")
+        return ':'.join(str(value) for value in row)
+    finally:
+        conn.close()
+
+
+def get_warehouse_row_count(table: str) -> int:
+    """Return the number of rows in a warehouse table."""
+    sink = get_sink()
+    return int(sink.query(f"SELECT COUNT(*) AS row_count FROM {sink.table_id(table)}")['row_count'].iloc[0])
+
+
+class ChangeSet:
+    """Rows to load plus the counts of inserted, changed and deleted keys."""
+
+    def __init__(self, rows: pd.DataFrame, inserted: int, changed: int, deleted: int):
+        self.rows = rows
+        self.inserted = inserted
+        self.changed = changed
+        self.deleted = deleted
+
+    def summary(self) -> str:
+        return f"{self.inserted} inserted, {self.changed} changed, {self.deleted} deleted"
+
+
+class ChangeDetector:
+    """Diffs a dimension's full extract against the snapshot of the previous run.
+
+    Args:
+        table: Warehouse table (names the snapshot and its ``hash_exclude``)
+        source_table: OLTP table the dimension is extracted from
+        key_column: Natural key of the dimension
+    """
+
+    def __init__(self, table: str, source_table: str, key_column: str):
+        self.table = table
+        self.source_table = source_table
+        self.key_column = key_column
+        self.exclude = get_table_config(table).get('hash_exclude', [])
+        self.fingerprint = None
+        self.snapshot = None
+        self._snapshot_valid = None
+
+    def _has_snapshot(self) -> bool:
+        """True if a snapshot exists and the warehouse still holds at least its rows."""
+        if self._snapshot_valid is None:
+            path = get_snapshot_path(self.table)
+            if not os.path.exists(path):
+                self._snapshot_valid = False
+            else:
+                expected = pq.read_metadata(path).num_rows
+                rows = get_warehouse_row_count(self.table)
+                self._snapshot_valid = rows >= expected
+                if not self._snapshot_valid:
+                    logger.warning(f"{self.table} holds {rows} rows but its snapshot has {expected}; "
+                                   f"ignoring the snapshot and loading every row")
+        return self._snapshot_valid
+
+    def _read_snapshot(self) -> Optional[pd.DataFrame]:
+        return pq.read_table(get_snapshot_path(self.table)).to_pandas() if self._has_snapshot() else None
+
+    def source_unchanged(self) -> bool:
+        """True if the source table is unchanged since the last committed snapshot, and that snapshot is loaded."""
+        self.fingerprint = get_source_fingerprint(self.source_table)
+        path = get_snapshot_path(self.table)
+        if not os.path.exists(path):
+            return False
+        metadata = pq.read_schema(path).metadata or {}
+        if metadata.get(FINGERPRINT_METADATA_KEY, b'').decode() != self.fingerprint:
+            return False
+        return self._has_snapshot()
+
+    def diff(self, df: pd.DataFrame) -> ChangeSet:
+        """Return the rows of ``df`` that are new or changed since the snapshot."""
+        current = pd.DataFrame({'key': to_string(df[self.key_column]).to_numpy(dtype=object),
+                                'hash': row_hashes(df, self.exclude)})
+        previous = self._read_snapshot()
+        if previous is None:
+            changes = ChangeSet(df, len(df), 0, 0)
+        else:
+            merged = current.merge(previous, on='key', how='left', suffixes=('', '_previous'), indicator=True)
+            inserted = (merged['_merge'] == 'left_only').to_numpy()
+            changed = ~inserted & (merged['hash'] != merged['hash_previous']).to_numpy()
+            deleted = int((~previous['key'].isin(current['key'])).sum())
+            changes = ChangeSet(df[inserted | changed], int(inserted.sum()), int(changed.sum()), deleted)
+        self.snapshot = current
+        logger.info(f"{self.table}: {changes.summary()} of {len(df)} rows")
+        return changes
+
+    def commit(self) -> None:
+        """Replace the snapshot with the rows passed to ``diff()``; call after the load succeeded."""
+        if self.snapshot is None:
+            return
+        table = pa.Table.from_pandas(self.snapshot, preserve_index=False)
+        table = table.replace_schema_metadata({FINGERPRINT_METADATA_KEY: (self.fingerprint or '').encode()})
+        path = get_snapshot_path(self.table)
+        tmp_path = f"{path}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
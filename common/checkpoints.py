@@ -0,0 +1,275 @@
+"""Stage checkpoints, so a failed pipeline run resumes where it stopped.
+
+Inside a checkpointed run the outputs of a pipeline's stages are written as
+Arrow IPC files under ``<state_dir>/checkpoints/<run_id>/<pipeline>/<stage>/``.
+If the run is resumed (``run_pipelines.py --resume <run_id>``, or an Airflow
+retry, which keeps its run id), stages with a complete checkpoint are read back
+instead of being computed again::
+
+    checkpoint = get_checkpoint('dim_seller')
+    df_t = checkpoint.read('transform')            # None unless resuming
+    if df_t is None:
+        df = checkpoint.frame('extract', extract)
+        df_t = checkpoint.frame('transform', transform, df)
+
+    chunks = checkpoint.chunks('extract', extract_chunks, since=since)
+
+``frame`` and ``chunks`` time the stage as the part of its name before the
+first ``.``, so ``extract.readings`` counts as ``extract``. Streamed stages
+are only complete once their last chunk has been written, and ``metadata``
+(a callable, evaluated then) stores small values such as the high-water mark
+next to them. Checkpoint files are read memory-mapped, and chunk by chunk.
+
+Checkpoints hold the output of transform, not of the DQ checks. Resumed runs
+check their data again. To re-extract, start a new run.
+
+When a pipeline succeeds, the runner calls ``complete()``. This drops the
+pipeline's stage files and marks it done, so a resumed run skips it. Runs
+older than ``checkpoints.max_age_hours`` are removed when a run starts.
+Outside ``checkpoint_run`` every call runs the stage as if there were no
+checkpoints. ``checkpoints.enabled: false`` stops runs from writing stage
+files (saving their disk I/O); they still record which pipelines succeeded,
+so a resumed run skips those and runs the others from scratch.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+from common.config import PIPELINE_CONFIG
+from common.instrumentation import track, track_chunks
+from common.logging_utils import get_logger
+from common.watermarks import get_state_dir
+
+CHECKPOINT_DIR = 'checkpoints'
+MANIFEST_FILE = 'manifest.json'
+COMPLETED_FILE = 'COMPLETED'
+DEFAULT_MAX_AGE_HOURS = 72
+
+logger = get_logger(__name__)
+
+_lock = threading.Lock()
+_run_id = None
+_save_stages = True
+
+
+def get_checkpoint_config() -> dict:
+    return PIPELINE_CONFIG.get('checkpoints') or {}
+
+
+def checkpoints_enabled() -> bool:
+    """True unless stage outputs are opted out of (``checkpoints.enabled: false``)."""
+    return get_checkpoint_config().get('enabled', True)
+
+
+def _run_dir(run_id: str) -> str:
+    return os.path.join(get_state_dir(), CHECKPOINT_DIR, run_id)
+
+
+def run_exists(run_id: str) -> bool:
+    """True if checkpoints of ``run_id`` exist."""
+    return os.path.isdir(_run_dir(run_id))
+
+
+def discard_run(run_id: str) -> None:
+    """Remove every checkpoint of a run."""
+    shutil.rmtree(_run_dir(run_id), ignore_errors=True)
+
+
+def _purge_stale_runs(max_age_hours: float, keep: str) -> None:
+    root = os.path.join(get_state_dir(), CHECKPOINT_DIR)
+    if not os.path.isdir(root):
+        return
+    cutoff = time.time() - max_age_hours * 3600
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name != keep and os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            logger.info(f"Removed checkpoints of stale run {name}")
+
+
+@contextmanager
+def checkpoint_run(run_id: Optional[str] = None) -> Iterator[str]:
+    """Checkpoint the stages of the pipelines run inside; an existing ``run_id`` is resumed."""
+    global _run_id, _save_stages
+    run_id = run_id or pd.Timestamp.now().strftime('%Y%m%dT%H%M%S%f')
+    _purge_stale_runs(get_checkpoint_config().get('max_age_hours', DEFAULT_MAX_AGE_HOURS), keep=run_id)
+    os.makedirs(_run_dir(run_id), exist_ok=True)
+    # Touched so that an active run is never purged as stale
+    os.utime(_run_dir(run_id))
+    with _lock:
+        previous = _run_id, _save_stages
+        _run_id, _save_stages = run_id, checkpoints_enabled()
+    try:
+        yield run_id
+    finally:
+        with _lock:
+            _run_id, _save_stages = previous
+
+
+def _read_part(path: str) -> pd.DataFrame:
+    # The mapped file backs the Arrow table; only the pandas conversion copies
+    return pa.ipc.open_file(pa.memory_map(path)).read_all().to_pandas()
+
+
+class _StageWriter:
+    """Writes a stage's chunks to ``<stage>.tmp/`` and moves it into place on commit."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.tmp_directory = f"{directory}.tmp"
+        shutil.rmtree(self.tmp_directory, ignore_errors=True)
+        os.makedirs(self.tmp_directory)
+        self.parts = 0
+        self.rows = 0
+        self.failed = False
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.failed:
+            return
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            path = os.path.join(self.tmp_directory, f"part-{self.parts:05d}.arrow")
+            with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        except (pa.ArrowException, OSError) as e:
+            # Checkpoints only save work; a stage that cannot be written runs without one
+            logger.warning(f"Not checkpointing {self.directory}: {e}")
+            self.failed = True
+            shutil.rmtree(self.tmp_directory, ignore_errors=True)
+            return
+        self.parts += 1
+        self.rows += len(df)
+
+    def commit(self, metadata: Optional[dict] = None) -> None:
+        if self.failed:
+            return
+        manifest = {'parts': self.parts, 'rows': self.rows, 'metadata': metadata or {}}
+        with open(os.path.join(self.tmp_directory, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, default=str)
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.replace(self.tmp_directory, self.directory)
+        logger.info(f"Checkpointed {self.rows} rows to {self.directory}")
+
+
+class PipelineCheckpoint:
+    """Stage checkpoints of one pipeline in the current run (inactive outside ``checkpoint_run``).
+
+    Complete stages are read whenever they exist; new ones are only written
+    if ``save_stages`` is set.
+    """
+
+    def __init__(self, pipeline: str, run_id: Optional[str] = None, save_stages: bool = True):
+        self.pipeline = pipeline
+        self.run_id = run_id
+        self.directory = os.path.join(_run_dir(run_id), pipeline) if run_id else None
+        self.save_stages = save_stages
+
+    @property
+    def active(self) -> bool:
+        """True if stages are checkpointed in this run."""
+        return self.directory is not None and self.save_stages
+
+    def _stage_dir(self, stage: str) -> str:
+        return os.path.join(self.directory, stage)
+
+    def _manifest(self, stage: str) -> Optional[dict]:
+        if self.directory is None:
+            return None
+        path = os.path.join(self._stage_dir(stage), MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def completed(self, stage: str) -> bool:
+        """True if ``stage`` has a complete checkpoint in this run."""
+        return self._manifest(stage) is not None
+
+    def metadata(self, stage: str) -> dict:
+        """Metadata stored with a complete stage (empty if there is none)."""
+        manifest = self._manifest(stage)
+        return manifest['metadata'] if manifest else {}
+
+    def read_chunks(self, stage: str) -> Optional[Iterator[pd.DataFrame]]:
+        """Iterate the chunks of a complete stage, or return None if it has no checkpoint."""
+        manifest = self._manifest(stage)
+        if manifest is None:
+            return None
+        logger.info(f"Resuming {self.pipeline} from its {stage} checkpoint ({manifest['rows']} rows)")
+        directory = self._stage_dir(stage)
+        paths = [os.path.join(directory, f"part-{part:05d}.arrow") for part in range(manifest['parts'])]
+        return track_chunks('resume', (_read_part(path) for path in paths))
+
+    def read(self, stage: str) -> Optional[pd.DataFrame]:
+        """Return a complete stage as one DataFrame, or None if it has no checkpoint."""
+        chunks = self.read_chunks(stage)
+        if chunks is None:
+            return None
+        chunks = list(chunks)
+        if not chunks:
+            return pd.DataFrame()
+        return chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
+
+    def save(self, stage: str, df: pd.DataFrame, metadata: Optional[dict] = None) -> None:
+        """Checkpoint a complete DataFrame as ``stage``."""
+        if not self.active:
+            return
+        writer = _StageWriter(self._stage_dir(stage))
+        track('checkpoint', writer.write, df)
+        writer.commit(metadata)
+
+    def frame(self, stage: str, func: Callable, *args, metadata: Optional[dict] = None, **kwargs) -> pd.DataFrame:
+        """Return the checkpointed ``stage``, or call ``func`` and checkpoint its DataFrame."""
+        df = self.read(stage)
+        if df is None:
+            df = track(stage.split('.')[0], func, *args, **kwargs)
+            self.save(stage, df, metadata)
+        return df
+
+    def chunks(self, stage: str, func: Callable, *args, metadata: Optional[Callable[[], dict]] = None,
+               **kwargs) -> Iterator[pd.DataFrame]:
+        """Iterate the checkpointed ``stage``, or the chunks of ``func`` while checkpointing them.
+
+        ``func`` is only called if the stage has no checkpoint. The stage is
+        complete once the last chunk was written; ``metadata()`` is stored
+        with it then.
+        """
+        chunks = self.read_chunks(stage)
+        if chunks is not None:
+            yield from chunks
+            return
+        chunks = track_chunks(stage.split('.')[0], func(*args, **kwargs))
+        if not self.active:
+            yield from chunks
+            return
+        writer = _StageWriter(self._stage_dir(stage))
+        for chunk in chunks:
+            track('checkpoint', writer.write, chunk)
+            yield chunk
+        writer.commit(metadata() if metadata else None)
+
+    def is_complete(self) -> bool:
+        """True if the pipeline already succeeded in this run."""
+        return self.directory is not None and os.path.exists(os.path.join(self.directory, COMPLETED_FILE))
+
+    def complete(self) -> None:
+        """Drop the pipeline's stage checkpoints and mark it as succeeded in this run."""
+        if self.directory is None:
+            return
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory)
+        open(os.path.join(self.directory, COMPLETED_FILE), 'w').close()
+
+
+def get_checkpoint(pipeline: str) -> PipelineCheckpoint:
+    """Return ``pipeline``'s checkpoints in the current run."""
+    with _lock:
+        run_id, save_stages = _run_id, _save_stages
+    return PipelineCheckpoint(pipeline, run_id, save_stages)
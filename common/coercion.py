@@ -0,0 +1,104 @@
+"""Schema-driven dtype coercion for pipeline transforms.
+
+``coerce_to_schema`` converts a DataFrame's columns to the types declared for
+the target table in the BigQuery DDL (see common/bq_schema.py), one vectorized
+pass per column:
+
+* STRING: bytes are decoded as UTF-8, integral floats lose their ``.0`` and
+  everything else becomes the nullable ``string`` dtype (nulls stay null
+  instead of turning into ``'None'``/``'nan'``)
+* INT64: timedeltas become whole days, everything else nullable ``Int64``
+* FLOAT64 / NUMERIC: ``float64``
+* BOOL: nullable ``boolean``
+* DATE: ``datetime64`` normalized to midnight
+* DATETIME / TIMESTAMP: ``datetime64`` (UTC for TIMESTAMP)
+
+Columns that are not in the table schema are left untouched.
+"""
+from typing import Iterable, Optional
+
+import pandas as pd
+from pandas.api import types as ptypes
+
+from common.bq_schema import get_table_schema
+
+
+def to_string(series: pd.Series) -> pd.Series:
+    """Convert a column to the nullable string dtype, decoding bytes."""
+    if ptypes.is_object_dtype(series.dtype):
+        # infer_dtype scans the column once in C instead of testing each cell in Python
+        inferred = ptypes.infer_dtype(series, skipna=True)
+        if inferred == 'bytes':
+            series = series.str.decode('utf-8')
+        elif inferred.startswith('mixed'):
+            series = series.map(lambda x: x.decode('utf-8') if isinstance(x, bytes) else x)
+    elif ptypes.is_float_dtype(series.dtype):
+        # Integer ids read back as float because of nulls would otherwise become '1.0'
+        values = series.dropna()
+        if (values % 1 == 0).all():
+            series = series.astype('Int64')
+    return series.astype('string')
+
+
+def to_int(series: pd.Series) -> pd.Series:
+    """Convert a column to nullable Int64; timedeltas become whole days."""
+    if ptypes.is_timedelta64_dtype(series.dtype):
+        return series.dt.days.astype('Int64')
+    return pd.to_numeric(series, errors='coerce').astype('Int64')
+
+
+def to_float(series: pd.Series) -> pd.Series:
+    return pd.to_numeric(series, errors='coerce').astype('float64')
+
+
+def to_bool(series: pd.Series) -> pd.Series:
+    return series.astype('boolean')
+
+
+def to_date(series: pd.Series) -> pd.Series:
+    return pd.to_datetime(series, errors='coerce').dt.normalize()
+
+
+def to_datetime(series: pd.Series) -> pd.Series:
+    series = pd.to_datetime(series, errors='coerce')
+    if getattr(series.dt, 'tz', None) is not None:
+        series = series.dt.tz_convert('UTC').dt.tz_localize(None)
+    return series
+
+
+def to_timestamp(series: pd.Series) -> pd.Series:
+    return pd.to_datetime(series, errors='coerce', utc=True)
+
+
+COERCERS = {
+    'STRING': to_string,
+    'INT64': to_int,
+    'INTEGER': to_int,
+    'FLOAT64': to_float,
+    'FLOAT': to_float,
+    'NUMERIC': to_float,
+    'BIGNUMERIC': to_float,
+    'BOOL': to_bool,
+    'BOOLEAN': to_bool,
+    'DATE': to_date,
+    'DATETIME': to_datetime,
+    'TIMESTAMP': to_timestamp,
+}
+
+
+def coerce_to_schema(df: pd.DataFrame, table: str, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Coerce ``df`` in place to the column types of ``table`` and return it.
+
+    Args:
+        df: DataFrame to convert
+        table: Warehouse table whose DDL defines the target types
+        columns: Optionally restrict coercion to these columns
+    """
+    wanted = set(columns) if columns is not None else None
+    for column in get_table_schema(table):
+        if column.name not in df.columns or (wanted is not None and column.name not in wanted):
+            continue
+        coercer = COERCERS.get(column.type)
+        if coercer is not None:
+            df[column.name] = coercer(df[column.name])
+    return df
@@ -1,32 +1,98 @@
-import yaml
 import os
-from pathlib import Path
+import threading
+from collections.abc import MutableMapping
 
-class YamlIncludeLoader(yaml.SafeLoader):
-    def __init__(self, stream):
-        self._root = os.path.split(stream.name)[0]
-        super().__init__(stream)
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'pipeline_config.yaml')
+CREDENTIALS_HINT = "create secrets/db_credentials.yaml with the OLTP database's user and password"
+DEFAULT_SINK = 'bigquery'
 
-def construct_include(loader, node):
-    filename = os.path.join(loader._root, loader.construct_scalar(node))
-    with open(filename, 'r') as f:
-        return yaml.load(f, YamlIncludeLoader)
 
-# Register the !include constructor
-YamlIncludeLoader.add_constructor('!include', construct_include)
+def _yaml_include_loader():
+    """Return a SafeLoader subclass that resolves ``!include`` relative to the including file.
+
+    A missing included file loads as null, so the config (and everything that
+    does not connect to Postgres) works without the untracked secrets files.
+    """
+    import yaml
+
+    class YamlIncludeLoader(yaml.SafeLoader):
+        def __init__(self, stream):
+            self._root = os.path.split(stream.name)[0]
+            super().__init__(stream)
+
+    def construct_include(loader, node):
+        filename = os.path.join(loader._root, loader.construct_scalar(node))
+        if not os.path.exists(filename):
+            return None
+        with open(filename, 'r') as f:
+            return yaml.load(f, YamlIncludeLoader)
+
+    # Register the !include constructor
+    YamlIncludeLoader.add_constructor('!include', construct_include)
+    return YamlIncludeLoader
 
 def load_config():
+    import yaml
+
     # Load main config
-    config_path = os.path.join(os.path.dirname(__file__), 'pipeline_config.yaml')
-    with open(config_path, 'r') as f:
-        config = yaml.load(f, Loader=YamlIncludeLoader)
-    
+    with open(CONFIG_PATH, 'r') as f:
+        config = yaml.load(f, Loader=_yaml_include_loader())
+
     # Merge credentials into oltp_db config
     if 'oltp_db' in config and 'credentials' in config['oltp_db']:
         credentials = config['oltp_db'].pop('credentials')
-        config['oltp_db'].update(credentials)
-    
+        config['oltp_db'].update(credentials or {})
+
     return config
 
-# Load the configuration
-PIPELINE_CONFIG = load_config()
+
+class LazyConfig(MutableMapping):
+    """The pipeline config, read from ``pipeline_config.yaml`` on first access.
+
+    Importing a module that holds ``PIPELINE_CONFIG`` costs nothing, so the
+    Airflow DAG and ``--help`` never import yaml or read the credentials file.
+    """
+
+    def __init__(self, loader=load_config):
+        self._loader = loader
+        self._config = None
+        self._lock = threading.Lock()
+
+    @property
+    def data(self) -> dict:
+        if self._config is None:
+            with self._lock:
+                if self._config is None:
+                    self._config = self._loader()
+        return self._config
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+
+    def __delitem__(self, key):
+        del self.data[key]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return repr(self.data) if self._config is not None else f"{type(self).__name__}(<not loaded>)"
+
+
+# The configuration (loaded on first access)
+PIPELINE_CONFIG = LazyConfig()
+
+
+def get_sink_config() -> dict:
+    return PIPELINE_CONFIG.get('sink') or {}
+
+
+def get_sink_type() -> str:
+    """Return the configured sink type (``PIPELINE_SINK`` overrides ``sink.type``)."""
+    return os.environ.get('PIPELINE_SINK') or get_sink_config().get('type', DEFAULT_SINK)
@@ -1,9 +1,31 @@
 """Database utility functions for the data pipeline."""
-from typing import Dict, Any
-import psycopg2
-from sqlalchemy import create_engine
+import atexit
+import math
+import queue
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import pandas as pd
+from common.config import PIPELINE_CONFIG
 
-def get_db_connection(db_config: Dict[str, Any]) -> psycopg2.extensions.connection:
+DEFAULT_FETCH_SIZE = 50000
+
+# Key ranges per extract worker: more, smaller ranges even out skew, since a
+# worker that finishes early picks up the next range
+RANGES_PER_WORKER = 4
+
+# Connection pool defaults, overridable under oltp_db.pool in the pipeline config
+DEFAULT_POOL_SETTINGS = {
+    'pool_size': 5,
+    'max_overflow': 5,
+    'pool_pre_ping': True,
+    'pool_recycle': 1800,
+}
+
+_shared_engine = None
+_shared_engine_lock = threading.Lock()
+
+def get_db_connection(db_config: Dict[str, Any]) -> 'psycopg2.extensions.connection':
     """Create a PostgreSQL database connection using psycopg2.
     
     Args:
@@ -12,6 +34,8 @@ def get_db_connection(db_config: Dict[str, Any]) -> psycopg2.extensions.connecti
     Returns:
         A psycopg2 connection object
     """
+    import psycopg2
+    require_credentials(db_config)
     return psycopg2.connect(
         host=db_config['host'],
         port=db_config['port'],
@@ -20,14 +44,270 @@ def get_db_connection(db_config: Dict[str, Any]) -> psycopg2.extensions.connecti
         password=db_config['password']
     )
 
-def get_sqlalchemy_engine(db_config: Dict[str, Any]) -> 'sqlalchemy.engine.Engine':
+def require_credentials(db_config: Dict[str, Any]) -> None:
+    """Raise RuntimeError if the OLTP credentials file was not found."""
+    if 'user' not in db_config or 'password' not in db_config:
+        from common.config import CREDENTIALS_HINT
+        raise RuntimeError(f"No OLTP database credentials: {CREDENTIALS_HINT}")
+
+def get_sqlalchemy_engine(db_config: Dict[str, Any], **engine_kwargs) -> 'sqlalchemy.engine.Engine':
     """Create a SQLAlchemy engine for the database.
     
     Args:
         db_config: Dictionary containing database connection parameters
+        **engine_kwargs: Extra arguments for ``create_engine`` (pool settings etc.)
         
     Returns:
         A SQLAlchemy engine instance
     """
+    from sqlalchemy import create_engine
+    require_credentials(db_config)
     db_url = f"postgresql+psycopg2://{db_config['user']}:{db_config['password']}@{db_config['host']}:{db_config['port']}/{db_config['database']}"
-    return create_engine(db_url)
+    if 'sslmode' in db_config:
+        engine_kwargs.setdefault('connect_args', {'sslmode': db_config['sslmode']})
+    return create_engine(db_url, **engine_kwargs)
+
+def get_shared_engine(min_pool_size: Optional[int] = None) -> 'sqlalchemy.engine.Engine':
+    """Return the process-wide pooled engine for the OLTP database.
+
+    The engine is created on first use from ``oltp_db`` (pool settings under
+    ``oltp_db.pool``) and then shared by every pipeline in the process, so
+    connection and SSL setup is paid once per pooled connection rather than
+    once per pipeline run. Callers must not dispose it; it is disposed at
+    interpreter exit.
+
+    Args:
+        min_pool_size: Raise the pool size to at least this many connections.
+            Only honoured when the engine is created, so callers that run
+            pipelines concurrently should call this before starting them.
+    """
+    global _shared_engine
+    with _shared_engine_lock:
+        if _shared_engine is None:
+            db_config = PIPELINE_CONFIG['oltp_db']
+            pool_settings = {**DEFAULT_POOL_SETTINGS, **(db_config.get('pool') or {})}
+            if min_pool_size is not None:
+                pool_settings['pool_size'] = max(pool_settings['pool_size'], min_pool_size)
+            _shared_engine = get_sqlalchemy_engine(db_config, **pool_settings)
+        return _shared_engine
+
+def dispose_shared_engine() -> None:
+    """Close every pooled connection of the shared engine, if one was created."""
+    global _shared_engine
+    with _shared_engine_lock:
+        if _shared_engine is not None:
+            _shared_engine.dispose()
+            _shared_engine = None
+
+atexit.register(dispose_shared_engine)
+
+def iter_query_chunks(
+    query: str,
+    params: Optional[Dict[str, Any]] = None,
+    fetch_size: Optional[int] = None,
+) -> Iterator[pd.DataFrame]:
+    """Stream a query's result set as DataFrame chunks.
+
+    Uses a named (server-side) psycopg2 cursor, so Postgres holds the result
+    set and the client only ever materialises ``fetch_size`` rows at a time.
+    Peak memory is therefore bounded by the chunk size rather than the table
+    size. Empty result sets yield no chunks.
+
+    The connection is borrowed from the shared engine's pool and returned
+    when the generator is exhausted or closed.
+
+    Args:
+        query: SQL query, using pyformat (``%(name)s``) placeholders
+        params: Optional query parameters
+        fetch_size: Rows per chunk; defaults to ``streaming.fetch_size`` in
+            the pipeline config
+
+    Yields:
+        DataFrames of at most ``fetch_size`` rows
+    """
+    if fetch_size is None:
+        fetch_size = PIPELINE_CONFIG.get('streaming', {}).get('fetch_size', DEFAULT_FETCH_SIZE)
+    conn = get_shared_engine().raw_connection()
+    try:
+        # Named cursors only exist inside a transaction; the connection is
+        # read-only for us so the pool rolls the transaction back on return.
+        with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cursor:
+            cursor.itersize = fetch_size
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                # description is only populated after the first fetch
+                columns = [col.name for col in cursor.description]
+                yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+    finally:
+        conn.close()
+
+
+def get_extract_parallelism(pipeline: str) -> int:
+    """Return the number of concurrent extract queries configured for a pipeline (default 1)."""
+    pipeline_conf = PIPELINE_CONFIG.get('pipelines', {}).get(pipeline) or {}
+    return max(1, int(pipeline_conf.get('extract_parallelism', 1)))
+
+def split_range(low: Any, high: Any, partitions: int) -> List[Tuple[Any, Any]]:
+    """Split the closed range ``[low, high]`` into contiguous half-open ``(start, end)`` ranges.
+
+    Works for integer keys and for dates/timestamps. The first range has no
+    lower and the last no upper bound (``None``), so rows added outside the
+    observed bounds after they were read are still covered.
+
+    Args:
+        low: Smallest key (None for an empty table)
+        high: Largest key
+        partitions: Number of ranges wanted; fewer are returned for small ranges
+
+    Returns:
+        A list of ``(start, end)`` tuples covering every key exactly once
+    """
+    if low is None or high is None or partitions <= 1 or low == high:
+        return [(None, None)]
+    if isinstance(low, int):
+        step = max(1, math.ceil((high - low + 1) / partitions))
+        cuts = list(range(low + step, high + 1, step))
+    else:
+        low, high = pd.Timestamp(low), pd.Timestamp(high)
+        step = (high - low) / partitions
+        cuts = [low + step * i for i in range(1, partitions)]
+    bounds = [None] + cuts + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def range_condition(expression: str, key_range: Tuple[Any, Any], name: str = 'range') -> Tuple[str, Dict[str, Any]]:
+    """Return a SQL condition (and its parameters) restricting ``expression`` to a ``split_range`` range."""
+    start, end = key_range
+    conditions, params = [], {}
+    if start is not None:
+        conditions.append(f"{expression} >= %({name}_start)s")
+        params[f'{name}_start'] = start
+    if end is not None:
+        conditions.append(f"{expression} < %({name}_end)s")
+        params[f'{name}_end'] = end
+    return ' AND '.join(conditions) or 'TRUE', params
+
+def get_query_bounds(query: str, params: Optional[Dict[str, Any]] = None) -> Tuple[Any, Any]:
+    """Run a ``SELECT MIN(key), MAX(key) ...`` query and return the two values."""
+    conn = get_shared_engine().raw_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            low, high = cursor.fetchone()
+        return low, high
+    finally:
+        conn.close()
+
+def iter_parallel_query_chunks(
+    queries: List[Tuple[str, Optional[Dict[str, Any]]]],
+    workers: int,
+    fetch_size: Optional[int] = None,
+) -> Iterator[pd.DataFrame]:
+    """Stream several queries concurrently as one iterator of DataFrame chunks.
+
+    ``workers`` threads each take the next query, stream it with
+    :func:`iter_query_chunks` over their own pooled connection (one Postgres
+    backend each) and hand its chunks over through a queue of at most
+    ``2 * workers`` chunks, so memory stays bounded when the consumer is the
+    slower side. Chunks arrive in no particular order. An error in any query
+    stops the others and is re-raised; closing the iterator early stops the
+    workers and returns their connections.
+
+    Args:
+        queries: ``(query, params)`` pairs, e.g. one per key range
+        workers: Maximum number of queries running at once
+        fetch_size: Rows per chunk (see :func:`iter_query_chunks`)
+
+    Yields:
+        DataFrames of at most ``fetch_size`` rows
+    """
+    workers = min(workers, len(queries))
+    if workers <= 1:
+        for query, params in queries:
+            yield from iter_query_chunks(query, params, fetch_size)
+        return
+
+    # Every worker holds a connection for its whole query
+    get_shared_engine(min_pool_size=workers)
+    tasks: 'queue.Queue' = queue.Queue()
+    for task in queries:
+        tasks.put(task)
+    chunks: 'queue.Queue' = queue.Queue(maxsize=2 * workers)
+    stop = threading.Event()
+    done = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def work() -> None:
+        try:
+            while not stop.is_set():
+                try:
+                    query, params = tasks.get_nowait()
+                except queue.Empty:
+                    break
+                stream = iter_query_chunks(query, params, fetch_size)
+                try:
+                    for chunk in stream:
+                        if not put(chunk):
+                            return
+                finally:
+                    stream.close()
+        except BaseException as e:
+            put(e)
+        finally:
+            put(done)
+
+    threads = [threading.Thread(target=work, name=f"extract-{i}", daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        finished = 0
+        while finished < workers:
+            item = chunks.get()
+            if item is done:
+                finished += 1
+            elif isinstance(item, BaseException):
+                raise item
+            else:
+                yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+def iter_partitioned_query_chunks(
+    build_query: Callable[[Tuple[Any, Any]], Tuple[str, Optional[Dict[str, Any]]]],
+    bounds_query: Tuple[str, Optional[Dict[str, Any]]],
+    workers: int,
+    partitions: Optional[int] = None,
+    fetch_size: Optional[int] = None,
+) -> Iterator[pd.DataFrame]:
+    """Stream a query split into key (or date) ranges, read concurrently.
+
+    The key's bounds are read with ``bounds_query``, split with
+    :func:`split_range` and ``build_query(key_range)`` builds the query for
+    each range; see :func:`iter_parallel_query_chunks`.
+
+    Args:
+        build_query: Returns ``(query, params)`` restricted to a key range
+            (typically via :func:`range_condition`)
+        bounds_query: ``(query, params)`` returning the key's MIN and MAX
+        workers: Number of ranges read at once
+        partitions: Number of ranges (default ``RANGES_PER_WORKER * workers``)
+        fetch_size: Rows per chunk
+
+    Yields:
+        DataFrames of at most ``fetch_size`` rows
+    """
+    low, high = get_query_bounds(*bounds_query)
+    ranges = split_range(low, high, partitions or RANGES_PER_WORKER * workers)
+    return iter_parallel_query_chunks([build_query(key_range) for key_range in ranges], workers, fetch_size)
@@ -1,8 +1,414 @@
-def run_dq_checks(df, required_columns=None):
+"""Declarative, vectorized data-quality checks.
+
+Rules are declared per warehouse table in ``common/dq_rules.yaml`` (path
+configurable as ``data_quality.rules_file``). A :class:`DQChecker` evaluates
+every rule of a table against each chunk with vectorized pandas/numpy
+operations, keeping only small running state between chunks (counters,
+64-bit hashes for uniqueness), so the same checker serves single DataFrames
+and streamed pipelines::
+
+    checker = DQChecker('fact_sales')
+    for chunk in chunks:
+        checker.check(chunk)        # per-chunk rules; raises on the first error
+    report = checker.finalize()     # run-level rules (uniqueness, row counts)
+    ...load...
+    checker.commit()                # remember the row count for the next run
+
+Failures are collected in a :class:`DQReport`; error-severity failures raise
+:class:`DataQualityError`, which carries the report.
+
+Reference rules check keys against the dimension key sets published by the
+dim pipelines (common/key_cache.py). Orphan rows fail the run, are only
+reported (``warn``), or are removed from the chunk and written to
+``<state_dir>/quarantine/<table>/`` (``quarantine``), as set by the rule's
+``action`` or ``data_quality.orphan_action``.
+"""
+import json
+import os
+import threading
+import uuid
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from common.config import PIPELINE_CONFIG
+from common.key_cache import get_key_set
+from common.logging_utils import get_logger
+from common.watermarks import get_state_dir
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_RULES_FILE = 'common/dq_rules.yaml'
+ROW_COUNT_FILE = 'dq_row_counts.json'
+QUARANTINE_DIR = 'quarantine'
+SAMPLE_SIZE = 5
+ORPHAN_ACTIONS = ('fail', 'warn', 'quarantine')
+
+logger = get_logger(__name__)
+
+_rules = None
+_rules_lock = threading.Lock()
+_row_count_lock = threading.Lock()
+
+
+class DataQualityError(ValueError):
+    """Raised when an error-severity rule fails; ``report`` holds the details."""
+
+    def __init__(self, report: 'DQReport'):
+        super().__init__(report.summary())
+        self.report = report
+
+
+def get_dq_config() -> dict:
+    return PIPELINE_CONFIG.get('data_quality') or {}
+
+
+def get_rules_path() -> str:
+    path = get_dq_config().get('rules_file', DEFAULT_RULES_FILE)
+    return path if os.path.isabs(path) else os.path.join(PROJECT_ROOT, path)
+
+
+def load_rules(table: str) -> List[dict]:
+    """Return the rules declared for a table (empty if none), reading the rules file once."""
+    global _rules
+    with _rules_lock:
+        if _rules is None:
+            import yaml
+            with open(get_rules_path(), 'r') as f:
+                _rules = yaml.safe_load(f) or {}
+    return [dict(rule) for rule in _rules.get(table) or []]
+
+
+def _row_count_path() -> str:
+    return os.path.join(get_state_dir(), ROW_COUNT_FILE)
+
+
+def get_previous_row_count(table: str) -> Optional[int]:
+    path = _row_count_path()
+    with _row_count_lock:
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f).get(table)
+
+
+def save_row_count(table: str, rows: int) -> None:
+    """Persist a table's row count for the next run's row_count_delta check."""
+    path = _row_count_path()
+    with _row_count_lock:
+        counts = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                counts = json.load(f)
+        counts[table] = int(rows)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(counts, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+
+class RuleResult:
+    """Outcome of one rule over everything checked so far."""
+
+    def __init__(self, rule: dict):
+        self.rule = rule
+        self.check = rule['check']
+        self.action = None
+        if self.check == 'references':
+            self.action = rule.get('action', get_dq_config().get('orphan_action', 'fail'))
+            if self.action not in ORPHAN_ACTIONS:
+                raise ValueError(f"Unknown orphan action {self.action!r}; expected one of {ORPHAN_ACTIONS}")
+        # Orphans that are only reported or quarantined do not stop the run
+        self.severity = rule.get('severity', 'error' if self.action in (None, 'fail') else 'warn')
+        self.status = 'passed'
+        self.failed_rows = 0
+        self.sample: list = []
+        self.message = None
+
+    @property
+    def name(self) -> str:
+        target = self.rule.get('columns') or self.rule.get('column')
+        if isinstance(target, list):
+            target = ', '.join(target)
+        return f"{self.check}({target})" if target else self.check
+
+    def fail(self, failed_rows: int, sample=None, message: Optional[str] = None) -> None:
+        self.status = 'failed'
+        self.failed_rows += int(failed_rows)
+        if sample is not None and len(self.sample) < SAMPLE_SIZE:
+            self.sample.extend(list(sample)[:SAMPLE_SIZE - len(self.sample)])
+        if message:
+            self.message = message
+
+    def skip(self, message: str) -> None:
+        if self.status == 'passed':
+            self.status = 'skipped'
+            self.message = message
+
+    def to_dict(self) -> dict:
+        return {
+            'rule': self.name,
+            'severity': self.severity,
+            'status': self.status,
+            'failed_rows': self.failed_rows,
+            'sample': [str(v) for v in self.sample],
+            'message': self.message,
+        }
+
+
+class DQReport:
+    """Structured result of a table's checks."""
+
+    def __init__(self, table: str, results: List[RuleResult]):
+        self.table = table
+        self.results = results
+        self.rows = 0
+        self.chunks = 0
+        self.quarantined = 0
+        self.quarantine_files: List[str] = []
+
+    @property
+    def errors(self) -> List[RuleResult]:
+        return [r for r in self.results if r.status == 'failed' and r.severity == 'error']
+
+    @property
+    def warnings(self) -> List[RuleResult]:
+        return [r for r in self.results if r.status == 'failed' and r.severity != 'error']
+
+    @property
+    def passed(self) -> bool:
+        return not self.errors
+
+    def summary(self) -> str:
+        counts = {status: sum(r.status == status for r in self.results) for status in ('passed', 'failed', 'skipped')}
+        text = (f"{self.table} DQ: {self.rows} rows in {self.chunks} chunks, {counts['passed']} rules passed, "
+                f"{counts['failed']} failed, {counts['skipped']} skipped")
+        if self.quarantined:
+            text += f", {self.quarantined} rows quarantined"
+        failures = [f"{r.severity} {r.name}: {r.message or f'{r.failed_rows} rows'}" for r in self.results if r.status == 'failed']
+        return text + (f" ({'; '.join(failures)})" if failures else '')
+
+    def to_dict(self) -> dict:
+        return {
+            'event': 'dq_report',
+            'table': self.table,
+            'rows': self.rows,
+            'chunks': self.chunks,
+            'passed': self.passed,
+            'quarantined': self.quarantined,
+            'quarantine_files': self.quarantine_files,
+            'results': [r.to_dict() for r in self.results],
+        }
+
+
+# --- per-chunk checks ------------------------------------------------------------
+
+def _check_not_null(checker, result, df):
+    columns = result.rule['columns']
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        result.fail(len(df), message=f"missing columns: {missing}")
+    present = [c for c in columns if c in df.columns]
+    # One isna() over all columns instead of a scan per column
+    null_counts = df[present].isna().sum()
+    for column, count in null_counts[null_counts > 0].items():
+        result.fail(count, message=f"{column} has nulls")
+
+
+def _check_range(checker, result, df):
+    rule = result.rule
+    column = rule['column']
+    if column not in df.columns:
+        result.fail(len(df), message=f"missing column: {column}")
+        return
+    values = pd.to_numeric(df[column], errors='coerce').astype('float64').to_numpy()
+    bad = np.zeros(len(values), dtype=bool)
+    # Comparisons with NaN are False, so nulls never count as out of range
+    if rule.get('min') is not None:
+        bad |= values < rule['min'] if rule.get('min_inclusive', True) else values <= rule['min']
+    if rule.get('max') is not None:
+        bad |= values > rule['max'] if rule.get('max_inclusive', True) else values >= rule['max']
+    if bad.any():
+        result.fail(bad.sum(), sample=values[bad][:SAMPLE_SIZE])
+
+
+def _check_unique(checker, result, df):
+    columns = result.rule['columns']
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        result.fail(len(df), message=f"missing columns: {missing}")
+        return
+    hashes = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    checker._hashes.setdefault(id(result), []).append(hashes)
+    # Duplicates within the chunk fail immediately; across chunks at finalize()
+    duplicated = pd.Series(hashes).duplicated().to_numpy()
+    if duplicated.any():
+        result.fail(0, sample=df.loc[duplicated, columns[0]].head(SAMPLE_SIZE))
+
+
+def _check_references(checker, result, df):
+    rule = result.rule
+    column = rule['column']
+    keys = checker.key_provider(rule['dimension']) if checker.key_provider else None
+    if keys is None:
+        result.skip(f"no key set available for {rule['dimension']}")
+        return
+    if column not in df.columns:
+        result.fail(len(df), message=f"missing column: {column}")
+        return
+    present = df[column].notna().to_numpy()
+    values = df[column][present]
+    orphans = ~np.asarray(keys.contains(values))
+    if orphans.any():
+        result.fail(orphans.sum(), sample=values[orphans].head(SAMPLE_SIZE))
+        if result.action == 'quarantine':
+            mask = np.zeros(len(df), dtype=bool)
+            mask[present] = orphans
+            return mask
+
+
+CHUNK_CHECKS: Dict[str, Callable] = {
+    'not_null': _check_not_null,
+    'range': _check_range,
+    'unique': _check_unique,
+    'references': _check_references,
+}
+
+
+# --- run-level checks ------------------------------------------------------------
+
+def _finalize_unique(checker, result):
+    chunks = checker._hashes.pop(id(result), [])
+    if not chunks:
+        return
+    hashes = np.sort(np.concatenate(chunks))
+    duplicates = int((hashes[1:] == hashes[:-1]).sum())
+    # Reset the count from the per-chunk pass, which only saw chunk-local duplicates
+    result.failed_rows = 0
+    if duplicates:
+        result.fail(duplicates, message=f"{duplicates} duplicate rows")
+
+
+def _finalize_min_rows(checker, result):
+    minimum = result.rule.get('min', 1)
+    if checker.report.rows < minimum:
+        result.fail(0, message=f"{checker.report.rows} rows, expected at least {minimum}")
+
+
+def _finalize_row_count_delta(checker, result):
+    previous = get_previous_row_count(checker.table)
+    rows = checker.report.rows
+    if not previous:
+        result.skip("no previous row count")
+        return
+    change = rows / previous - 1
+    max_decrease = result.rule.get('max_decrease')
+    max_increase = result.rule.get('max_increase')
+    if (max_decrease is not None and change < -max_decrease) or (max_increase is not None and change > max_increase):
+        result.fail(0, message=f"{rows} rows vs {previous} in the previous run ({change:+.0%})")
+
+
+FINAL_CHECKS: Dict[str, Callable] = {
+    'unique': _finalize_unique,
+    'min_rows': _finalize_min_rows,
+    'row_count_delta': _finalize_row_count_delta,
+}
+
+
+class DQChecker:
+    """Evaluates a table's rules over one DataFrame or a stream of chunks.
+
+    Args:
+        table: Warehouse table whose rules apply
+        rules: Rules to use instead of the ones in the rules file
+        key_provider: Callable returning the key set of a dimension (an
+            object with ``contains(values) -> bool array``) or None;
+            defaults to the local dimension key cache
+        fail_fast: Raise from ``check()`` as soon as a chunk fails an
+            error-severity rule, instead of waiting for ``finalize()``
+    """
+
+    def __init__(self, table: str, rules: Optional[List[dict]] = None,
+                 key_provider: Optional[Callable] = get_key_set, fail_fast: bool = True):
+        self.table = table
+        rules = load_rules(table) if rules is None else rules
+        unknown = [r['check'] for r in rules if r['check'] not in CHUNK_CHECKS and r['check'] not in FINAL_CHECKS]
+        if unknown:
+            raise ValueError(f"Unknown data quality checks for {table}: {unknown}")
+        self.key_provider = key_provider
+        self.fail_fast = fail_fast
+        self.report = DQReport(table, [RuleResult(rule) for rule in rules])
+        self._hashes: Dict[int, List[np.ndarray]] = {}
+
+    def check(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Apply the per-chunk rules to ``df``.
+
+        Returns ``df`` without the rows quarantined by reference rules
+        (unchanged when nothing was quarantined).
+        """
+        self.report.rows += len(df)
+        self.report.chunks += 1
+        quarantine = None
+        for result in self.report.results:
+            check = CHUNK_CHECKS.get(result.check)
+            if check is None:
+                continue
+            mask = check(self, result, df)
+            if mask is not None:
+                quarantine = mask if quarantine is None else quarantine | mask
+        if self.fail_fast and self.report.errors:
+            self._log()
+            raise DataQualityError(self.report)
+        if quarantine is not None and quarantine.any():
+            self._quarantine(df[quarantine])
+            df = df[~quarantine]
+        return df
+
+    def _quarantine(self, rows: pd.DataFrame) -> None:
+        """Write orphan rows to a Parquet file under the quarantine directory."""
+        directory = os.path.join(get_state_dir(), QUARANTINE_DIR, self.table)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{pd.Timestamp.now():%Y%m%dT%H%M%S}_{uuid.uuid4().hex[:8]}.parquet")
+        rows.to_parquet(path, index=False)
+        self.report.quarantined += len(rows)
+        self.report.quarantine_files.append(path)
+        logger.warning(f"Quarantined {len(rows)} {self.table} rows with unknown dimension keys to {path}")
+
+    def finalize(self, raise_on_error: bool = True) -> DQReport:
+        """Apply the run-level rules, log the report and raise if any error-severity rule failed."""
+        for result in self.report.results:
+            check = FINAL_CHECKS.get(result.check)
+            if check is not None:
+                check(self, result)
+        self._log()
+        if raise_on_error and not self.report.passed:
+            raise DataQualityError(self.report)
+        return self.report
+
+    def validate(self, df: pd.DataFrame) -> DQReport:
+        """Check a complete DataFrame: ``check(df)`` followed by ``finalize()``."""
+        self.check(df)
+        return self.finalize()
+
+    def commit(self) -> None:
+        """Record this run's row count as the baseline for the next row_count_delta check."""
+        if any(r.check == 'row_count_delta' for r in self.report.results):
+            save_row_count(self.table, self.report.rows)
+
+    def _log(self) -> None:
+        level = logger.error if self.report.errors else logger.warning if self.report.warnings else logger.info
+        level(self.report.summary(), extra={'metrics': self.report.to_dict()})
+
+
+def run_dq_checks(df, required_columns=None, table=None):
+    """Check a complete DataFrame.
+
+    Applies the rules declared for ``table`` (if given), plus not-null checks
+    on ``required_columns`` and a non-empty check. Returns the report.
+    """
+    rules = load_rules(table) if table else []
     if required_columns:
-        for col in required_columns:
-            if df[col].isnull().any():
-                raise ValueError(f"Nulls found in required column: {col}")
-    if df.empty:
-        raise ValueError("DataFrame is empty after transformation!")
-    print("Data quality checks passed.")
+        rules.append({'check': 'not_null', 'columns': list(required_columns)})
+    if not any(rule['check'] == 'min_rows' for rule in rules):
+        rules.append({'check': 'min_rows', 'min': 1})
+    return DQChecker(table or 'dataframe', rules=rules).validate(df)
@@ -0,0 +1,224 @@
+"""Per-run cache of extracted data shared between pipelines.
+
+fact_sales is the only pipeline that reads orders/order_items; downstream
+facts (e.g. fact_inventory's units sold) reuse its rows from this cache
+instead of querying Postgres again::
+
+    with cache_run():                              # runner: one cache per run
+        writer = cache_writer('fact_sales', 'fact_sales', since)
+        for chunk in chunks:
+            writer.append(chunk)                   # fact_sales, while loading
+        writer.commit()                            # after the load succeeded
+        ...
+        table = get_cached('fact_sales', since)    # fact_inventory
+
+Entries are Arrow tables with the warehouse table's DDL schema, held in
+memory up to ``extract_cache.max_memory_mb`` and spilled to Parquet under
+``<state_dir>/extract_cache/<run_id>/`` beyond that. Each entry records the
+lower bound of its extract, and ``get_cached`` only returns it to callers
+whose range it covers.
+
+The cache is invalidated explicitly: leaving ``cache_run`` drops the run's
+entries. Runners that start a process per pipeline (Airflow tasks) enter
+``cache_run(run_id, persist=True)`` in every task, which always spills and
+keeps the files for the following tasks, and call :func:`invalidate_run`
+once the run is over. Without an active run nothing is cached.
+"""
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from common.config import PIPELINE_CONFIG
+from common.logging_utils import get_logger
+from common.staging import arrow_schema, dataframe_to_arrow
+from common.watermarks import get_state_dir
+
+CACHE_DIR = 'extract_cache'
+DEFAULT_MAX_MEMORY_MB = 512
+DEFAULT_MAX_AGE_HOURS = 48
+SINCE_METADATA_KEY = b'extract_cache.since'
+
+logger = get_logger(__name__)
+
+_lock = threading.Lock()
+_run = None
+
+
+def get_cache_config() -> dict:
+    return PIPELINE_CONFIG.get('extract_cache') or {}
+
+
+def _run_dir(run_id: str) -> str:
+    return os.path.join(get_state_dir(), CACHE_DIR, run_id)
+
+
+class _CacheRun:
+    def __init__(self, run_id: str, persist: bool):
+        self.run_id = run_id
+        self.persist = persist
+        self.entries: Dict[str, '_Entry'] = {}
+
+
+class _Entry:
+    def __init__(self, since, table: Optional[pa.Table] = None, path: Optional[str] = None):
+        self.since = since
+        self.table = table
+        self.path = path
+
+    def covers(self, since) -> bool:
+        return self.since is None or (since is not None and pd.Timestamp(self.since) <= pd.Timestamp(since))
+
+    def load(self) -> pa.Table:
+        # Spilled entries are memory-mapped rather than read into the heap
+        return self.table if self.table is not None else pq.read_table(self.path, memory_map=True)
+
+
+def _purge_stale_runs(max_age_hours: float) -> None:
+    root = os.path.join(get_state_dir(), CACHE_DIR)
+    if not os.path.isdir(root):
+        return
+    cutoff = time.time() - max_age_hours * 3600
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+@contextmanager
+def cache_run(run_id: Optional[str] = None, persist: bool = False) -> Iterator[str]:
+    """Scope the extract cache to one run; entries are dropped on exit unless ``persist``.
+
+    Args:
+        run_id: Identifies the run; pipelines of the same run share entries
+        persist: Always spill entries to Parquet and keep them on exit, for
+            runners whose pipelines run in separate processes
+    """
+    global _run
+    run_id = run_id or pd.Timestamp.now().strftime('%Y%m%dT%H%M%S%f')
+    with _lock:
+        previous = _run
+        _run = _CacheRun(run_id, persist)
+    _purge_stale_runs(get_cache_config().get('max_age_hours', DEFAULT_MAX_AGE_HOURS))
+    try:
+        yield run_id
+    finally:
+        with _lock:
+            _run = previous
+        if not persist:
+            invalidate_run(run_id)
+
+
+def invalidate_run(run_id: str) -> None:
+    """Drop every cached entry of a run, in memory and on disk."""
+    with _lock:
+        if _run is not None and _run.run_id == run_id:
+            _run.entries.clear()
+    shutil.rmtree(_run_dir(run_id), ignore_errors=True)
+    logger.info(f"Invalidated extract cache of run {run_id}")
+
+
+class CacheWriter:
+    """Collects one pipeline's chunks into a cache entry; nothing is visible before ``commit()``."""
+
+    def __init__(self, name: str, table: str, since=None):
+        self.name = name
+        self.since = since
+        self.schema = arrow_schema(table).with_metadata({SINCE_METADATA_KEY: str(since or '').encode()})
+        with _lock:
+            self.run = _run
+        self.max_bytes = get_cache_config().get('max_memory_mb', DEFAULT_MAX_MEMORY_MB) * 1024 * 1024
+        self.tables = []
+        self.nbytes = 0
+        self.rows = 0
+        self.path = None
+        self.writer = None
+
+    @property
+    def active(self) -> bool:
+        return self.run is not None
+
+    def append(self, df: pd.DataFrame) -> None:
+        if not self.active:
+            return
+        table = dataframe_to_arrow(df, self.schema)
+        self.rows += table.num_rows
+        if self.writer is not None:
+            self.writer.write_table(table)
+            return
+        self.tables.append(table)
+        self.nbytes += table.nbytes
+        if self.run.persist or self.nbytes > self.max_bytes:
+            self._spill()
+
+    def _spill(self) -> None:
+        directory = _run_dir(self.run.run_id)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{self.name}.parquet")
+        self.writer = pq.ParquetWriter(f"{self.path}.tmp", self.schema)
+        for table in self.tables:
+            self.writer.write_table(table)
+        self.tables = []
+
+    def commit(self) -> None:
+        """Publish the collected rows to the current run's cache."""
+        if not self.active:
+            return
+        if self.run.persist and self.writer is None:
+            self._spill()
+        if self.writer is not None:
+            self.writer.close()
+            os.replace(f"{self.path}.tmp", self.path)
+            entry = _Entry(self.since, path=self.path)
+        else:
+            entry = _Entry(self.since, table=pa.concat_tables(self.tables) if self.tables else self.schema.empty_table())
+        with _lock:
+            self.run.entries[self.name] = entry
+        logger.info(f"Cached {self.rows} {self.name} rows since {self.since} "
+                    f"({'spilled to ' + self.path if self.path else 'in memory'})")
+
+    def discard(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            os.remove(f"{self.path}.tmp")
+            self.writer = None
+        self.tables = []
+
+
+def cache_writer(name: str, table: str, since=None) -> CacheWriter:
+    """Start collecting an extract for the current run (a no-op outside ``cache_run``).
+
+    Args:
+        name: Cache entry name
+        table: Warehouse table whose DDL schema the rows follow
+        since: Lower bound of the extract (None for a full extract)
+    """
+    return CacheWriter(name, table, since)
+
+
+def get_cached(name: str, since=None) -> Optional[pa.Table]:
+    """Return the current run's entry if it covers rows from ``since`` on, else None.
+
+    The returned table may start earlier than ``since``; callers filter.
+    """
+    with _lock:
+        run = _run
+        entry = run.entries.get(name) if run is not None else None
+    if run is None:
+        return None
+    if entry is None:
+        # Written by an earlier task of the same run in another process
+        path = os.path.join(_run_dir(run.run_id), f"{name}.parquet")
+        if not os.path.exists(path):
+            return None
+        metadata = pq.read_schema(path).metadata or {}
+        entry = _Entry(metadata.get(SINCE_METADATA_KEY, b'').decode() or None, path=path)
+        with _lock:
+            run.entries[name] = entry
+    return entry.load() if entry.covers(since) else None
@@ -0,0 +1,331 @@
+"""Per-stage timing, row/byte counters, memory and BigQuery job stats for pipeline runs.
+
+A run is opened with :func:`instrument_pipeline` (done by the CLI runner and
+the Airflow DAG); inside it, pipelines wrap their steps in :func:`stage`,
+:func:`track` or :func:`track_chunks`::
+
+    df = track('extract', extract)
+    df_t = track('transform', transform, df)
+
+Stage time is exclusive: when stages nest, as they do when a streamed
+extract/transform generator is consumed by ``load``, the time spent in the
+inner stage is not counted again in the outer one, so the stage times add up
+to the run time. BigQuery jobs reported with :func:`record_bq_job` are
+attached to the current run.
+
+When the run ends a summary is logged through ``get_logger`` (one JSON
+object per run when ``instrumentation.log_format`` is ``json``) and, if
+``instrumentation.prometheus_textfile_dir`` is set, written as a Prometheus
+textfile for node_exporter's textfile collector.
+
+Calls made outside an instrumented run are no-ops, so pipelines can still be
+run directly.
+"""
+import contextvars
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+
+from common.config import PIPELINE_CONFIG
+from common.logging_utils import get_logger
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+_current_run: contextvars.ContextVar = contextvars.ContextVar('pipeline_run', default=None)
+
+
+def get_instrumentation_config() -> dict:
+    return PIPELINE_CONFIG.get('instrumentation') or {}
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process so far, or None where unsupported."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    """Shallow in-memory size of a DataFrame (object columns count their pointers only)."""
+    return int(df.memory_usage(index=False, deep=False).sum())
+
+
+class StageMetrics:
+    """Accumulated time and counters of one stage across all its calls."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+        self.calls = 0
+        self.rows = 0
+        self.bytes = 0
+        self.peak_rss_bytes = None
+
+    def as_dict(self) -> dict:
+        return {
+            'seconds': round(self.seconds, 4),
+            'calls': self.calls,
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'rows_per_sec': round(self.rows / self.seconds) if self.seconds and self.rows else None,
+            'peak_rss_bytes': self.peak_rss_bytes,
+        }
+
+
+class _ActiveStage:
+    """One entry on a run's stage stack."""
+
+    def __init__(self, metrics: StageMetrics):
+        self.metrics = metrics
+        self.resumed = time.perf_counter()
+
+    def record(self, data: Any = None, nbytes: Optional[int] = None) -> None:
+        """Count rows (and bytes) processed by this stage.
+
+        ``data`` may be a DataFrame, whose rows and shallow size are counted,
+        or a row count.
+        """
+        if isinstance(data, pd.DataFrame):
+            self.metrics.rows += len(data)
+            self.metrics.bytes += frame_bytes(data) if nbytes is None else nbytes
+        elif data is not None:
+            self.metrics.rows += int(data)
+            self.metrics.bytes += nbytes or 0
+
+
+class _NoopStage:
+    def record(self, data: Any = None, nbytes: Optional[int] = None) -> None:
+        pass
+
+
+class PipelineMetrics:
+    """Metrics of one pipeline run."""
+
+    def __init__(self, pipeline: str, run_id: Optional[str] = None):
+        self.pipeline = pipeline
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.stages: Dict[str, StageMetrics] = {}
+        self.bq_jobs: List[dict] = []
+        self.status = 'running'
+        self.error = None
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self.seconds = 0.0
+        self._stack: List[_ActiveStage] = []
+
+    def enter_stage(self, name: str) -> _ActiveStage:
+        now = time.perf_counter()
+        if self._stack:
+            parent = self._stack[-1]
+            parent.metrics.seconds += now - parent.resumed
+        metrics = self.stages.setdefault(name, StageMetrics(name))
+        active = _ActiveStage(metrics)
+        self._stack.append(active)
+        return active
+
+    def exit_stage(self, active: _ActiveStage) -> None:
+        now = time.perf_counter()
+        active.metrics.seconds += now - active.resumed
+        active.metrics.calls += 1
+        active.metrics.peak_rss_bytes = peak_rss_bytes()
+        self._stack.remove(active)
+        if self._stack:
+            self._stack[-1].resumed = now
+
+    def current_stage(self):
+        return self._stack[-1] if self._stack else _NoopStage()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.seconds = time.perf_counter() - self._start
+        self.status = 'failed' if error else 'succeeded'
+        self.error = f"{type(error).__name__}: {error}" if error else None
+
+    def summary(self) -> dict:
+        bq_totals = {
+            'jobs': len(self.bq_jobs),
+            'total_bytes_processed': sum(j.get('total_bytes_processed') or 0 for j in self.bq_jobs),
+            'total_bytes_billed': sum(j.get('total_bytes_billed') or 0 for j in self.bq_jobs),
+            'slot_millis': sum(j.get('slot_millis') or 0 for j in self.bq_jobs),
+        }
+        return {
+            'event': 'pipeline_run',
+            'pipeline': self.pipeline,
+            'run_id': self.run_id,
+            'status': self.status,
+            'error': self.error,
+            'started_at': self.started_at.isoformat(),
+            'seconds': round(self.seconds, 4),
+            'peak_rss_bytes': peak_rss_bytes(),
+            'stages': {name: stage.as_dict() for name, stage in self.stages.items()},
+            'bigquery': {**bq_totals, 'job_details': self.bq_jobs},
+        }
+
+
+def get_current_run() -> Optional[PipelineMetrics]:
+    return _current_run.get()
+
+
+@contextmanager
+def instrument_pipeline(pipeline: str, run_id: Optional[str] = None) -> Iterator[PipelineMetrics]:
+    """Collect metrics for one pipeline run and report them when it ends.
+
+    The summary is reported whether the run succeeds or fails; exceptions
+    are re-raised unchanged.
+    """
+    run = PipelineMetrics(pipeline, run_id)
+    token = _current_run.set(run)
+    try:
+        yield run
+    except BaseException as e:
+        run.finish(e)
+        raise
+    else:
+        run.finish()
+    finally:
+        _current_run.reset(token)
+        report_run(run)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as stage ``name`` of the current run.
+
+    Yields an object whose ``record(df_or_rows, nbytes=None)`` adds to the
+    stage's row and byte counters.
+    """
+    run = get_current_run()
+    if run is None:
+        yield _NoopStage()
+        return
+    active = run.enter_stage(name)
+    try:
+        yield active
+    finally:
+        run.exit_stage(active)
+
+
+def track(name: str, func: Callable, *args, **kwargs):
+    """Call ``func`` as stage ``name``; a returned DataFrame is counted."""
+    with stage(name) as active:
+        result = func(*args, **kwargs)
+        if isinstance(result, pd.DataFrame):
+            active.record(result)
+        return result
+
+
+def track_chunks(name: str, chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    """Yield chunks from ``chunks``, timing each fetch as stage ``name``."""
+    iterator = iter(chunks)
+    while True:
+        with stage(name) as active:
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            active.record(chunk)
+        yield chunk
+
+
+def record_rows(rows: int, nbytes: int = 0) -> None:
+    """Add rows and bytes to the innermost active stage of the current run."""
+    run = get_current_run()
+    if run is not None:
+        run.current_stage().record(rows, nbytes)
+
+
+def record_bq_job(job) -> None:
+    """Attach a finished BigQuery job's statistics to the current run."""
+    run = get_current_run()
+    if run is None or job is None:
+        return
+    stats = {
+        'job_id': getattr(job, 'job_id', None),
+        'job_type': getattr(job, 'job_type', None),
+        'total_bytes_processed': getattr(job, 'total_bytes_processed', None),
+        'total_bytes_billed': getattr(job, 'total_bytes_billed', None),
+        'slot_millis': getattr(job, 'slot_millis', None),
+        'output_rows': getattr(job, 'output_rows', None),
+        'num_dml_affected_rows': getattr(job, 'num_dml_affected_rows', None),
+    }
+    started, ended = getattr(job, 'started', None), getattr(job, 'ended', None)
+    if started and ended:
+        stats['seconds'] = round((ended - started).total_seconds(), 3)
+    run.bq_jobs.append({k: v for k, v in stats.items() if v is not None})
+
+
+def report_run(run: PipelineMetrics) -> None:
+    """Log the run summary and export it to the Prometheus textfile, if configured."""
+    summary = run.summary()
+    logger = get_logger(f"metrics.{run.pipeline}")
+    stage_text = ', '.join(
+        f"{name} {s['seconds']:.2f}s/{s['rows']} rows" for name, s in summary['stages'].items()
+    )
+    peak_mb = (summary['peak_rss_bytes'] or 0) / (1024 * 1024)
+    logger.info(
+        f"{run.pipeline} {run.status} in {run.seconds:.2f}s ({stage_text or 'no stages'}); "
+        f"peak RSS {peak_mb:.0f} MB; {summary['bigquery']['jobs']} BigQuery jobs, "
+        f"{summary['bigquery']['total_bytes_processed']} bytes processed, {summary['bigquery']['slot_millis']} slot-ms",
+        extra={'metrics': summary},
+    )
+    textfile_dir = get_instrumentation_config().get('prometheus_textfile_dir')
+    if textfile_dir:
+        try:
+            write_prometheus_textfile(summary, textfile_dir)
+        except OSError as e:
+            logger.warning(f"Could not write Prometheus metrics for {run.pipeline}: {e}")
+
+
+def _metric_lines(name: str, help_text: str, samples: List[tuple]) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value}")
+    return lines
+
+
+def write_prometheus_textfile(summary: dict, directory: str) -> str:
+    """Write a run summary as ``<directory>/pipeline_<name>.prom``; returns the path.
+
+    The file is replaced atomically so the collector never reads a partial file.
+    """
+    if not os.path.isabs(directory):
+        directory = os.path.join(PROJECT_ROOT, directory)
+    os.makedirs(directory, exist_ok=True)
+    pipeline = {'pipeline': summary['pipeline']}
+    stages = summary['stages'].items()
+    bq = summary['bigquery']
+    lines = []
+    lines += _metric_lines('pipeline_last_run_timestamp_seconds', 'Start time of the last run.',
+                           [(pipeline, datetime.fromisoformat(summary['started_at']).timestamp())])
+    lines += _metric_lines('pipeline_last_run_success', '1 if the last run succeeded, else 0.',
+                           [(pipeline, int(summary['status'] == 'succeeded'))])
+    lines += _metric_lines('pipeline_run_duration_seconds', 'Wall time of the last run.',
+                           [(pipeline, summary['seconds'])])
+    lines += _metric_lines('pipeline_peak_rss_bytes', 'Peak resident memory of the process at the end of the last run.',
+                           [(pipeline, summary['peak_rss_bytes'] or 0)])
+    lines += _metric_lines('pipeline_stage_duration_seconds', 'Exclusive time spent in each stage of the last run.',
+                           [({**pipeline, 'stage': name}, s['seconds']) for name, s in stages])
+    lines += _metric_lines('pipeline_stage_rows', 'Rows processed by each stage of the last run.',
+                           [({**pipeline, 'stage': name}, s['rows']) for name, s in stages])
+    lines += _metric_lines('pipeline_stage_bytes', 'Bytes processed by each stage of the last run.',
+                           [({**pipeline, 'stage': name}, s['bytes']) for name, s in stages])
+    lines += _metric_lines('pipeline_bigquery_bytes_processed', 'BigQuery bytes processed by the last run.',
+                           [(pipeline, bq['total_bytes_processed'])])
+    lines += _metric_lines('pipeline_bigquery_slot_milliseconds', 'BigQuery slot-milliseconds used by the last run.',
+                           [(pipeline, bq['slot_millis'])])
+    path = os.path.join(directory, f"pipeline_{summary['pipeline']}.prom")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+    return path
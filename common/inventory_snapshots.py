@@ -0,0 +1,183 @@
+"""Incremental daily inventory snapshots.
+
+The OLTP ``inventory`` table holds stock readings per product and warehouse
+(``stock_available`` as of ``last_updated``). A daily inventory fact needs
+the stock at the start and end of every day, so state has to roll forward
+over time. Instead of rescanning history, :class:`SnapshotState` keeps the
+last known stock per product and warehouse (plus each product's main seller)
+as of the end of a day in a small Parquet file, and :func:`daily_snapshots`
+rolls it forward over a window of new readings in a few vectorized
+group-by/merge passes:
+
+* the stock change of a location on a day is its last reading that day minus
+  its previous reading (from the window, else from the state)
+* a product's closing stock is its closing stock in the state plus the
+  cumulative sum of its daily changes over all warehouses
+* ``opening_stock`` is the previous closing stock, ``stock_sold`` the units
+  ordered that day and ``stock_in`` what the balance
+  ``closing = opening + stock_in - stock_sold`` requires (never negative;
+  restock quantities are not recorded in the OLTP schema)
+
+One row is emitted per product and day with a reading or a sale; stock is
+unchanged on other days.
+"""
+import os
+from datetime import date
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from common.watermarks import get_state_dir
+
+STATE_FILE = 'inventory_state.parquet'
+AS_OF_METADATA_KEY = b'inventory_state.as_of'
+LOCATION_KEYS = ['product_id', 'warehouse_id']
+
+OUTPUT_COLUMNS = [
+    'inventory_id', 'product_id', 'seller_id', 'date_id',
+    'opening_stock', 'stock_in', 'stock_sold', 'closing_stock',
+    'stockout_flag', 'restock_date'
+]
+
+
+def get_state_path() -> str:
+    return os.path.join(get_state_dir(), STATE_FILE)
+
+
+class SnapshotState:
+    """Last known stock per product and warehouse as of the end of ``as_of``.
+
+    Args:
+        locations: DataFrame with ``product_id``, ``warehouse_id``, ``stock``
+        sellers: DataFrame with ``product_id``, ``seller_id``
+        as_of: Last day folded into the state (None for an empty state)
+    """
+
+    def __init__(self, locations: Optional[pd.DataFrame] = None, sellers: Optional[pd.DataFrame] = None,
+                 as_of: Optional[date] = None):
+        self.locations = locations if locations is not None else pd.DataFrame(
+            {'product_id': pd.Series(dtype='string'), 'warehouse_id': pd.Series(dtype='string'),
+             'stock': pd.Series(dtype='int64')})
+        self.sellers = sellers if sellers is not None else pd.DataFrame(
+            {'product_id': pd.Series(dtype='string'), 'seller_id': pd.Series(dtype='string')})
+        self.as_of = as_of
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> 'SnapshotState':
+        """Read the state file, or return an empty state if there is none."""
+        path = path or get_state_path()
+        if not os.path.exists(path):
+            return cls()
+        table = pq.read_table(path)
+        as_of = (table.schema.metadata or {}).get(AS_OF_METADATA_KEY, b'').decode()
+        df = table.to_pandas()
+        locations = df.loc[df['warehouse_id'].notna(), ['product_id', 'warehouse_id', 'stock']].reset_index(drop=True)
+        sellers = df.loc[df['warehouse_id'].isna(), ['product_id', 'seller_id']].reset_index(drop=True)
+        return cls(locations.astype({'stock': 'int64'}), sellers, date.fromisoformat(as_of) if as_of else None)
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Write the state atomically: location rows plus one seller row per product."""
+        path = path or get_state_path()
+        df = pd.concat([
+            self.locations.assign(seller_id=pd.NA),
+            self.sellers.assign(warehouse_id=pd.NA, stock=0),
+        ], ignore_index=True)[['product_id', 'warehouse_id', 'stock', 'seller_id']]
+        df = df.astype({'product_id': 'string', 'warehouse_id': 'string', 'stock': 'int64', 'seller_id': 'string'})
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({AS_OF_METADATA_KEY: (self.as_of.isoformat() if self.as_of else '').encode()})
+        tmp_path = f"{path}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+
+    def product_stock(self) -> pd.DataFrame:
+        """Total stock per product over all warehouses."""
+        return self.locations.groupby('product_id', as_index=False)['stock'].sum()
+
+
+def _daily_readings(snapshots: pd.DataFrame) -> pd.DataFrame:
+    """Last reading per product, warehouse and day."""
+    readings = snapshots.assign(
+        product_id=snapshots['product_id'].astype('string'),
+        warehouse_id=snapshots['warehouse_id'].astype('string'),
+        day=pd.to_datetime(snapshots['last_updated']).dt.normalize(),
+        stock_available=pd.to_numeric(snapshots['stock_available']).fillna(0).astype('int64'),
+    )
+    readings = readings.sort_values('last_updated', kind='stable')
+    return readings.drop_duplicates(LOCATION_KEYS + ['day'], keep='last')
+
+
+def advance_state(state: SnapshotState, snapshots: pd.DataFrame, as_of: date,
+                  sellers: Optional[pd.DataFrame] = None) -> SnapshotState:
+    """Fold the readings up to the end of ``as_of`` (and newer main sellers) into a new state."""
+    readings = _daily_readings(snapshots)
+    readings = readings[readings['day'] <= pd.Timestamp(as_of)]
+    latest = readings.drop_duplicates(LOCATION_KEYS, keep='last').rename(columns={'stock_available': 'stock'})
+    locations = pd.concat([state.locations, latest[LOCATION_KEYS + ['stock']]], ignore_index=True)
+    locations = locations.drop_duplicates(LOCATION_KEYS, keep='last').reset_index(drop=True)
+    merged_sellers = state.sellers
+    if sellers is not None and len(sellers):
+        merged_sellers = pd.concat([state.sellers, sellers[['product_id', 'seller_id']].astype('string')], ignore_index=True)
+        merged_sellers = merged_sellers.drop_duplicates('product_id', keep='last').reset_index(drop=True)
+    return SnapshotState(locations, merged_sellers, as_of)
+
+
+def daily_snapshots(state: SnapshotState, snapshots: pd.DataFrame, units_sold: pd.DataFrame,
+                    sellers: Optional[pd.DataFrame] = None, start=None, end=None) -> pd.DataFrame:
+    """Roll ``state`` forward over a window and return one row per product and active day.
+
+    Args:
+        state: Stock as of the day before the window
+        snapshots: Inventory readings in the window (``product_id``,
+            ``warehouse_id``, ``stock_available``, ``restock_date``,
+            ``last_updated``)
+        units_sold: ``product_id``, ``date_id``, ``stock_sold`` for the window
+        sellers: ``product_id``, ``seller_id`` main seller per product;
+            products without one fall back to the state, then 'unknown'
+        start, end: Optional first and last day to emit
+
+    Returns:
+        DataFrame with the fact_inventory columns
+    """
+    readings = _daily_readings(snapshots)
+    readings = readings.sort_values(LOCATION_KEYS + ['day'], kind='stable').reset_index(drop=True)
+
+    # Change per location and day against its previous reading
+    previous = readings.groupby(LOCATION_KEYS, sort=False)['stock_available'].shift()
+    known = readings[LOCATION_KEYS].merge(state.locations, on=LOCATION_KEYS, how='left')['stock']
+    previous = previous.fillna(known).fillna(0)
+    readings['delta'] = readings['stock_available'] - previous.astype('int64')
+    readings['restock_date'] = pd.to_datetime(readings['restock_date'], errors='coerce')
+    changes = readings.groupby(['product_id', 'day'], as_index=False).agg(
+        delta=('delta', 'sum'), restock_date=('restock_date', 'max'))
+
+    sold = units_sold.rename(columns={'date_id': 'day'})[['product_id', 'day', 'stock_sold']]
+    sold = sold.assign(product_id=sold['product_id'].astype('string'), day=pd.to_datetime(sold['day']))
+    days = changes.merge(sold, on=['product_id', 'day'], how='outer')
+    if start is not None:
+        days = days[days['day'] >= pd.Timestamp(start)]
+    if end is not None:
+        days = days[days['day'] <= pd.Timestamp(end)]
+    days['delta'] = days['delta'].fillna(0).astype('int64')
+    days['stock_sold'] = days['stock_sold'].fillna(0).astype('int64')
+    days = days.sort_values(['product_id', 'day'], kind='stable').reset_index(drop=True)
+
+    # Closing stock: the state's stock plus the running sum of daily changes
+    opening = days[['product_id']].merge(state.product_stock(), on='product_id', how='left')['stock']
+    days['closing_stock'] = opening.fillna(0).astype('int64') + days.groupby('product_id')['delta'].cumsum()
+    days['opening_stock'] = days['closing_stock'] - days['delta']
+    days['stock_in'] = (days['closing_stock'] - days['opening_stock'] + days['stock_sold']).clip(lower=0)
+    days['stockout_flag'] = days['closing_stock'] <= 0
+    days['restock_date'] = days.groupby('product_id')['restock_date'].ffill()
+
+    main_sellers = state.sellers
+    if sellers is not None and len(sellers):
+        main_sellers = pd.concat([state.sellers, sellers[['product_id', 'seller_id']].astype('string')])
+        main_sellers = main_sellers.drop_duplicates('product_id', keep='last')
+    days = days.merge(main_sellers, on='product_id', how='left')
+    days['seller_id'] = days['seller_id'].fillna('unknown')
+
+    days = days.rename(columns={'day': 'date_id'})
+    days['inventory_id'] = days['product_id'] + '_' + days['date_id'].dt.strftime('%Y%m%d')
+    return days[OUTPUT_COLUMNS]
@@ -0,0 +1,97 @@
+"""Local cache of dimension key sets for referential-integrity checks.
+
+Dimension pipelines publish the natural keys they loaded with
+:func:`publish_keys`; fact pipelines check their foreign keys against them
+through :func:`get_key_set` (the ``key_provider`` of
+:class:`common.dq_checks.DQChecker`) without querying BigQuery.
+
+A key set is stored as a sorted, de-duplicated array of 64-bit hashes of the
+keys' string form in ``<state_dir>/keys/<dimension>.npy`` (8 bytes per key),
+memory-mapped on read, and probed with a vectorized binary search.
+"""
+import os
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from common.coercion import to_string
+from common.logging_utils import get_logger
+from common.watermarks import get_state_dir
+
+KEY_DIR = 'keys'
+
+logger = get_logger(__name__)
+
+_cache: Dict[str, Tuple[float, 'KeySet']] = {}
+_cache_lock = threading.Lock()
+
+
+def hash_keys(values: Iterable) -> np.ndarray:
+    """Hash keys to uint64 by their string form, so 1, '1' and b'1' match."""
+    series = values if isinstance(values, pd.Series) else pd.Series(values)
+    strings = to_string(series.dropna())
+    return pd.util.hash_array(strings.to_numpy(dtype=object))
+
+
+class KeySet:
+    """Sorted array of key hashes with vectorized membership tests."""
+
+    def __init__(self, hashes: np.ndarray):
+        self.hashes = hashes
+
+    @classmethod
+    def from_values(cls, values: Iterable) -> 'KeySet':
+        return cls(np.unique(hash_keys(values)))
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def contains(self, values: Iterable) -> np.ndarray:
+        """Return a boolean array telling which (non-null) values are in the set."""
+        probe = hash_keys(values)
+        if len(self.hashes) == 0:
+            return np.zeros(len(probe), dtype=bool)
+        positions = np.searchsorted(self.hashes, probe)
+        positions[positions == len(self.hashes)] = 0
+        return self.hashes[positions] == probe
+
+
+def _key_path(dimension: str) -> str:
+    directory = os.path.join(get_state_dir(), KEY_DIR)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{dimension}.npy")
+
+
+def publish_keys(dimension: str, values: Iterable) -> int:
+    """Replace the cached key set of a dimension; returns the number of distinct keys.
+
+    Call after the dimension has been loaded successfully, so facts are only
+    checked against keys that exist in the warehouse.
+    """
+    key_set = KeySet.from_values(values)
+    path = _key_path(dimension)
+    tmp_path = f"{path}.tmp.npy"
+    np.save(tmp_path, key_set.hashes)
+    os.replace(tmp_path, path)
+    logger.info(f"Published {len(key_set)} keys for {dimension}")
+    return len(key_set)
+
+
+def get_key_set(dimension: str) -> Optional[KeySet]:
+    """Return the cached key set of a dimension, or None if it was never published.
+
+    The file is memory-mapped and reused until it is replaced.
+    """
+    path = _key_path(dimension)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _cache_lock:
+        cached = _cache.get(dimension)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, KeySet(np.load(path, mmap_mode='r')))
+            _cache[dimension] = cached
+        return cached[1]
@@ -1,10 +1,66 @@
+import json
 import logging
+import os
 
-def get_logger(name):
+# Set PIPELINE_LOG_FORMAT=json (or instrumentation.log_format: json in the
+# pipeline config) to emit one JSON object per log line
+LOG_FORMAT_ENV = 'PIPELINE_LOG_FORMAT'
+TEXT_FORMAT = '[%(asctime)s] %(levelname)s %(name)s: %(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as JSON; a ``metrics`` dict passed via ``extra`` is merged in."""
+
+    def format(self, record):
+        payload = {
+            'timestamp': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        metrics = getattr(record, 'metrics', None)
+        if isinstance(metrics, dict):
+            payload.update(metrics)
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+def get_log_format():
+    log_format = os.environ.get(LOG_FORMAT_ENV)
+    if not log_format:
+        from common.config import PIPELINE_CONFIG
+        log_format = (PIPELINE_CONFIG.get('instrumentation') or {}).get('log_format', 'text')
+    return log_format.lower()
+
+
+class ConfiguredFormatter(logging.Formatter):
+    """Text or JSON, per :func:`get_log_format`, decided when the first record is formatted.
+
+    Loggers are created at import time; deferring the choice keeps importing a
+    module from parsing the pipeline config.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._formatter = None
+
+    def format(self, record):
+        if self._formatter is None:
+            self._formatter = JsonFormatter() if get_log_format() == 'json' else logging.Formatter(TEXT_FORMAT)
+        return self._formatter.format(record)
+
+
+def get_logger(name, json_format=None):
     logger = logging.getLogger(name)
     if not logger.handlers:
         handler = logging.StreamHandler()
-        formatter = logging.Formatter('[%(asctime)s] %(levelname)s %(name)s: %(message)s')
+        if json_format is None:
+            formatter = ConfiguredFormatter()
+        elif json_format:
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter(TEXT_FORMAT)
         handler.setFormatter(formatter)
         logger.addHandler(handler)
     logger.setLevel(logging.INFO)
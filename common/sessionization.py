@@ -0,0 +1,181 @@
+"""Inactivity-gap sessionization of event streams.
+
+A session is a run of one customer's events in which no two consecutive
+events are more than ``gap`` apart. :class:`Sessionizer` assigns session ids
+chunk by chunk with a vectorized sort + diff over full timestamps::
+
+    sessionizer = Sessionizer.load('fact_cart', gap, since)
+    for chunk in chunks:
+        chunk['session_id'] = sessionizer.assign(chunk)
+    sessionizer.save(next_since)
+
+Sessions may span chunks and runs: the last event of every customer is kept
+as the open session and continued by the customer's next event if it falls
+within the gap. Events must therefore arrive in time order per customer
+(chunks may interleave customers, e.g. from a customer-range parallel
+extract). Between runs, the sessions open at the next run's extract lower
+bound are saved to ``<state_dir>/sessions_<name>.parquet``, so re-read
+lookback days get the same ids.
+
+Session ids are ``<customer>_<session start as epoch seconds>``: stable
+across re-runs and unique, since a customer's sessions start more than
+``gap`` apart.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from common.logging_utils import get_logger
+from common.watermarks import get_state_dir
+
+DEFAULT_GAP = timedelta(minutes=30)
+CUTOFF_METADATA_KEY = b'sessions.cutoff'
+
+SESSION_COLUMNS = ['customer', 'last_event_time', 'session_id']
+
+# Per-day history is compacted once it doubles, but not below this many rows
+MIN_COMPACT_ROWS = 1_000_000
+
+_NO_SESSION = (np.datetime64('NaT', 'ns'), None)
+
+logger = get_logger(__name__)
+
+
+def get_sessions_path(name: str) -> str:
+    return os.path.join(get_state_dir(), f"sessions_{name}.parquet")
+
+
+def _empty_sessions() -> pd.DataFrame:
+    return pd.DataFrame({'customer': pd.Series(dtype='string'),
+                         'last_event_time': pd.Series(dtype='datetime64[ns]'),
+                         'session_id': pd.Series(dtype='string')})
+
+
+class Sessionizer:
+    """Assigns inactivity-gap session ids to time-ordered event chunks.
+
+    Args:
+        name: State file name (``sessions_<name>.parquet``)
+        gap: Largest pause between two events of one session
+        open_sessions: Sessions open before the first chunk (``customer``,
+            ``last_event_time``, ``session_id``)
+        lookback_days: Re-read window of the caller's extracts; bounds how
+            much per-day history :meth:`save` needs
+        customer_column, time_column: Columns of the event chunks
+    """
+
+    def __init__(self, name: str, gap: timedelta = DEFAULT_GAP, open_sessions: Optional[pd.DataFrame] = None,
+                 lookback_days: int = 1, customer_column: str = 'customer_id', time_column: str = 'event_time'):
+        self.name = name
+        self.gap = pd.Timedelta(gap)
+        self.lookback = pd.Timedelta(days=lookback_days)
+        self.customer_column = customer_column
+        self.time_column = time_column
+        open_sessions = open_sessions if open_sessions is not None else _empty_sessions()
+        # customer -> (last event time, session id) of its latest session
+        self.open = dict(zip(open_sessions['customer'].tolist(),
+                             zip(open_sessions['last_event_time'].to_numpy(dtype='datetime64[ns]'),
+                                 open_sessions['session_id'].tolist())))
+        # Last event per customer and day, pruned to what a later cutoff can need
+        self.daily = [open_sessions.assign(day=open_sessions['last_event_time'].dt.normalize())]
+        self.daily_rows = len(open_sessions)
+        self.compacted_rows = 0
+        self.max_day = None
+
+    @classmethod
+    def load(cls, name: str, gap: timedelta = DEFAULT_GAP, since: Optional[datetime] = None, **kwargs) -> 'Sessionizer':
+        """Start from the sessions saved for extracts from ``since`` on (none for a full extract)."""
+        path = get_sessions_path(name)
+        if since is None or not os.path.exists(path):
+            return cls(name, gap, **kwargs)
+        table = pq.read_table(path)
+        cutoff = (table.schema.metadata or {}).get(CUTOFF_METADATA_KEY, b'').decode()
+        sessions = table.to_pandas()
+        since = pd.Timestamp(since)
+        if cutoff != since.isoformat():
+            logger.warning(f"Saved {name} sessions are open at {cutoff or 'unknown'}, not at {since}; "
+                           "sessions spanning that point may be split")
+            sessions = sessions[sessions['last_event_time'] < since]
+        return cls(name, gap, sessions.reset_index(drop=True), **kwargs)
+
+    def assign(self, df: pd.DataFrame) -> pd.Series:
+        """Return the session id of every event in ``df`` (aligned with its index)."""
+        events = pd.DataFrame({'customer': df[self.customer_column].astype('string').to_numpy(),
+                               'event_time': pd.to_datetime(df[self.time_column]).to_numpy(dtype='datetime64[ns]'),
+                               'position': np.arange(len(df))})
+        events = events[events['customer'].notna() & events['event_time'].notna()]
+        result = np.full(len(df), pd.NA, dtype=object)
+        if events.empty:
+            return pd.Series(result, index=df.index, dtype='string')
+        events = events.sort_values(['customer', 'event_time'], kind='stable').reset_index(drop=True)
+        customer = events['customer']
+        event_time = events['event_time']
+
+        first = customer.ne(customer.shift()).fillna(True).to_numpy(dtype=bool)
+        previous = event_time.shift()
+        # The first event of each customer continues its open session, if any
+        state = [self.open.get(key, _NO_SESSION) for key in customer[first].tolist()]
+        previous[first] = np.array([time for time, _ in state], dtype='datetime64[ns]')
+        new_session = ~((event_time - previous) <= self.gap).to_numpy()
+
+        session_id = pd.Series(pd.NA, index=events.index, dtype='string')
+        starts = events[new_session]
+        epoch_seconds = (starts['event_time'] - pd.Timestamp(0)) // pd.Timedelta(seconds=1)
+        session_id[new_session] = starts['customer'] + '_' + epoch_seconds.astype('string')
+        continued = first & ~new_session
+        session_id[continued] = np.array([key for _, key in state], dtype=object)[~new_session[first]]
+        # Every customer's first event has an id, so filling forward stays within customers
+        session_id = session_id.ffill()
+
+        self._observe(events.assign(session_id=session_id))
+        result[events['position'].to_numpy()] = session_id.to_numpy()
+        return pd.Series(result, index=df.index, dtype='string')
+
+    def _observe(self, events: pd.DataFrame) -> None:
+        last = events.drop_duplicates('customer', keep='last')
+        self.open.update(zip(last['customer'].tolist(),
+                             zip(last['event_time'].to_numpy(), last['session_id'].tolist())))
+
+        daily = events.assign(day=events['event_time'].dt.normalize())
+        daily = daily.drop_duplicates(['customer', 'day'], keep='last')
+        daily = daily.rename(columns={'event_time': 'last_event_time'})[SESSION_COLUMNS + ['day']]
+        self.daily.append(daily)
+        self.daily_rows += len(daily)
+        self.max_day = daily['day'].max() if self.max_day is None else max(self.max_day, daily['day'].max())
+        if self.daily_rows > max(2 * self.compacted_rows, MIN_COMPACT_ROWS):
+            self._compact()
+
+    def _compact(self) -> None:
+        # Cutoffs are at least max_day - lookback: per customer, only the last
+        # day before that and the days after it can still be needed
+        daily = pd.concat(self.daily, ignore_index=True)
+        threshold = self.max_day - self.lookback
+        older = daily[daily['day'] < threshold].sort_values('last_event_time', kind='stable')
+        daily = pd.concat([older.drop_duplicates('customer', keep='last'), daily[daily['day'] >= threshold]],
+                          ignore_index=True)
+        self.daily = [daily]
+        self.daily_rows = self.compacted_rows = len(daily)
+
+    def sessions_at(self, cutoff: datetime) -> pd.DataFrame:
+        """Sessions open at ``cutoff``: each customer's last event before it, if within the gap."""
+        cutoff = pd.Timestamp(cutoff)
+        daily = pd.concat(self.daily, ignore_index=True)
+        before = daily[daily['last_event_time'] < cutoff].sort_values('last_event_time', kind='stable')
+        before = before.drop_duplicates('customer', keep='last')
+        return before.loc[before['last_event_time'] >= cutoff - self.gap, SESSION_COLUMNS].reset_index(drop=True)
+
+    def save(self, cutoff: datetime) -> None:
+        """Persist the sessions open at ``cutoff``, the next run's extract lower bound."""
+        sessions = self.sessions_at(cutoff)
+        table = pa.Table.from_pandas(sessions, preserve_index=False)
+        table = table.replace_schema_metadata({CUTOFF_METADATA_KEY: pd.Timestamp(cutoff).isoformat().encode()})
+        path = get_sessions_path(self.name)
+        tmp_path = f"{path}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved {len(sessions)} {self.name} sessions open at {cutoff}")
@@ -0,0 +1,334 @@
+"""Warehouse sinks: where pipelines load their data.
+
+Every pipeline loads through the sink returned by :func:`get_sink`, selected
+with ``sink.type`` in the pipeline config (or the ``PIPELINE_SINK``
+environment variable):
+
+* ``bigquery`` (default): :class:`BigQuerySink`, the BigQuery loaders of
+  common/bigquery_client.py
+* ``duckdb``: :class:`DuckDBSink`, a local DuckDB database for dev runs, CI
+  and performance work, with no GCP credentials or uploads
+
+Both implement the same operations: ``load`` (with the table's
+``load_strategy``: append, truncate, merge or replace_partitions),
+``replace_rows`` and ``delete_rows`` (CDC), ``query`` (validation, returns
+a DataFrame) and ``table_id`` (the table's name in the sink's SQL dialect).
+
+The DuckDB sink creates its tables from the ``project_setup/bigquery_sql``
+DDL, with BigQuery types translated, in a schema named after the BigQuery
+dataset. After each load it can export the table as Hive-partitioned
+Parquet under ``sink.duckdb.parquet_dir``, partitioned by the table's
+``partition_field``.
+"""
+import atexit
+import os
+import shutil
+import threading
+import uuid
+from typing import Iterable, Optional
+
+import pandas as pd
+
+from common.bigquery_client import (delete_rows_in_bq, get_bq_client, get_partitioning, get_table_config,
+                                    load_with_strategy, replace_rows_in_bq)
+from common.bq_schema import get_table_names, get_table_schema
+from common.config import PIPELINE_CONFIG, get_sink_config, get_sink_type
+from common.instrumentation import record_bq_job
+from common.logging_utils import get_logger
+from common.staging import arrow_schema, dataframe_to_arrow
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_DUCKDB_PATH = 'state/warehouse.duckdb'
+
+# BigQuery column types mapped to their DuckDB equivalents
+BQ_TO_DUCKDB_TYPES = {
+    'STRING': 'VARCHAR',
+    'BYTES': 'BLOB',
+    'INT64': 'BIGINT',
+    'INTEGER': 'BIGINT',
+    'FLOAT64': 'DOUBLE',
+    'FLOAT': 'DOUBLE',
+    'NUMERIC': 'DECIMAL(38, 9)',
+    'BIGNUMERIC': 'DOUBLE',
+    'BOOL': 'BOOLEAN',
+    'BOOLEAN': 'BOOLEAN',
+    'DATE': 'DATE',
+    'DATETIME': 'TIMESTAMP',
+    'TIMESTAMP': 'TIMESTAMPTZ',
+}
+
+logger = get_logger(__name__)
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def _resolve(path: str) -> str:
+    return path if os.path.isabs(path) else os.path.join(PROJECT_ROOT, path)
+
+
+class BigQuerySink:
+    """Loads into the configured BigQuery dataset."""
+
+    name = 'bigquery'
+
+    def __init__(self, dataset: Optional[str] = None):
+        self.project = PIPELINE_CONFIG['bigquery']['project_id']
+        self.dataset = dataset or PIPELINE_CONFIG['bigquery']['dataset']
+
+    @property
+    def client(self):
+        return get_bq_client()
+
+    def table_id(self, table: str) -> str:
+        return f"`{self.project}.{self.dataset}.{table}`"
+
+    def load(self, chunks: Iterable[pd.DataFrame], table: str, strategy: Optional[str] = None) -> int:
+        return load_with_strategy(self.client, chunks, self.dataset, table, strategy)
+
+    def replace_rows(self, chunks: Iterable[pd.DataFrame], table: str, key_column: str, keys) -> int:
+        return replace_rows_in_bq(self.client, chunks, self.dataset, table, key_column, keys)
+
+    def delete_rows(self, table: str, key_column: str, keys) -> int:
+        return delete_rows_in_bq(self.client, self.dataset, table, key_column, keys)
+
+    def query(self, sql: str) -> pd.DataFrame:
+        job = self.client.query(sql)
+        df = job.to_dataframe()
+        record_bq_job(job)
+        return df
+
+    def close(self) -> None:
+        pass
+
+
+def build_duckdb_ddl(table: str, schema: str) -> str:
+    """Translate a table's BigQuery DDL into a DuckDB ``CREATE TABLE IF NOT EXISTS``."""
+    columns = ',\n  '.join(
+        f'"{column.name}" {BQ_TO_DUCKDB_TYPES.get(column.type, column.type)}{"" if column.nullable else " NOT NULL"}'
+        for column in get_table_schema(table)
+    )
+    return f'CREATE TABLE IF NOT EXISTS "{schema}"."{table}" (\n  {columns}\n)'
+
+
+def _duckdb_partition_expr(column: str, partition_type: str) -> str:
+    if partition_type == 'DAY':
+        return f'CAST("{column}" AS DATE)'
+    if partition_type == 'HOUR':
+        return f"date_trunc('hour', \"{column}\")"
+    return f"CAST(date_trunc('{partition_type.lower()}', \"{column}\") AS DATE)"
+
+
+class DuckDBSink:
+    """Loads into a local DuckDB database, optionally mirrored as Hive-partitioned Parquet.
+
+    Args:
+        path: Database file (``sink.duckdb.path``, default state/warehouse.duckdb)
+        parquet_dir: Export tables here after each load (``sink.duckdb.parquet_dir``)
+        schema: Schema holding the tables (default: the BigQuery dataset name)
+    """
+
+    name = 'duckdb'
+
+    def __init__(self, path: Optional[str] = None, parquet_dir: Optional[str] = None, schema: Optional[str] = None):
+        # Only needed for this sink, so imported lazily
+        import duckdb
+
+        config = get_sink_config().get('duckdb') or {}
+        self.path = _resolve(path or config.get('path', DEFAULT_DUCKDB_PATH))
+        parquet_dir = parquet_dir or config.get('parquet_dir')
+        self.parquet_dir = _resolve(parquet_dir) if parquet_dir else None
+        self.schema = schema or PIPELINE_CONFIG.get('bigquery', {}).get('dataset', 'ecommerce_dw')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.connection = duckdb.connect(self.path)
+        self.create_tables()
+
+    def create_tables(self) -> None:
+        """Create the schema and every DDL table that does not exist yet."""
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f'CREATE SCHEMA IF NOT EXISTS "{self.schema}"')
+            for table in get_table_names():
+                cursor.execute(build_duckdb_ddl(table, self.schema))
+        finally:
+            cursor.close()
+
+    def table_id(self, table: str) -> str:
+        return f'"{self.schema}"."{table}"'
+
+    def _stage(self, cursor, chunks: Iterable[pd.DataFrame], table: str) -> tuple:
+        """Insert the chunks into a temporary table with ``table``'s columns; returns ``(name, rows)``."""
+        staging = f"{table}__staging_{uuid.uuid4().hex[:12]}"
+        schema = arrow_schema(table)
+        column_list = ', '.join(f'"{name}"' for name in schema.names)
+        cursor.execute(f'CREATE TEMP TABLE "{staging}" AS SELECT * FROM {self.table_id(table)} LIMIT 0')
+        rows = 0
+        for chunk in chunks:
+            batch = dataframe_to_arrow(chunk, schema)
+            cursor.register('batch', batch)
+            cursor.execute(f'INSERT INTO "{staging}" ({column_list}) SELECT {column_list} FROM batch')
+            cursor.unregister('batch')
+            rows += batch.num_rows
+        return staging, rows
+
+    def _apply(self, table: str, chunks: Iterable[pd.DataFrame], statements) -> int:
+        """Stage ``chunks`` and run ``statements(staging)`` in one transaction; returns the staged rows."""
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute('BEGIN TRANSACTION')
+            staging, rows = self._stage(cursor, chunks, table)
+            if rows == 0:
+                cursor.execute('ROLLBACK')
+                return 0
+            for sql in statements(staging):
+                cursor.execute(sql)
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        finally:
+            cursor.close()
+        self.export_parquet(table)
+        return rows
+
+    def load(self, chunks: Iterable[pd.DataFrame], table: str, strategy: Optional[str] = None) -> int:
+        """Load chunks with the table's configured load strategy (see ``load_with_strategy``)."""
+        config = get_table_config(table)
+        strategy = strategy or config.get('load_strategy', 'append')
+        target = self.table_id(table)
+        columns = [c.name for c in get_table_schema(table)]
+        column_list = ', '.join(f'"{c}"' for c in columns)
+
+        def insert(staging):
+            return f'INSERT INTO {target} ({column_list}) SELECT {column_list} FROM "{staging}"'
+
+        if strategy == 'append':
+            statements = lambda staging: [insert(staging)]
+        elif strategy == 'truncate':
+            statements = lambda staging: [f'DELETE FROM {target}', insert(staging)]
+        elif strategy == 'merge':
+            keys = config.get('merge_keys')
+            if not keys:
+                raise ValueError(f"Table {table} uses the merge load strategy but has no merge_keys configured")
+            hashed = [c for c in columns if c not in keys and c not in config.get('hash_exclude', [])]
+            on = ' AND '.join(f'T."{k}" = S."{k}"' for k in keys)
+            changed = ' OR '.join(f'T."{c}" IS DISTINCT FROM S."{c}"' for c in hashed) or 'FALSE'
+            key_list = ', '.join(f'"{k}"' for k in keys)
+            statements = lambda staging: [
+                # Duplicate keys in the batch collapse to one row, as with MERGE
+                f'DELETE FROM "{staging}" WHERE rowid NOT IN (SELECT MIN(rowid) FROM "{staging}" GROUP BY {key_list})',
+                f'DELETE FROM {target} T WHERE EXISTS (SELECT 1 FROM "{staging}" S WHERE {on} AND ({changed}))',
+                f'INSERT INTO {target} ({column_list}) SELECT {column_list} FROM "{staging}" S '
+                f'WHERE NOT EXISTS (SELECT 1 FROM {target} T WHERE {on})',
+            ]
+        elif strategy == 'replace_partitions':
+            partitioning = get_partitioning(table)
+            if partitioning is None:
+                raise ValueError(f"Table {table} uses the replace_partitions load strategy but has no partition_field configured")
+            column, _, partition_type = partitioning
+            expr = _duckdb_partition_expr(column, partition_type)
+            statements = lambda staging: [
+                f'DELETE FROM {target} WHERE {expr} IN (SELECT DISTINCT {expr} FROM "{staging}") '
+                f'OR ("{column}" IS NULL AND EXISTS (SELECT 1 FROM "{staging}" WHERE "{column}" IS NULL))',
+                insert(staging),
+            ]
+        else:
+            raise ValueError(f"Unknown load strategy for {table}: {strategy}")
+        rows = self._apply(table, chunks, statements)
+        logger.info(f"Loaded {rows} rows into {self.path}:{table} ({strategy})")
+        return rows
+
+    def replace_rows(self, chunks: Iterable[pd.DataFrame], table: str, key_column: str, keys) -> int:
+        """Replace every row whose ``key_column`` is in ``keys`` with the rows of the batch."""
+        rows = self._apply(table, chunks, lambda staging: [
+            self._delete_sql(table, key_column, keys),
+            f'INSERT INTO {self.table_id(table)} SELECT * FROM "{staging}"',
+        ])
+        if rows == 0:
+            self.delete_rows(table, key_column, keys)
+        return rows
+
+    def _delete_sql(self, table: str, key_column: str, keys) -> str:
+        column_type = {c.name: c.type for c in get_table_schema(table)}[key_column]
+        values = ', '.join(
+            "'" + str(k).replace("'", "''") + "'" if column_type == 'STRING' else str(int(k)) for k in keys
+        )
+        return f'DELETE FROM {self.table_id(table)} WHERE "{key_column}" IN ({values or "NULL"})'
+
+    def delete_rows(self, table: str, key_column: str, keys) -> int:
+        """Delete every row whose ``key_column`` is in ``keys``; returns the rows deleted."""
+        if not len(keys):
+            return 0
+        cursor = self.connection.cursor()
+        try:
+            deleted = cursor.execute(self._delete_sql(table, key_column, keys)).fetchone()[0]
+        finally:
+            cursor.close()
+        self.export_parquet(table)
+        return deleted
+
+    def query(self, sql: str) -> pd.DataFrame:
+        cursor = self.connection.cursor()
+        try:
+            return cursor.execute(sql).df()
+        finally:
+            cursor.close()
+
+    def export_parquet(self, table: str) -> None:
+        """Rewrite ``<parquet_dir>/<table>``, Hive-partitioned on the table's partition field."""
+        if not self.parquet_dir:
+            return
+        directory = os.path.join(self.parquet_dir, table)
+        tmp_dir = f"{directory}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        partitioning = get_partitioning(table)
+        cursor = self.connection.cursor()
+        try:
+            if partitioning is None:
+                os.makedirs(tmp_dir)
+                cursor.execute(f"COPY {self.table_id(table)} TO '{tmp_dir}/data.parquet' (FORMAT parquet)")
+            else:
+                column, _, partition_type = partitioning
+                key = f"{column}_{partition_type.lower()}"
+                cursor.execute(
+                    f"COPY (SELECT *, {_duckdb_partition_expr(column, partition_type)} AS \"{key}\" "
+                    f"FROM {self.table_id(table)}) TO '{tmp_dir}' (FORMAT parquet, PARTITION_BY (\"{key}\"))"
+                )
+        finally:
+            cursor.close()
+        # Swap the directories so readers never see a half-written table
+        old_dir = f"{directory}.old"
+        if os.path.exists(directory):
+            os.replace(directory, old_dir)
+        os.replace(tmp_dir, directory)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+SINK_TYPES = {'bigquery': BigQuerySink, 'duckdb': DuckDBSink}
+
+
+def get_sink():
+    """Return the process-wide sink of the configured type, created on first use."""
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            sink_type = get_sink_type()
+            if sink_type not in SINK_TYPES:
+                raise ValueError(f"Unknown sink type {sink_type!r}; expected one of {', '.join(SINK_TYPES)}")
+            _sink = SINK_TYPES[sink_type]()
+        return _sink
+
+
+def close_sink():
+    """Close the shared sink, if one was created."""
+    global _sink
+    with _sink_lock:
+        if _sink is not None:
+            _sink.close()
+            _sink = None
+
+
+atexit.register(close_sink)
@@ -0,0 +1,245 @@
+"""Columnar Parquet staging for warehouse loads.
+
+Pipelines hand DataFrame chunks to a :class:`ParquetStager`, which converts
+each chunk to Arrow using the table's schema from the BigQuery DDL and
+appends it to a single compressed Parquet file. The file is then loaded with
+one load job per table, instead of one ``load_table_from_dataframe`` call
+(and one schema inference) per DataFrame.
+
+Two backends are available, selected by ``staging.backend``:
+
+* ``local``: files are written under ``staging.local_dir`` and uploaded by the
+  load job itself. Needs no GCP access, so staging can be exercised offline.
+* ``gcs``: files are written locally, uploaded to ``staging.bucket`` and
+  loaded from their ``gs://`` URI.
+"""
+import os
+import time
+import uuid
+from typing import Iterable, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from common.bq_schema import get_table_schema
+from common.config import PIPELINE_CONFIG
+from common.instrumentation import stage
+from common.logging_utils import get_logger
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+DEFAULT_STAGING_CONFIG = {
+    'backend': 'local',
+    'local_dir': 'state/staging',
+    'bucket': None,
+    'prefix': 'staging',
+    'compression': 'zstd',
+    'row_group_size': 128 * 1024,
+    'keep_files': False,
+}
+
+# BigQuery column types mapped to the Arrow types BigQuery loads them from
+BQ_TO_ARROW_TYPES = {
+    'STRING': pa.string(),
+    'BYTES': pa.binary(),
+    'INT64': pa.int64(),
+    'INTEGER': pa.int64(),
+    'FLOAT64': pa.float64(),
+    'FLOAT': pa.float64(),
+    'NUMERIC': pa.decimal128(38, 9),
+    'BIGNUMERIC': pa.decimal256(76, 38),
+    'BOOL': pa.bool_(),
+    'BOOLEAN': pa.bool_(),
+    'DATE': pa.date32(),
+    'DATETIME': pa.timestamp('us'),
+    'TIMESTAMP': pa.timestamp('us', tz='UTC'),
+}
+
+logger = get_logger(__name__)
+
+
+def get_staging_config() -> dict:
+    """Return the staging settings with defaults filled in."""
+    return {**DEFAULT_STAGING_CONFIG, **(PIPELINE_CONFIG.get('staging') or {})}
+
+
+def arrow_schema(table: str) -> pa.Schema:
+    """Build the Arrow schema of a warehouse table from its DDL."""
+    fields = []
+    for column in get_table_schema(table):
+        if column.type not in BQ_TO_ARROW_TYPES:
+            raise ValueError(f"Unsupported BigQuery type {column.type} for {table}.{column.name}")
+        fields.append(pa.field(column.name, BQ_TO_ARROW_TYPES[column.type], nullable=column.nullable))
+    return pa.schema(fields)
+
+
+def dataframe_to_arrow(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    """Convert a DataFrame to an Arrow table with exactly the given schema.
+
+    Columns are selected and ordered by the schema, extra DataFrame columns
+    are dropped, and missing nullable columns are filled with nulls. Each
+    column is converted once and cast to its target type, so callers do not
+    need to match BigQuery dtypes exactly (e.g. ``datetime64`` for a DATE
+    column or ``float64`` for NUMERIC).
+    """
+    arrays = []
+    for field in schema:
+        if field.name not in df.columns:
+            if not field.nullable:
+                raise ValueError(f"Missing required column: {field.name}")
+            arrays.append(pa.nulls(len(df), type=field.type))
+            continue
+        array = pa.array(df[field.name], from_pandas=True)
+        if array.type != field.type:
+            array = array.cast(field.type)
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class LocalStagingBackend:
+    """Keeps staged files on the local filesystem."""
+
+    def __init__(self, directory: str):
+        if not os.path.isabs(directory):
+            directory = os.path.join(PROJECT_ROOT, directory)
+        self.directory = directory
+
+    def new_path(self, table: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"{table}_{uuid.uuid4().hex}.parquet")
+
+    def publish(self, path: str) -> str:
+        """Make a finished file available to the load job; returns its URI."""
+        return path
+
+    def load(self, client, uri: str, table_id: str, job_config):
+        with open(uri, 'rb') as f:
+            job = client.load_table_from_file(f, table_id, job_config=job_config)
+            job.result()
+        return job
+
+    def remove(self, path: str, uri: str) -> None:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class GCSStagingBackend(LocalStagingBackend):
+    """Writes files locally, then stages them in a GCS bucket for the load job."""
+
+    def __init__(self, directory: str, bucket: str, prefix: str):
+        super().__init__(directory)
+        if not bucket:
+            raise ValueError("staging.bucket must be set for the gcs staging backend")
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+
+    def _bucket(self):
+        # Only needed for this backend, so imported lazily
+        from google.cloud import storage
+        client = storage.Client.from_service_account_json(
+            PIPELINE_CONFIG['bigquery']['key_path'],
+            project=PIPELINE_CONFIG['bigquery']['project_id'],
+        )
+        return client.bucket(self.bucket)
+
+    def publish(self, path: str) -> str:
+        blob_name = f"{self.prefix}/{os.path.basename(path)}"
+        self._bucket().blob(blob_name).upload_from_filename(path)
+        return f"gs://{self.bucket}/{blob_name}"
+
+    def load(self, client, uri: str, table_id: str, job_config):
+        job = client.load_table_from_uri(uri, table_id, job_config=job_config)
+        job.result()
+        return job
+
+    def remove(self, path: str, uri: str) -> None:
+        super().remove(path, uri)
+        if uri.startswith(f"gs://{self.bucket}/"):
+            self._bucket().blob(uri[len(f"gs://{self.bucket}/"):]).delete()
+
+
+def get_staging_backend():
+    """Build the staging backend selected in the pipeline config."""
+    config = get_staging_config()
+    if config['backend'] == 'local':
+        return LocalStagingBackend(config['local_dir'])
+    if config['backend'] == 'gcs':
+        return GCSStagingBackend(config['local_dir'], config['bucket'], config['prefix'])
+    raise ValueError(f"Unknown staging backend: {config['backend']}")
+
+
+class ParquetStager:
+    """Streams DataFrame chunks for one table into a single Parquet file.
+
+    Tracks rows, bytes staged and the time spent converting and writing, so
+    the cost of serialization can be separated from the load job itself.
+    """
+
+    def __init__(self, table: str, backend=None):
+        config = get_staging_config()
+        self.table = table
+        self.backend = backend or get_staging_backend()
+        self.schema = arrow_schema(table)
+        self.compression = config['compression']
+        self.row_group_size = int(config['row_group_size'])
+        self.keep_files = bool(config['keep_files'])
+        self.path = self.backend.new_path(table)
+        self.uri: Optional[str] = None
+        self.rows = 0
+        self.bytes_staged = 0
+        self.serialize_seconds = 0.0
+        self._writer = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        """Append one chunk to the staged file."""
+        if df.empty:
+            return
+        start = time.perf_counter()
+        table = dataframe_to_arrow(df, self.schema)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, self.schema, compression=self.compression)
+        self._writer.write_table(table, row_group_size=self.row_group_size)
+        self.serialize_seconds += time.perf_counter() - start
+        self.rows += len(df)
+
+    def close(self) -> Optional[str]:
+        """Finish the file and publish it; returns its URI, or None if nothing was written."""
+        if self._writer is None:
+            return None
+        self._writer.close()
+        self._writer = None
+        self.bytes_staged = os.path.getsize(self.path)
+        self.uri = self.backend.publish(self.path)
+        return self.uri
+
+    def cleanup(self) -> None:
+        """Remove the staged file unless ``staging.keep_files`` is set."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if not self.keep_files:
+            self.backend.remove(self.path, self.uri or self.path)
+
+    def metrics(self) -> dict:
+        return {
+            'table': self.table,
+            'rows': self.rows,
+            'bytes_staged': self.bytes_staged,
+            'serialize_seconds': round(self.serialize_seconds, 3),
+        }
+
+
+def stage_chunks(chunks: Iterable[pd.DataFrame], table: str, backend=None) -> ParquetStager:
+    """Write all chunks to a staged Parquet file and return the closed stager."""
+    stager = ParquetStager(table, backend=backend)
+    try:
+        for chunk in chunks:
+            with stage('serialize'):
+                stager.write(chunk)
+        stager.close()
+    except Exception:
+        stager.cleanup()
+        raise
+    logger.info(f"Staged {stager.rows} rows for {table}: {stager.metrics()}")
+    return stager
@@ -0,0 +1,146 @@
+"""High-water-mark store for incremental extraction.
+
+Watermarks are persisted as a small JSON document keyed by pipeline name
+under the state directory of the configured sink (see ``get_state_dir``). A pipeline reads its lower bound before
+extracting and only advances the watermark once its load has succeeded, so a
+failed run is simply retried from the previous position on the next run.
+"""
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from common.config import DEFAULT_SINK, PIPELINE_CONFIG, get_sink_config, get_sink_type
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+WATERMARK_FILE = 'watermarks.json'
+DEFAULT_LOOKBACK_DAYS = 1
+
+# Load strategies that overwrite re-read rows instead of adding them again
+REREAD_SAFE_STRATEGIES = ('replace_partitions', 'merge')
+
+_lock = threading.Lock()
+
+
+def get_state_dir() -> str:
+    """Return the absolute path of the configured sink's state directory, creating it if needed.
+
+    State describes what a warehouse already holds, so every sink keeps its
+    own: ``sink.<type>.state_dir`` if set, else ``state_dir`` for the default
+    BigQuery sink and ``<state_dir>/<type>`` for any other. A DuckDB dev run
+    then never advances the watermarks or snapshots of the BigQuery runs.
+    """
+    sink_type = get_sink_type()
+    state_dir = (get_sink_config().get(sink_type) or {}).get('state_dir')
+    if state_dir is None:
+        state_dir = PIPELINE_CONFIG.get('state_dir', 'state')
+        if sink_type != DEFAULT_SINK:
+            state_dir = os.path.join(state_dir, sink_type)
+    if not os.path.isabs(state_dir):
+        state_dir = os.path.join(PROJECT_ROOT, state_dir)
+    os.makedirs(state_dir, exist_ok=True)
+    return state_dir
+
+
+def _watermark_path() -> str:
+    return os.path.join(get_state_dir(), WATERMARK_FILE)
+
+
+def _read_all() -> dict:
+    path = _watermark_path()
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def get_watermark(pipeline: str) -> Optional[datetime]:
+    """Return the persisted high-water mark for a pipeline, or None on first run."""
+    with _lock:
+        value = _read_all().get(pipeline)
+    return datetime.fromisoformat(value) if value else None
+
+
+def set_watermark(pipeline: str, value: Any) -> None:
+    """Persist a new high-water mark for a pipeline.
+
+    Accepts dates, datetimes, pandas Timestamps or ISO strings. The file is
+    replaced atomically so a crash mid-write never corrupts other pipelines'
+    watermarks. Null values (None/NaT) are ignored.
+    """
+    if value is None or value != value:
+        return
+    if hasattr(value, 'to_pydatetime'):
+        value = value.to_pydatetime()
+    elif isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    elif not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    with _lock:
+        watermarks = _read_all()
+        watermarks[pipeline] = value.isoformat()
+        path = _watermark_path()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(watermarks, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+
+def get_lookback_days(pipeline: str) -> int:
+    """Return the late-arrival lookback window configured for a pipeline."""
+    pipeline_conf = PIPELINE_CONFIG.get('pipelines', {}).get(pipeline) or {}
+    return int(pipeline_conf.get('lookback_days', DEFAULT_LOOKBACK_DAYS))
+
+
+def require_reread_safe_load(pipeline: str, table: Optional[str] = None) -> None:
+    """Raise ValueError unless ``table`` (default: the pipeline's) overwrites the rows a run re-reads.
+
+    Incremental runs re-read the days since the lookback bound. Loaded with
+    ``append``, every run would duplicate them.
+    """
+    table = table or pipeline
+    table_conf = (PIPELINE_CONFIG.get('tables') or {}).get(table) or {}
+    strategy = table_conf.get('load_strategy', 'append')
+    if strategy not in REREAD_SAFE_STRATEGIES:
+        raise ValueError(f"{pipeline} re-reads the last {get_lookback_days(pipeline)} day(s) on every run, but "
+                         f"table {table} uses the {strategy} load strategy, which would load them again; "
+                         f"configure one of {', '.join(REREAD_SAFE_STRATEGIES)}")
+
+
+def get_extract_lower_bound(pipeline: str) -> Optional[datetime]:
+    """Return the inclusive lower bound for the next incremental extract.
+
+    The bound is the start of the watermark's day minus the lookback window,
+    so every extract covers whole days and re-reads rows that arrived late
+    for recently loaded days. Returns None when no watermark exists yet,
+    which means a full extract. Raises ValueError if the pipeline's table is
+    not loaded with a strategy that overwrites the re-read days.
+    """
+    watermark = get_watermark(pipeline)
+    if watermark is not None:
+        require_reread_safe_load(pipeline)
+    return lower_bound_for(pipeline, watermark)
+
+
+def lower_bound_for(pipeline: str, watermark: Any) -> Optional[datetime]:
+    """Return the extract lower bound that follows from ``watermark`` (see ``get_extract_lower_bound``)."""
+    if watermark is None:
+        return None
+    day_start = datetime(watermark.year, watermark.month, watermark.day)
+    return day_start - timedelta(days=get_lookback_days(pipeline))
+
+
+class HighWaterMark:
+    """Running maximum of a watermark column across streamed chunks."""
+
+    def __init__(self, column: str):
+        self.column = column
+        self.value = None
+
+    def observe(self, df) -> None:
+        value = df[self.column].max()
+        if value is None or value != value:
+            return
+        if self.value is None or value > self.value:
+            self.value = value
@@ -7,9 +7,14 @@ It follows the dependency structure:
 2. dim_campaign (depends on customer, product, seller)
 3. fact_sales (depends on all dimensions)
 4. fact_inventory, fact_cart, fact_marketing (depend on fact_sales)
+
+Backfill runs (``airflow dags backfill -s START -e END ecommerce_data_pipeline``)
+reload the fact tables over each run's data interval instead of running
+incrementally; a run triggered with ``{"start": "YYYY-MM-DD", "end": "YYYY-MM-DD"}``
+as its conf reloads that inclusive range.
 """
 
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from airflow import DAG
 from airflow.operators.python import PythonOperator
 from airflow.operators.dummy import DummyOperator
@@ -24,17 +29,6 @@ sys.path.extend([
     os.path.join(project_root, 'common'),
 ])
 
-# Import pipeline modules
-from pipelines.dim_date import run as run_dim_date
-from pipelines.dim_customer import run as run_dim_customer
-from pipelines.dim_product import run as run_dim_product
-from pipelines.dim_seller import run as run_dim_seller
-from pipelines.dim_campaign import run as run_dim_campaign
-from pipelines.fact_sales import run as run_fact_sales
-from pipelines.fact_inventory import run as run_fact_inventory
-from pipelines.fact_cart import run as run_fact_cart
-from pipelines.fact_marketing import run as run_fact_marketing
-
 # Default arguments for the DAG
 default_args = {
     'owner': 'data_engineering',
@@ -57,16 +51,58 @@ dag = DAG(
     max_active_runs=1,
 )
 
+# Fact pipelines whose run() takes a logical date range
+DATE_RANGE_PIPELINES = {'fact_sales', 'fact_inventory', 'fact_cart', 'fact_marketing'}
+
 # Define task functions
-def run_pipeline(pipeline_func):
-    """Wrapper function to run a pipeline with error handling."""
+def get_date_range(context):
+    """Return the inclusive ``(start, end)`` days a run reloads, or None for an incremental run."""
+    dag_run = context.get('dag_run')
+    conf = getattr(dag_run, 'conf', None) or {}
+    if conf.get('start'):
+        start = date.fromisoformat(conf['start'])
+        return start, date.fromisoformat(conf.get('end') or conf['start'])
+    if getattr(dag_run, 'run_type', None) == 'backfill':
+        # The data interval is half-open: [ds, data_interval_end)
+        start = date.fromisoformat(context['ds'])
+        end = context['data_interval_end'].date() - timedelta(days=1)
+        return start, max(start, end)
+    return None
+
+# Pipelines are referenced by module path and imported inside the task
+# callable: the scheduler re-parses this file constantly, and importing them
+# here would load pandas, BigQuery and SQLAlchemy on every parse.
+def run_pipeline(pipeline_module, **context):
+    """Import a pipeline module and run it with error handling and per-stage metrics."""
+    import importlib
+    from common.checkpoints import checkpoint_run, get_checkpoint
+    from common.instrumentation import instrument_pipeline
+    from common.extract_cache import cache_run
+
+    pipeline_name = pipeline_module.rsplit('.', 1)[-1]
+    date_range = get_date_range(context) if pipeline_name in DATE_RANGE_PIPELINES else None
     try:
-        pipeline_func()
+        pipeline = importlib.import_module(pipeline_module)
+        # Tasks run in separate processes, so the run's extract cache lives on
+        # disk until clear_extract_cache drops it. Retries keep the run id and
+        # resume from the stage checkpoints of the failed attempt.
+        with cache_run(context.get('run_id'), persist=True), checkpoint_run(context.get('run_id')), \
+                instrument_pipeline(pipeline_name, run_id=context.get('run_id')):
+            if date_range:
+                pipeline.run(*date_range)
+            else:
+                pipeline.run()
+            get_checkpoint(pipeline_name).complete()
         return True
     except Exception as e:
         print(f"Error running pipeline: {str(e)}")
         raise
 
+def clear_extract_cache(**context):
+    """Drop the extract cache the run's tasks shared."""
+    from common.extract_cache import invalidate_run
+    invalidate_run(context['run_id'])
+
 # Create tasks
 start_pipeline = DummyOperator(
     task_id='start_pipeline',
@@ -77,28 +113,28 @@ start_pipeline = DummyOperator(
 dim_date_task = PythonOperator(
     task_id='run_dim_date',
     python_callable=run_pipeline,
-    op_kwargs={'pipeline_func': run_dim_date},
+    op_kwargs={'pipeline_module': 'pipelines.dim_date'},
     dag=dag,
 )
 
 dim_customer_task = PythonOperator(
     task_id='run_dim_customer',
     python_callable=run_pipeline,
-    op_kwargs={'pipeline_func': run_dim_customer},
+    op_kwargs={'pipeline_module': 'pipelines.dim_customer'},
     dag=dag,
 )
 
 dim_product_task = PythonOperator(
     task_id='run_dim_product',
     python_callable=run_pipeline,
-    op_kwargs={'pipeline_func': run_dim_product},
+    op_kwargs={'pipeline_module': 'pipelines.dim_product'},
     dag=dag,
 )
 
 dim_seller_task = PythonOperator(
     task_id='run_dim_seller',
     python_callable=run_pipeline,
-    op_kwargs={'pipeline_func': run_dim_seller},
+    op_kwargs={'pipeline_module': 'pipelines.dim_seller'},
     dag=dag,
 )
 
@@ -106,7 +142,7 @@ dim_seller_task = PythonOperator(
 dim_campaign_task = PythonOperator(
     task_id='run_dim_campaign',
     python_callable=run_pipeline,
-    op_kwargs={'pipeline_func': run_dim_campaign},
+    op_kwargs={'pipeline_module': 'pipelines.dim_campaign'},
     dag=dag,
 )
 
@@ -114,7 +150,7 @@ dim_campaign_task = PythonOperator(
 fact_sales_task = PythonOperator(
     task_id='run_fact_sales',
     python_callable=run_pipeline,
-    op_kwargs={'pipeline_func': run_fact_sales},
+    op_kwargs={'pipeline_module': 'pipelines.fact_sales'},
     dag=dag,
 )
 
@@ -122,21 +158,29 @@ fact_sales_task = PythonOperator(
 fact_inventory_task = PythonOperator(
     task_id='run_fact_inventory',
     python_callable=run_pipeline,
-    op_kwargs={'pipeline_func': run_fact_inventory},
+    op_kwargs={'pipeline_module': 'pipelines.fact_inventory'},
     dag=dag,
 )
 
 fact_cart_task = PythonOperator(
     task_id='run_fact_cart',
     python_callable=run_pipeline,
-    op_kwargs={'pipeline_func': run_fact_cart},
+    op_kwargs={'pipeline_module': 'pipelines.fact_cart'},
     dag=dag,
 )
 
 fact_marketing_task = PythonOperator(
     task_id='run_fact_marketing',
     python_callable=run_pipeline,
-    op_kwargs={'pipeline_func': run_fact_marketing},
+    op_kwargs={'pipeline_module': 'pipelines.fact_marketing'},
+    dag=dag,
+)
+
+# Drop the run's extract cache once every fact task has finished, successfully or not
+clear_extract_cache_task = PythonOperator(
+    task_id='clear_extract_cache',
+    python_callable=clear_extract_cache,
+    trigger_rule='all_done',
     dag=dag,
 )
 
@@ -163,3 +207,4 @@ fact_sales_task >> [fact_inventory_task, fact_cart_task, fact_marketing_task]
 
 # All fact tasks must complete before end_pipeline
 [fact_inventory_task, fact_cart_task, fact_marketing_task] >> end_pipeline
+[fact_inventory_task, fact_cart_task, fact_marketing_task] >> clear_extract_cache_task
@@ -1,47 +1,55 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from common.bigquery_client import get_bq_client, load_to_bq
+from common.sinks import get_sink
+from common.change_detection import ChangeDetector
 from common.logging_utils import get_logger
-from common.dq_checks import run_dq_checks
-from common.config import PIPELINE_CONFIG
-from common.db_utils import get_sqlalchemy_engine
+from common.dq_checks import DQChecker
+from common.key_cache import publish_keys
+from common.checkpoints import get_checkpoint
+from common.instrumentation import track
+from common.coercion import coerce_to_schema
+from common.db_utils import get_shared_engine
 import pandas as pd
 
 def extract():
     """Extract campaign data from the OLTP database."""
-    engine = get_sqlalchemy_engine(PIPELINE_CONFIG['oltp_db'])
+    engine = get_shared_engine()
     query = 'SELECT * FROM marketing_campaigns'
     df = pd.read_sql(query, engine)
-    engine.dispose()
     return df
 
 def transform(df):
-    # Ensure campaign_id is string for BigQuery compatibility
-    if 'campaign_id' in df.columns:
-        df['campaign_id'] = df['campaign_id'].astype(str)
-    # Ensure date columns are datetime
-    for col in ['start_date', 'end_date']:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col])
-    for col in df.select_dtypes(include=['object']).columns:
-        df[col] = df[col].astype(str)
-    for col in df.select_dtypes(include=['datetime64[ns]', 'datetime64[ns, UTC]']).columns:
-        df[col] = pd.to_datetime(df[col])
+    # Cast every column to its dim_campaign DDL type (campaign_id to string, dates to datetime, ...)
+    df = coerce_to_schema(df, 'dim_campaign')
     df = df.reset_index(drop=True)
     return df
 
 def load(df):
-    client = get_bq_client()
-    load_to_bq(client, df, PIPELINE_CONFIG['bigquery']['dataset'], 'dim_campaign')
+    get_sink().load([df], 'dim_campaign')
 
 def run():
     logger = get_logger("dim_campaign")
-    df = extract()
-    df_t = transform(df)
-    run_dq_checks(df_t)
-    load(df_t)
-    logger.info("dim_campaign pipeline completed.")
+    detector = ChangeDetector('dim_campaign', 'marketing_campaigns', 'campaign_id')
+    if track('extract', detector.source_unchanged):
+        logger.info("dim_campaign source unchanged since the last run; nothing to load.")
+        return
+    checkpoint = get_checkpoint("dim_campaign")
+    df_t = checkpoint.read('transform')
+    if df_t is None:
+        df = checkpoint.frame('extract', extract, metadata={'fingerprint': detector.fingerprint})
+        df_t = checkpoint.frame('transform', transform, df)
+    # A resumed run loads the rows extracted earlier; snapshot their fingerprint
+    detector.fingerprint = checkpoint.metadata('extract').get('fingerprint', detector.fingerprint)
+    checker = DQChecker('dim_campaign')
+    track('dq', checker.validate, df_t)
+    changes = track('transform', detector.diff, df_t)
+    if len(changes.rows):
+        track('load', load, changes.rows)
+    checker.commit()
+    publish_keys('dim_campaign', df_t['campaign_id'])
+    detector.commit()
+    logger.info(f"dim_campaign pipeline completed: {changes.summary()}.")
 
 if __name__ == "__main__":
     run()
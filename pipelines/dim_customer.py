@@ -1,49 +1,46 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from common.bigquery_client import get_bq_client, load_to_bq
+from common.sinks import get_sink
 from common.logging_utils import get_logger
-from common.dq_checks import run_dq_checks
-from common.config import PIPELINE_CONFIG
+from common.dq_checks import DQChecker
+from common.key_cache import publish_keys
+from common.checkpoints import get_checkpoint
+from common.instrumentation import track
+from common.coercion import coerce_to_schema
+from common.db_utils import get_shared_engine
 import pandas as pd
-import psycopg2
 
 def extract():
-    db_conf = PIPELINE_CONFIG['oltp_db']
-    conn = psycopg2.connect(
-        host=db_conf['host'],
-        port=db_conf['port'],
-        database=db_conf['database'],
-        user=db_conf['user'],
-        password=db_conf['password']
-    )
+    engine = get_shared_engine()
     query = "SELECT customer_id, customer_name AS name, email, phone, location, acquisition_channel, signup_date AS created_at FROM customers"
-    df = pd.read_sql(query, conn)
-    conn.close()
+    df = pd.read_sql(query, engine)
     return df
 
 def transform(df):
-    df['customer_id'] = df['customer_id'].astype(str)
-    if 'created_at' in df:
-        df['created_at'] = pd.to_datetime(df['created_at'])
     df['loyalty_segment'] = (
         pd.cut(df['loyalty_points'], bins=[0, 100, 200, 1000], labels=['Bronze', 'Silver', 'Gold'])
         if 'loyalty_points' in df else 'Bronze'
     )
     df['updated_at'] = pd.Timestamp.now()
-    return df
+    return coerce_to_schema(df, 'dim_customer')
 
 
 def load(df):
-    client = get_bq_client()
-    load_to_bq(client, df, PIPELINE_CONFIG['bigquery']['dataset'], 'dim_customer')
+    get_sink().load([df], 'dim_customer')
 
 def run():
     logger = get_logger("dim_customer")
-    df = extract()
-    df_t = transform(df)
-    run_dq_checks(df_t, required_columns=['customer_id', 'email'])
-    load(df_t)
+    checkpoint = get_checkpoint("dim_customer")
+    df_t = checkpoint.read('transform')
+    if df_t is None:
+        df = checkpoint.frame('extract', extract)
+        df_t = checkpoint.frame('transform', transform, df)
+    checker = DQChecker('dim_customer')
+    track('dq', checker.validate, df_t)
+    track('load', load, df_t)
+    checker.commit()
+    publish_keys('dim_customer', df_t['customer_id'])
     logger.info("dim_customer pipeline completed.")
 
 if __name__ == "__main__":
@@ -1,51 +1,136 @@
 import sys
 import os
-from datetime import datetime, timedelta
 import pandas as pd
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from common.bigquery_client import get_bq_client, load_to_bq
+from common.sinks import get_sink
 from common.logging_utils import get_logger
-from common.dq_checks import run_dq_checks
+from common.dq_checks import DQChecker
 from common.config import PIPELINE_CONFIG
+from common.checkpoints import get_checkpoint
+from common.instrumentation import track
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Calendar settings, overridable under pipelines.dim_date in the pipeline config
+DEFAULT_CALENDAR_CONFIG = {
+    'start_date': '1990-01-01',
+    'end_date': '2050-12-31',
+    'fiscal_year_start_month': 4,
+    'holiday_calendar': 'common/calendars/holidays.csv',
+}
+
+def get_calendar_config():
+    pipeline_conf = PIPELINE_CONFIG.get('pipelines', {}).get('dim_date') or {}
+    return {**DEFAULT_CALENDAR_CONFIG, **pipeline_conf}
+
+def load_holidays(path, years):
+    """Read the holiday calendar and return a Series of holiday names indexed by date.
+
+    Rows dated ``YYYY-MM-DD`` apply to that day only; rows dated ``MM-DD``
+    recur every year in ``years``.
+    """
+    if not os.path.isabs(path):
+        path = os.path.join(PROJECT_ROOT, path)
+    holidays = pd.read_csv(path, dtype=str, comment='#')
+    recurring = holidays['date'].str.len() == 5
+    # Expand recurring rows across every year with one cross join
+    expanded = holidays[recurring].merge(pd.DataFrame({'year': years.astype(str)}), how='cross')
+    expanded['date'] = expanded['year'] + '-' + expanded['date']
+    dated = pd.concat([holidays[~recurring], expanded[['date', 'holiday_name']]], ignore_index=True)
+    # Invalid recurring dates (e.g. 02-29 in non-leap years) become NaT and are dropped
+    dated['date'] = pd.to_datetime(dated['date'], errors='coerce')
+    dated = dated.dropna(subset=['date'])
+    return dated.groupby('date')['holiday_name'].agg(' / '.join)
 
 def extract():
-    # Generate date range for last 3 years
-    end_date = datetime.today().date()
-    start_date = end_date - timedelta(days=3*365)
-    dates = pd.date_range(start=start_date, end=end_date, freq='D')
-    df = pd.DataFrame({'date_id': dates.date})
-    return df
+    """Generate one row per calendar day in the configured range."""
+    config = get_calendar_config()
+    dates = pd.date_range(start=config['start_date'], end=config['end_date'], freq='D')
+    return pd.DataFrame({'date_id': dates})
+
+def get_loaded_dates(sink, start, end):
+    """Return the dates already present in dim_date between start and end (inclusive).
+
+    A single aggregate query answers the common case where the whole range is
+    already loaded, without transferring any dates.
+    """
+    table_id = sink.table_id('dim_date')
+    where = f"WHERE date_id BETWEEN DATE '{start:%Y-%m-%d}' AND DATE '{end:%Y-%m-%d}'"
+    loaded = sink.query(f"SELECT COUNT(DISTINCT date_id) AS n FROM {table_id} {where}")['n'].iloc[0]
+    if loaded == (end - start).days + 1:
+        return pd.date_range(start=start, end=end, freq='D')
+    dates = sink.query(f"SELECT DISTINCT date_id FROM {table_id} {where}")['date_id']
+    return pd.DatetimeIndex(pd.to_datetime(dates))
+
+def filter_missing_dates(df, sink):
+    """Keep only the dates that are not yet in the target table."""
+    start, end = df['date_id'].min(), df['date_id'].max()
+    loaded = get_loaded_dates(sink, start, end)
+    return df[~df['date_id'].isin(loaded)].reset_index(drop=True)
 
 def transform(df):
-    # Add common date dimension columns
-    df['year'] = df['date_id'].apply(lambda x: x.year)
-    df['month'] = df['date_id'].apply(lambda x: x.month)
-    df['day'] = df['date_id'].apply(lambda x: x.day)
-    df['day_of_week'] = df['date_id'].apply(lambda x: x.weekday() + 1)  # Monday=1
-    df['day_name'] = df['date_id'].apply(lambda x: x.strftime('%A'))
-    df['month_name'] = df['date_id'].apply(lambda x: x.strftime('%B'))
-    df['quarter'] = df['date_id'].apply(lambda x: (x.month-1)//3 + 1)
-    df['is_weekend'] = df['day_of_week'].apply(lambda x: x >= 6)
+    """Derive calendar, ISO, fiscal, holiday and period-boundary attributes.
+
+    Every column is computed with vectorized ``DatetimeIndex`` accessors, so
+    the full 1990-2050 range builds in milliseconds.
+    """
+    config = get_calendar_config()
+    fiscal_start = int(config['fiscal_year_start_month'])
+    dates = pd.DatetimeIndex(df['date_id'])
+    iso = dates.isocalendar()
+
+    df['year'] = dates.year
+    df['quarter'] = dates.quarter
+    df['month'] = dates.month
+    df['day'] = dates.day
+    # ISO week, which belongs to iso_year rather than year around New Year
+    df['week'] = iso['week'].to_numpy()
+    df['iso_year'] = iso['year'].to_numpy()
+    df['day_of_week'] = dates.dayofweek + 1  # Monday=1
+    df['day_name'] = dates.day_name()
+    df['weekday'] = df['day_name']
+    df['month_name'] = dates.month_name()
+    df['is_weekend'] = df['day_of_week'] >= 6
+
+    # Fiscal years are named after the calendar year they end in
+    df['fiscal_month'] = (dates.month - fiscal_start) % 12 + 1
+    df['fiscal_quarter'] = (df['fiscal_month'] - 1) // 3 + 1
+    df['fiscal_year'] = dates.year + (dates.month >= fiscal_start).astype(int) * int(fiscal_start > 1)
+
+    df['is_month_start'] = dates.is_month_start
+    df['is_month_end'] = dates.is_month_end
+    df['is_quarter_start'] = dates.is_quarter_start
+    df['is_quarter_end'] = dates.is_quarter_end
+    df['is_year_start'] = dates.is_year_start
+    df['is_year_end'] = dates.is_year_end
+
+    holidays = load_holidays(config['holiday_calendar'], dates.year.unique())
+    df['holiday_name'] = holidays.reindex(dates).to_numpy()
+    df['is_holiday'] = df['holiday_name'].notna()
+
     df = df.reset_index(drop=True)
     return df
 
 def load(df):
-    client = get_bq_client()
-    table_id = f"{PIPELINE_CONFIG['bigquery']['dataset']}.dim_date"
-    # Get existing table schema
-    table = client.get_table(table_id)
-    bq_columns = [field.name for field in table.schema]
-    # Select only columns that exist in the table
-    df_to_load = df[[col for col in bq_columns if col in df.columns]]
-    load_to_bq(client, df_to_load, PIPELINE_CONFIG['bigquery']['dataset'], 'dim_date')
+    # Staging selects only the columns defined in the dim_date DDL
+    get_sink().load([df], 'dim_date')
 
 def run():
     logger = get_logger("dim_date")
-    df = extract()
-    df_t = transform(df)
-    run_dq_checks(df_t, required_columns=['date_id'])
-    load(df_t)
-    logger.info("dim_date pipeline completed.")
+    checkpoint = get_checkpoint("dim_date")
+    df_t = checkpoint.read('transform')
+    if df_t is None:
+        df = track('extract', extract)
+        df = track('filter', filter_missing_dates, df, get_sink())
+        if df.empty:
+            logger.info("dim_date already covers the configured range; nothing to load.")
+            return
+        df_t = checkpoint.frame('transform', transform, df)
+    checker = DQChecker('dim_date')
+    track('dq', checker.validate, df_t)
+    track('load', load, df_t)
+    checker.commit()
+    logger.info(f"dim_date pipeline completed: {len(df_t)} missing dates loaded.")
 
 if __name__ == "__main__":
     run()
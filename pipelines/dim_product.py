@@ -1,49 +1,63 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from common.bigquery_client import get_bq_client, load_to_bq
+from common.sinks import get_sink
+from common.change_detection import ChangeDetector
 from common.logging_utils import get_logger
-from common.dq_checks import run_dq_checks
-from common.config import PIPELINE_CONFIG
-from common.db_utils import get_sqlalchemy_engine
+from common.dq_checks import DQChecker
+from common.key_cache import publish_keys
+from common.checkpoints import get_checkpoint
+from common.instrumentation import track
+from common.coercion import coerce_to_schema
+from common.db_utils import get_shared_engine
 import pandas as pd
 
 def extract():
     """Extract product data from the OLTP database."""
-    engine = get_sqlalchemy_engine(PIPELINE_CONFIG['oltp_db'])
+    engine = get_shared_engine()
     query = 'SELECT * FROM products'
     df = pd.read_sql(query, engine)
-    engine.dispose()
     return df
 
+def extract_keys(column, values):
+    """Extract the products whose ``column`` is in ``values`` (used by CDC)."""
+    if column != 'product_id':
+        raise ValueError(f"Cannot extract products by {column}")
+    engine = get_shared_engine()
+    query = 'SELECT * FROM products WHERE product_id = ANY(%(values)s)'
+    return pd.read_sql(query, engine, params={'values': list(values)})
+
 def transform(df):
-    # Ensure all string columns are string
-    string_cols = ['product_id', 'name', 'category', 'sub_category', 'brand']
-    for col in string_cols:
-        if col in df.columns:
-            df[col] = df[col].astype(str)
-    # Ensure numeric columns are float
-    for col in ['cost_price', 'unit_price']:
-        if col in df.columns:
-            df[col] = df[col].astype(float)
-    # Ensure timestamp columns are datetime
-    for col in ['created_at', 'updated_at']:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col])
+    # Cast every column to its dim_product DDL type
+    df = coerce_to_schema(df, 'dim_product')
     df = df.reset_index(drop=True)
     return df
 
 def load(df):
-    client = get_bq_client()
-    load_to_bq(client, df, PIPELINE_CONFIG['bigquery']['dataset'], 'dim_product')
+    get_sink().load([df], 'dim_product')
 
 def run():
     logger = get_logger("dim_product")
-    df = extract()
-    df_t = transform(df)
-    run_dq_checks(df_t)
-    load(df_t)
-    logger.info("dim_product pipeline completed.")
+    detector = ChangeDetector('dim_product', 'products', 'product_id')
+    if track('extract', detector.source_unchanged):
+        logger.info("dim_product source unchanged since the last run; nothing to load.")
+        return
+    checkpoint = get_checkpoint("dim_product")
+    df_t = checkpoint.read('transform')
+    if df_t is None:
+        df = checkpoint.frame('extract', extract, metadata={'fingerprint': detector.fingerprint})
+        df_t = checkpoint.frame('transform', transform, df)
+    # A resumed run loads the rows extracted earlier; snapshot their fingerprint
+    detector.fingerprint = checkpoint.metadata('extract').get('fingerprint', detector.fingerprint)
+    checker = DQChecker('dim_product')
+    track('dq', checker.validate, df_t)
+    changes = track('transform', detector.diff, df_t)
+    if len(changes.rows):
+        track('load', load, changes.rows)
+    checker.commit()
+    publish_keys('dim_product', df_t['product_id'])
+    detector.commit()
+    logger.info(f"dim_product pipeline completed: {changes.summary()}.")
 
 if __name__ == "__main__":
     run()
@@ -1,46 +1,55 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from common.bigquery_client import get_bq_client, load_to_bq
+from common.sinks import get_sink
+from common.change_detection import ChangeDetector
 from common.logging_utils import get_logger
-from common.dq_checks import run_dq_checks
-from common.config import PIPELINE_CONFIG
-from common.db_utils import get_sqlalchemy_engine
+from common.dq_checks import DQChecker
+from common.key_cache import publish_keys
+from common.checkpoints import get_checkpoint
+from common.instrumentation import track
+from common.coercion import coerce_to_schema
+from common.db_utils import get_shared_engine
 import pandas as pd
 
 def extract():
     """Extract seller data from the OLTP database."""
-    engine = get_sqlalchemy_engine(PIPELINE_CONFIG['oltp_db'])
+    engine = get_shared_engine()
     query = 'SELECT * FROM sellers'
     df = pd.read_sql(query, engine)
-    engine.dispose()
     return df
 
 def transform(df):
-    # Ensure seller_id is string for BigQuery compatibility
-    if 'seller_id' in df.columns:
-        df['seller_id'] = df['seller_id'].astype(str)
-    # Ensure join_date is datetime for BigQuery compatibility
-    if 'join_date' in df.columns:
-        df['join_date'] = pd.to_datetime(df['join_date'])
-    for col in df.select_dtypes(include=['object']).columns:
-        df[col] = df[col].astype(str)
-    for col in df.select_dtypes(include=['datetime64[ns]', 'datetime64[ns, UTC]']).columns:
-        df[col] = pd.to_datetime(df[col])
+    # Cast every column to its dim_seller DDL type (seller_id to string, join_date to datetime, ...)
+    df = coerce_to_schema(df, 'dim_seller')
     df = df.reset_index(drop=True)
     return df
 
 def load(df):
-    client = get_bq_client()
-    load_to_bq(client, df, PIPELINE_CONFIG['bigquery']['dataset'], 'dim_seller')
+    get_sink().load([df], 'dim_seller')
 
 def run():
     logger = get_logger("dim_seller")
-    df = extract()
-    df_t = transform(df)
-    run_dq_checks(df_t)
-    load(df_t)
-    logger.info("dim_seller pipeline completed.")
+    detector = ChangeDetector('dim_seller', 'sellers', 'seller_id')
+    if track('extract', detector.source_unchanged):
+        logger.info("dim_seller source unchanged since the last run; nothing to load.")
+        return
+    checkpoint = get_checkpoint("dim_seller")
+    df_t = checkpoint.read('transform')
+    if df_t is None:
+        df = checkpoint.frame('extract', extract, metadata={'fingerprint': detector.fingerprint})
+        df_t = checkpoint.frame('transform', transform, df)
+    # A resumed run loads the rows extracted earlier; snapshot their fingerprint
+    detector.fingerprint = checkpoint.metadata('extract').get('fingerprint', detector.fingerprint)
+    checker = DQChecker('dim_seller')
+    track('dq', checker.validate, df_t)
+    changes = track('transform', detector.diff, df_t)
+    if len(changes.rows):
+        track('load', load, changes.rows)
+    checker.commit()
+    publish_keys('dim_seller', df_t['seller_id'])
+    detector.commit()
+    logger.info(f"dim_seller pipeline completed: {changes.summary()}.")
 
 if __name__ == "__main__":
     run()
@@ -1,40 +1,131 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from common.bigquery_client import get_bq_client, load_to_bq
+from common.sinks import get_sink
 from common.logging_utils import get_logger
-from common.dq_checks import run_dq_checks
+from common.dq_checks import DQChecker
 from common.config import PIPELINE_CONFIG
-from common.db_utils import get_sqlalchemy_engine
+from common.checkpoints import get_checkpoint
+from common.instrumentation import track, track_chunks
+from common.backfill import RANGE_LOAD_STRATEGY, day_bounds, range_checker
+from common.coercion import coerce_to_schema
+from common.db_utils import (get_extract_parallelism, get_shared_engine, iter_partitioned_query_chunks,
+                             iter_query_chunks, range_condition)
+from common.sessionization import Sessionizer
+from common.watermarks import HighWaterMark, get_extract_lower_bound, get_lookback_days, lower_bound_for, set_watermark
+from datetime import timedelta
 import pandas as pd
 
-def extract():
-    """Extract cart event data from the OLTP database."""
-    engine = get_sqlalchemy_engine(PIPELINE_CONFIG['oltp_db'])
-    query = """
+# Source column that drives incremental extraction
+WATERMARK_COLUMN = 'event_time'
+
+# Key the extract is split on for parallel reads: customer ranges keep each
+# customer's events in one ordered stream, as sessionization requires
+PARTITION_KEY = 'ce.customer_id'
+
+# Inactivity gap that ends a cart session
+DEFAULT_SESSION_GAP_MINUTES = 30
+
+CART_EVENTS_QUERY = """
     SELECT 
         ce.cart_event_id,
         ce.customer_id::text,
         ce.product_id::text,
         ce.event_time::date as date_id,
         ce.event_type,
-        ce.quantity
+        ce.quantity,
+        ce.event_time
     FROM cart_events ce
     """
-    df = pd.read_sql(query, engine)
-    engine.dispose()
+
+# Per-customer time order, for sessionization across chunks
+CART_EVENTS_ORDER = " ORDER BY ce.customer_id, ce.event_time, ce.cart_event_id"
+
+def _date_conditions(since=None, until=None):
+    conditions, params = [], {}
+    if since is not None:
+        conditions.append("ce.event_time >= %(since)s")
+        params['since'] = since
+    if until is not None:
+        conditions.append("ce.event_time < %(until)s")
+        params['until'] = until
+    return conditions, params
+
+def build_query(since=None, key_range=None, until=None):
+    """Return the cart events extract query and its parameters.
+
+    Args:
+        since: Optional inclusive lower bound on ``cart_events.event_time``.
+            When None the full table is extracted.
+        key_range: Optional ``(start, end)`` range of ``customer_id``
+            (see ``split_range``) for a partitioned extract; the first range
+            also holds events without a customer
+        until: Optional exclusive upper bound on ``cart_events.event_time``
+    """
+    query = CART_EVENTS_QUERY
+    conditions, params = _date_conditions(since, until)
+    if key_range is not None:
+        condition, range_params = range_condition(PARTITION_KEY, key_range)
+        if key_range[0] is not None:
+            conditions.append(condition)
+        elif key_range[1] is not None:
+            conditions.append(f"({condition} OR {PARTITION_KEY} IS NULL)")
+        params.update(range_params)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return query + CART_EVENTS_ORDER, params or None
+
+def build_bounds_query(since=None, until=None):
+    """Return the query for the smallest and largest ``customer_id`` to extract."""
+    query = f"SELECT MIN({PARTITION_KEY}), MAX({PARTITION_KEY}) FROM cart_events ce"
+    conditions, params = _date_conditions(since, until)
+    if not conditions:
+        return query, None
+    return query + " WHERE " + " AND ".join(conditions), params
+
+def extract(since=None):
+    """Extract cart event data from the OLTP database into a single DataFrame."""
+    engine = get_shared_engine()
+    query, params = build_query(since)
+    df = pd.read_sql(query, engine, params=params)
     return df
 
-def transform(df):
-    """Transform cart event data."""
+def extract_chunks(since=None, parallelism=None, until=None):
+    """Stream cart event data from the OLTP database as bounded-size DataFrame chunks.
+
+    With a parallelism above 1 (``pipelines.fact_cart.extract_parallelism``)
+    the extract is split into ``customer_id`` ranges read concurrently;
+    chunks of different ranges then interleave, but each customer's events
+    still arrive in time order.
+    """
+    parallelism = parallelism or get_extract_parallelism('fact_cart')
+    if parallelism > 1:
+        return iter_partitioned_query_chunks(lambda key_range: build_query(since, key_range, until),
+                                             build_bounds_query(since, until), parallelism)
+    query, params = build_query(since, until=until)
+    return iter_query_chunks(query, params)
+
+def get_session_gap():
+    """Return the inactivity gap that ends a cart session (``pipelines.fact_cart.session_gap_minutes``)."""
+    pipeline_conf = PIPELINE_CONFIG.get('pipelines', {}).get('fact_cart') or {}
+    return timedelta(minutes=pipeline_conf.get('session_gap_minutes', DEFAULT_SESSION_GAP_MINUTES))
+
+def get_sessionizer(since=None):
+    """Return a sessionizer continuing the sessions open at ``since`` (none for a full extract)."""
+    return Sessionizer.load('fact_cart', get_session_gap(), since, lookback_days=get_lookback_days('fact_cart'))
+
+def transform(df, sessionizer=None):
+    """Transform cart event data.
+
+    ``sessionizer`` carries open sessions across chunks and runs; without
+    one, ``df`` is sessionized on its own.
+    """
     # Ensure proper data types
-    df['cart_event_id'] = df['cart_event_id'].astype(str)
-    df['customer_id'] = df['customer_id'].astype(str)
-    df['product_id'] = df['product_id'].astype(str)
+    df = coerce_to_schema(df, 'fact_cart')
     
-    # Add cart_session_id with a default value since it's not in the source
-    # In a real scenario, you would get this from the session tracking system
-    df['cart_session_id'] = 'session_' + df['cart_event_id']
+    # Sessionize on the full event timestamps
+    sessionizer = sessionizer or Sessionizer('fact_cart', get_session_gap())
+    df['cart_session_id'] = sessionizer.assign(df)
     
     # Select and order columns to match the target table
     result_df = df[[
@@ -42,29 +133,85 @@ def transform(df):
         'date_id', 'event_type', 'quantity', 'cart_session_id'
     ]]
     
-    # Ensure required columns are present
-    required_columns = ['cart_event_id', 'customer_id', 'product_id', 'date_id', 'event_type']
-    for col in required_columns:
-        if col not in result_df.columns:
-            raise ValueError(f"Missing required column: {col}")
-    
     return result_df
 
 def load(df):
-    """Load data to BigQuery."""
-    client = get_bq_client()
-    load_to_bq(client, df, PIPELINE_CONFIG['bigquery']['dataset'], 'fact_cart')
+    """Load data to the warehouse sink."""
+    get_sink().load([df], 'fact_cart')
+
+def load_chunks(chunks, strategy=None):
+    """Load a stream of transformed chunks to the warehouse sink; returns the number of rows loaded."""
+    return get_sink().load(chunks, 'fact_cart', strategy=strategy)
+
+def run_range(start, end):
+    """Reload the cart events of the inclusive days ``[start, end]``, overwriting their partitions.
+
+    Events of the lookback days before ``start`` are extracted too, only to
+    continue the sessions open at ``start``; a session that began earlier
+    than that gets an id from its first event inside the lead-in. The
+    watermark, saved sessions and DQ row-count baseline are not touched.
+    """
+    logger = get_logger("fact_cart")
+    since, until = day_bounds(start, end)
+    lead_in = since - timedelta(days=get_lookback_days("fact_cart"))
+    sessionizer = Sessionizer('fact_cart', get_session_gap())
+    checker = range_checker('fact_cart')
+
+    def checked_chunks():
+        for chunk in track_chunks('extract', extract_chunks(since=lead_in, until=until)):
+            chunk_transformed = track('transform', transform, chunk, sessionizer)
+            chunk_transformed = chunk_transformed[chunk_transformed['date_id'] >= pd.Timestamp(since)]
+            yield track('dq', checker.check, chunk_transformed)
+        track('dq', checker.finalize)
+
+    rows = track('load', load_chunks, checked_chunks(), strategy=RANGE_LOAD_STRATEGY)
+    logger.info(f"fact_cart {start}..{end} completed: {rows} rows loaded.")
+    return rows
 
-def run():
-    """Run the cart events pipeline."""
+def run(start=None, end=None):
+    """Run the cart events pipeline incrementally, or for the inclusive days ``[start, end]`` (see ``run_range``)."""
+    if start is not None:
+        return run_range(start, end or start)
     logger = get_logger("fact_cart")
     try:
         logger.info("Starting cart events pipeline...")
-        df = extract()
-        df_transformed = transform(df)
-        run_dq_checks(df_transformed, required_columns=['cart_event_id', 'customer_id', 'date_id'])
-        load(df_transformed)
-        logger.info("Cart events pipeline completed successfully.")
+        since = get_extract_lower_bound("fact_cart")
+        high_water_mark = HighWaterMark(WATERMARK_COLUMN)
+        checker = DQChecker('fact_cart')
+        checkpoint = get_checkpoint("fact_cart")
+        if checkpoint.completed('transform'):
+            # Neither the extract nor the sessionizer run again; take the
+            # high-water mark and the open sessions from the checkpoint
+            value = checkpoint.metadata('transform')['high_water_mark']
+            high_water_mark.value = pd.Timestamp(value) if value else None
+            sessionizer = Sessionizer('fact_cart', get_session_gap(), checkpoint.read('sessions'))
+        else:
+            sessionizer = get_sessionizer(since)
+
+        def transformed_chunks():
+            for chunk in checkpoint.chunks('extract', extract_chunks, since=since):
+                high_water_mark.observe(chunk)
+                yield transform(chunk, sessionizer)
+            if checkpoint.active and high_water_mark.value is not None:
+                checkpoint.save('sessions', sessionizer.sessions_at(lower_bound_for("fact_cart", high_water_mark.value)))
+
+        def checked_chunks():
+            chunks = checkpoint.chunks('transform', transformed_chunks,
+                                       metadata=lambda: {'high_water_mark': high_water_mark.value})
+            for chunk_transformed in chunks:
+                chunk_transformed = track('dq', checker.check, chunk_transformed)
+                yield chunk_transformed
+            track('dq', checker.finalize)
+
+        rows = track('load', load_chunks, checked_chunks())
+        if rows == 0:
+            logger.info(f"No cart events since {since}; nothing to load.")
+            return
+        checker.commit()
+        # Sessions open where the next run's extract starts
+        sessionizer.save(lower_bound_for("fact_cart", high_water_mark.value))
+        set_watermark("fact_cart", high_water_mark.value)
+        logger.info(f"Cart events pipeline completed successfully: {rows} rows loaded. Watermark advanced to {high_water_mark.value}.")
     except Exception as e:
         logger.error(f"Error in cart events pipeline: {str(e)}")
         raise
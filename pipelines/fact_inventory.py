@@ -1,80 +1,287 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from common.bigquery_client import get_bq_client, load_to_bq
+from common.sinks import get_sink
 from common.logging_utils import get_logger
-from common.dq_checks import run_dq_checks
-from common.config import PIPELINE_CONFIG
-from common.db_utils import get_sqlalchemy_engine
+from common.dq_checks import DQChecker
+from common.extract_cache import get_cached
+from common.checkpoints import get_checkpoint
+from common.instrumentation import track, track_chunks
+from common.backfill import RANGE_LOAD_STRATEGY, range_checker
+from common.coercion import coerce_to_schema
+from common.db_utils import get_shared_engine
+from common.inventory_snapshots import SnapshotState, advance_state, daily_snapshots
+from common.watermarks import get_lookback_days, require_reread_safe_load
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+import argparse
+import multiprocessing
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 
 # Initialize logger
 logger = get_logger(__name__)
 
-def extract():
-    """Extract inventory data from the OLTP database."""
-    engine = get_sqlalchemy_engine(PIPELINE_CONFIG['oltp_db'])
-    query = """
+INVENTORY_QUERY = """
     SELECT 
-        i.inventory_id::text,
         i.product_id::text,
-        i.last_updated::date as date_id,
-        i.stock_available as closing_stock,
-        i.stock_threshold,
+        i.warehouse_id::text,
+        i.stock_available,
         i.restock_date,
         i.last_updated
     FROM inventory i
     """
-    df = pd.read_sql(query, engine)
-    engine.dispose()
+
+# Last reading per product and warehouse before a day: the snapshot state
+# a backfill range starts from
+INITIAL_STATE_QUERY = """
+    SELECT DISTINCT ON (i.product_id, i.warehouse_id)
+        i.product_id::text,
+        i.warehouse_id::text,
+        i.stock_available,
+        i.restock_date,
+        i.last_updated
+    FROM inventory i
+    WHERE i.last_updated < %(start)s
+    ORDER BY i.product_id, i.warehouse_id, i.last_updated DESC
+    """
+
+def _date_conditions(column, since=None, until=None):
+    conditions, params = [], {}
+    if since is not None:
+        conditions.append(f"{column} >= %(since)s")
+        params['since'] = since
+    if until is not None:
+        conditions.append(f"{column} < %(until)s")
+        params['until'] = until
+    return conditions, params
+
+def build_query(since=None, until=None):
+    """Return the inventory readings query and its parameters.
+
+    Args:
+        since: Optional inclusive lower bound on ``inventory.last_updated``.
+        until: Optional exclusive upper bound on ``inventory.last_updated``.
+            When both are None the full table is extracted.
+    """
+    conditions, params = _date_conditions('i.last_updated', since, until)
+    query = INVENTORY_QUERY
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return query, params or None
+
+def extract(since=None, until=None):
+    """Extract inventory readings from the OLTP database into a single DataFrame."""
+    engine = get_shared_engine()
+    query, params = build_query(since, until)
+    df = pd.read_sql(query, engine, params=params)
     return df
 
-def transform(df):
-    """Transform inventory data."""
-    # Ensure proper data types
-    df['inventory_id'] = df['inventory_id'].astype(str)
-    df['product_id'] = df['product_id'].astype(str)
-    
-    # Add seller_id with a default value since there's no direct relationship in OLTP
-    # In a real scenario, you would join with order history to determine the most common seller
-    # or use a separate product-seller mapping table
-    logger.warning("No direct seller-product relationship in OLTP. Using default seller 'unknown'")
-    df['seller_id'] = 'unknown'
-    
-    # Calculate derived fields
-    # Note: This is a simplified example - adjust calculations based on your business logic
-    df['opening_stock'] = 0  # You might need to calculate this from previous day's closing
-    df['stock_in'] = 0       # You might need to calculate this from restock events
-    df['stock_sold'] = 0     # You might need to calculate this from sales data
-    df['stockout_flag'] = df['closing_stock'] <= 0
-    
-    # Select and order columns to match the target table
-    result_df = df[[
-        'inventory_id', 'product_id', 'seller_id', 'date_id',
-        'opening_stock', 'stock_in', 'stock_sold', 'closing_stock',
-        'stockout_flag', 'restock_date'
-    ]]
-    
-    return result_df
+UNITS_SOLD_QUERY = """
+    SELECT oi.product_id::text AS product_id, o.order_date::date AS date_id, SUM(oi.quantity) AS stock_sold
+    FROM order_items oi
+    JOIN orders o ON oi.order_id = o.order_id
+    """
+
+# Main seller per product: the seller with the most order lines
+PRODUCT_SELLERS_QUERY = """
+    SELECT DISTINCT ON (oi.product_id) oi.product_id::text AS product_id, o.seller_id::text AS seller_id
+    FROM order_items oi
+    JOIN orders o ON oi.order_id = o.order_id
+    """
+
+def _cached_sales(since=None, until=None):
+    """This run's cached fact_sales rows in ``[since, until)``, or None when the cache does not cover them."""
+    sales = get_cached('fact_sales', since)
+    if sales is None:
+        return None
+    days = pc.cast(sales['date_id'], pa.date32(), safe=False)
+    sales = pa.table({'product_id': sales['product_id'], 'seller_id': sales['seller_id'],
+                      'date_id': days, 'quantity': sales['quantity']})
+    if since is not None:
+        sales = sales.filter(pc.greater_equal(sales['date_id'], pa.scalar(pd.Timestamp(since).date(), pa.date32())))
+    if until is not None:
+        sales = sales.filter(pc.less(sales['date_id'], pa.scalar(pd.Timestamp(until).date(), pa.date32())))
+    return sales
+
+def get_units_sold(since=None, until=None):
+    """Return units sold per product and day (``product_id``, ``date_id``, ``stock_sold``).
+
+    Aggregated from this run's cached fact_sales rows when they cover
+    ``since``; otherwise the aggregation is pushed down to Postgres.
+    """
+    sales = _cached_sales(since, until)
+    if sales is None:
+        conditions, params = _date_conditions('o.order_date', since, until)
+        query = UNITS_SOLD_QUERY + (" WHERE " + " AND ".join(conditions) if conditions else "")
+        df = pd.read_sql(query + " GROUP BY 1, 2", get_shared_engine(), params=params or None)
+    else:
+        df = sales.group_by(['product_id', 'date_id']).aggregate([('quantity', 'sum')]).to_pandas()
+        df = df.rename(columns={'quantity_sum': 'stock_sold'})
+    df['date_id'] = pd.to_datetime(df['date_id'])
+    df['stock_sold'] = df['stock_sold'].fillna(0).astype('int64')
+    return df
+
+def get_product_sellers(since=None, until=None):
+    """Return the main seller of each product sold in ``[since, until)`` (``product_id``, ``seller_id``)."""
+    sales = _cached_sales(since, until)
+    if sales is None:
+        conditions, params = _date_conditions('o.order_date', since, until)
+        query = PRODUCT_SELLERS_QUERY + (" WHERE " + " AND ".join(conditions) if conditions else "")
+        query += " GROUP BY oi.product_id, o.seller_id ORDER BY oi.product_id, COUNT(*) DESC, o.seller_id"
+        return pd.read_sql(query, get_shared_engine(), params=params or None)
+    counts = sales.group_by(['product_id', 'seller_id']).aggregate([('quantity', 'count')]).to_pandas()
+    counts = counts.sort_values(['product_id', 'quantity_count', 'seller_id'], ascending=[True, False, True])
+    return counts.drop_duplicates('product_id')[['product_id', 'seller_id']]
+
+def get_initial_state(start):
+    """Build the snapshot state as of the day before ``start`` from the source's history."""
+    engine = get_shared_engine()
+    readings = pd.read_sql(INITIAL_STATE_QUERY, engine, params={'start': start})
+    as_of = pd.Timestamp(start).date() - timedelta(days=1)
+    return advance_state(SnapshotState(), readings, as_of, get_product_sellers(until=start))
+
+def transform(df, units_sold=None, state=None, sellers=None, start=None, end=None):
+    """Turn inventory readings into daily inventory rows.
+
+    Rolls ``state`` (empty by default, i.e. ``df`` holds the full history)
+    forward over the readings; ``units_sold`` and ``sellers`` default to
+    the readings' date range.
+    """
+    since = pd.to_datetime(df['last_updated']).min().normalize() if len(df) else None
+    if units_sold is None:
+        units_sold = get_units_sold(since)
+    if sellers is None:
+        sellers = get_product_sellers(since)
+    result_df = daily_snapshots(state if state is not None else SnapshotState(), df, units_sold, sellers, start=start, end=end)
+    return coerce_to_schema(result_df, 'fact_inventory')
+
+def build_range(day_range):
+    """Compute the daily rows of one backfill range ``(start, end)`` (inclusive days) from scratch."""
+    start, end = day_range
+    until = end + timedelta(days=1)
+    state = get_initial_state(start)
+    readings = extract(since=start, until=until)
+    return transform(readings, get_units_sold(start, until), state, get_product_sellers(start, until),
+                     start=start, end=end)
+
+def split_days(start, end, ranges):
+    """Split the inclusive day range ``[start, end]`` into at most ``ranges`` contiguous ranges."""
+    days = pd.date_range(start, end, freq='D').date
+    return [(chunk[0], chunk[-1]) for chunk in np.array_split(days, min(ranges, len(days))) if len(chunk)]
 
 def load(df):
-    """Load data to BigQuery."""
-    client = get_bq_client()
-    load_to_bq(client, df, PIPELINE_CONFIG['bigquery']['dataset'], 'fact_inventory')
+    """Load data to the warehouse sink."""
+    get_sink().load([df], 'fact_inventory')
+
+def load_chunks(chunks, strategy=None):
+    """Load a stream of transformed chunks to the warehouse sink; returns the number of rows loaded."""
+    return get_sink().load(chunks, 'fact_inventory', strategy=strategy)
+
+def get_state_cutoff(today=None):
+    """Last day the snapshot state may advance to: days after it are re-emitted next run for late readings."""
+    today = today or date.today()
+    return today - timedelta(days=1 + get_lookback_days('fact_inventory'))
+
+def run_range(start, end):
+    """Recompute the daily rows of the inclusive days ``[start, end]``, overwriting their partitions.
+
+    Like one range of ``backfill`` in this process; the snapshot state and
+    the DQ row-count baseline are not touched.
+    """
+    logger = get_logger("fact_inventory")
+    checker = range_checker('fact_inventory')
+    df = track('transform', build_range, (start, end))
+    df = track('dq', checker.check, df)
+    track('dq', checker.finalize)
+    rows = track('load', load_chunks, [df], strategy=RANGE_LOAD_STRATEGY)
+    logger.info(f"fact_inventory {start}..{end} completed: {rows} rows loaded.")
+    return rows
+
+def run(start=None, end=None):
+    """Run the inventory pipeline.
 
-def run():
-    """Run the inventory pipeline."""
+    Rolls the snapshot state forward from the day after its ``as_of`` to
+    today. Without a state the whole history is read; use ``--backfill``
+    for large histories. With ``start`` the inclusive days ``[start, end]``
+    are recomputed instead (see ``run_range``).
+    """
+    if start is not None:
+        return run_range(start, end or start)
     logger = get_logger("fact_inventory")
     try:
         logger.info("Starting inventory pipeline...")
-        df = extract()
-        df_transformed = transform(df)
-        run_dq_checks(df_transformed, required_columns=['inventory_id', 'product_id', 'date_id'])
-        load(df_transformed)
-        logger.info("Inventory pipeline completed successfully.")
+        state = SnapshotState.load()
+        start = state.as_of + timedelta(days=1) if state.as_of else None
+        if start is not None:
+            # The days after the state cutoff are recomputed every run
+            require_reread_safe_load("fact_inventory")
+        checker = DQChecker('fact_inventory')
+        checkpoint = get_checkpoint("fact_inventory")
+        # A resumed run keeps the day of the run whose readings it reuses
+        today = date.fromisoformat(checkpoint.metadata('extract.readings').get('today') or date.today().isoformat())
+        readings = checkpoint.frame('extract.readings', extract, start, metadata={'today': today})
+        sellers = checkpoint.frame('extract.sellers', get_product_sellers, start)
+        df = checkpoint.read('transform')
+        if df is None:
+            units_sold = checkpoint.frame('extract.units_sold', get_units_sold, start)
+            df = checkpoint.frame('transform', transform, readings, units_sold, state, sellers, start=start, end=today)
+        df = track('dq', checker.check, df)
+        track('dq', checker.finalize)
+        if len(df) == 0:
+            logger.info(f"No inventory activity since {start}; nothing to load.")
+            return
+        rows = track('load', load_chunks, [df])
+        checker.commit()
+        cutoff = get_state_cutoff(today)
+        if state.as_of is None or cutoff > state.as_of:
+            advance_state(state, readings, cutoff, sellers).save()
+            logger.info(f"Inventory snapshot state advanced to {cutoff}.")
+        logger.info(f"Inventory pipeline completed successfully: {rows} rows loaded since {start}.")
     except Exception as e:
         logger.error(f"Error in inventory pipeline: {str(e)}")
         raise
 
+def backfill(start, end, workers=4):
+    """Recompute the daily rows of ``[start, end]`` with date ranges processed in parallel.
+
+    Each range builds its starting state from the source's history, so the
+    ranges are independent; the results are loaded together, overwriting
+    their partitions. A missing or adjoining snapshot state is moved to
+    ``end`` (at most to the state cutoff) so that ``run()`` continues from there.
+    """
+    logger = get_logger("fact_inventory")
+    ranges = split_days(start, end, workers)
+    logger.info(f"Backfilling inventory {start}..{end} in {len(ranges)} ranges on {workers} processes...")
+    checker = DQChecker('fact_inventory')
+
+    def checked_chunks(executor):
+        for chunk in track_chunks('transform', executor.map(build_range, ranges)):
+            yield track('dq', checker.check, chunk)
+        track('dq', checker.finalize)
+
+    # Spawned workers open their own connection pools instead of inheriting ours
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        rows = track('load', load_chunks, checked_chunks(executor))
+    checker.commit()
+
+    state = SnapshotState.load()
+    as_of = min(end, get_state_cutoff())
+    if state.as_of is None or start - timedelta(days=1) <= state.as_of < as_of:
+        get_initial_state(as_of + timedelta(days=1)).save()
+        logger.info(f"Inventory snapshot state moved to {as_of}.")
+    logger.info(f"Inventory backfill completed successfully: {rows} rows loaded.")
+    return rows
+
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description='Run the inventory pipeline')
+    parser.add_argument('--backfill', nargs=2, metavar=('START', 'END'), type=date.fromisoformat,
+                        help='Recompute the inclusive date range START..END (YYYY-MM-DD) instead')
+    parser.add_argument('--workers', type=int, default=4, help='Backfill processes')
+    args = parser.parse_args()
+    if args.backfill:
+        backfill(*args.backfill, workers=args.workers)
+    else:
+        run()
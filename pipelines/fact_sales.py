@@ -1,18 +1,30 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from common.bigquery_client import get_bq_client, load_to_bq
+from common.sinks import get_sink
 from common.logging_utils import get_logger
-from common.dq_checks import run_dq_checks
-from common.config import PIPELINE_CONFIG
-from common.db_utils import get_sqlalchemy_engine
+from common.dq_checks import DQChecker
+from common.extract_cache import cache_writer
+from common.checkpoints import get_checkpoint
+from common.instrumentation import track, track_chunks
+from common.backfill import RANGE_LOAD_STRATEGY, day_bounds, range_checker
+from common.coercion import coerce_to_schema
+from common.db_utils import (get_extract_parallelism, get_shared_engine, iter_partitioned_query_chunks,
+                             iter_query_chunks, range_condition)
+from common.watermarks import HighWaterMark, get_extract_lower_bound, set_watermark
 import pandas as pd
 
+# Source column that drives incremental extraction
+WATERMARK_COLUMN = 'order_date'
 
-def extract():
-    """Extract sales data from the OLTP database."""
-    engine = get_sqlalchemy_engine(PIPELINE_CONFIG['oltp_db'])
-    query = '''
+# Key the extract is split on for parallel reads
+PARTITION_KEY = 'oi.order_item_id'
+
+# Source keys the sales extract can be filtered on (CDC lookups)
+KEY_COLUMNS = {'order_id': 'o.order_id', 'order_item_id': 'oi.order_item_id'}
+
+
+SALES_QUERY = '''
     SELECT oi.order_item_id AS sales_id, o.order_id, o.customer_id, oi.product_id, o.seller_id, o.order_date AS date_id,
            oi.quantity, (oi.quantity * oi.unit_price) AS gross_value, oi.discount, oi.tax,
            ((oi.quantity * oi.unit_price) - oi.discount + oi.tax) AS net_revenue,
@@ -22,49 +34,167 @@ def extract():
     JOIN orders o ON oi.order_id = o.order_id
     JOIN products p ON oi.product_id = p.product_id
     '''
-    df = pd.read_sql(query, engine)
-    engine.dispose()
+
+
+SALES_BOUNDS_QUERY = f'''
+    SELECT MIN({PARTITION_KEY}), MAX({PARTITION_KEY})
+    FROM order_items oi
+    JOIN orders o ON oi.order_id = o.order_id
+    '''
+
+
+def _date_conditions(since=None, until=None):
+    conditions, params = [], {}
+    if since is not None:
+        conditions.append('o.order_date >= %(since)s')
+        params['since'] = since
+    if until is not None:
+        conditions.append('o.order_date < %(until)s')
+        params['until'] = until
+    return conditions, params
+
+
+def build_query(since=None, key_range=None, until=None):
+    """Return the sales extract query and its parameters.
+
+    Args:
+        since: Optional inclusive lower bound on ``orders.order_date``. When
+            None the full table is extracted.
+        key_range: Optional ``(start, end)`` range of ``order_item_id``
+            (see ``split_range``) for a partitioned extract
+        until: Optional exclusive upper bound on ``orders.order_date``
+    """
+    query = SALES_QUERY
+    conditions, params = _date_conditions(since, until)
+    if key_range is not None:
+        condition, range_params = range_condition(PARTITION_KEY, key_range)
+        conditions.append(condition)
+        params.update(range_params)
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    return query, params or None
+
+
+def build_bounds_query(since=None, until=None):
+    """Return the query for the smallest and largest ``order_item_id`` to extract."""
+    conditions, params = _date_conditions(since, until)
+    if not conditions:
+        return SALES_BOUNDS_QUERY, None
+    return SALES_BOUNDS_QUERY + ' WHERE ' + ' AND '.join(conditions), params
+
+
+def extract(since=None):
+    """Extract sales data from the OLTP database into a single DataFrame."""
+    engine = get_shared_engine()
+    query, params = build_query(since)
+    df = pd.read_sql(query, engine, params=params)
     return df
 
 
+def extract_keys(column, values):
+    """Extract the sales rows whose source ``column`` is in ``values`` (used by CDC)."""
+    if column not in KEY_COLUMNS:
+        raise ValueError(f"Cannot extract sales by {column}")
+    engine = get_shared_engine()
+    query = SALES_QUERY + f' WHERE {KEY_COLUMNS[column]} = ANY(%(values)s)'
+    return pd.read_sql(query, engine, params={'values': list(values)})
+
+
+def extract_chunks(since=None, parallelism=None, until=None):
+    """Stream sales data from the OLTP database as bounded-size DataFrame chunks.
+
+    With a parallelism above 1 (``pipelines.fact_sales.extract_parallelism``)
+    the extract is split into ``order_item_id`` ranges read concurrently;
+    chunks then arrive in no particular order.
+    """
+    parallelism = parallelism or get_extract_parallelism('fact_sales')
+    if parallelism > 1:
+        return iter_partitioned_query_chunks(lambda key_range: build_query(since, key_range, until),
+                                             build_bounds_query(since, until), parallelism)
+    query, params = build_query(since, until=until)
+    return iter_query_chunks(query, params)
+
+
 def transform(df):
-    df['sales_id'] = df['sales_id'].astype(str)
-    df['order_id'] = df['order_id'].astype(str)
-    df['customer_id'] = df['customer_id'].astype(str)
-    df['product_id'] = df['product_id'].astype(str)
-    df['seller_id'] = df['seller_id'].astype(str)
-    df['date_id'] = pd.to_datetime(df['date_id'])
-    df['order_date'] = pd.to_datetime(df['order_date'])
-    df['delivery_date'] = pd.to_datetime(df['delivery_date'])
-    # Robustly decode any bytes columns to string
-    for col in df.columns:
-        if df[col].dtype == object:
-            if df[col].apply(lambda x: isinstance(x, bytes)).any():
-                df[col] = df[col].apply(lambda x: x.decode('utf-8') if isinstance(x, bytes) else x)
-    for col in df.columns:
-        if str(df[col].dtype) == 'bytes' or df[col].apply(lambda x: isinstance(x, bytes)).any():
-            df[col] = df[col].apply(lambda x: x.decode('utf-8') if isinstance(x, bytes) else str(x))
-    if 'fulfillment_time' in df:
-        if pd.api.types.is_timedelta64_dtype(df['fulfillment_time']):
-            df['fulfillment_time'] = df['fulfillment_time'].dt.days
-        else:
-            df['fulfillment_time'] = df['fulfillment_time'].astype('Int64')
+    # One vectorized pass per column: ids (and any bytes) to string, dates to
+    # datetime, fulfillment_time (days or interval) to Int64
+    df = coerce_to_schema(df, 'fact_sales')
     df = df.reset_index(drop=True)
     return df
 
 
 def load(df):
-    client = get_bq_client()
-    load_to_bq(client, df, PIPELINE_CONFIG['bigquery']['dataset'], 'fact_sales')
+    get_sink().load([df], 'fact_sales')
+
+
+def load_chunks(chunks, strategy=None):
+    """Load a stream of transformed chunks; returns the number of rows loaded."""
+    return get_sink().load(chunks, 'fact_sales', strategy=strategy)
+
 
+def run_range(start, end):
+    """Reload the sales of the inclusive days ``[start, end]``, overwriting their partitions.
 
-def run():
+    The watermark, the extract cache and the DQ row-count baseline are not
+    touched (see common/backfill.py).
+    """
     logger = get_logger("fact_sales")
-    df = extract()
-    df_t = transform(df)
-    run_dq_checks(df_t, required_columns=['sales_id', 'order_id', 'customer_id', 'product_id'])
-    load(df_t)
-    logger.info("fact_sales pipeline completed.")
+    since, until = day_bounds(start, end)
+    checker = range_checker('fact_sales')
+
+    def checked_chunks():
+        for chunk in track_chunks('extract', extract_chunks(since=since, until=until)):
+            chunk_t = track('transform', transform, chunk)
+            yield track('dq', checker.check, chunk_t)
+        track('dq', checker.finalize)
+
+    rows = track('load', load_chunks, checked_chunks(), strategy=RANGE_LOAD_STRATEGY)
+    logger.info(f"fact_sales {start}..{end} completed: {rows} rows loaded.")
+    return rows
+
+
+def run(start=None, end=None):
+    """Run the sales pipeline incrementally, or for the inclusive days ``[start, end]`` (see ``run_range``)."""
+    if start is not None:
+        return run_range(start, end or start)
+    logger = get_logger("fact_sales")
+    since = get_extract_lower_bound("fact_sales")
+    high_water_mark = HighWaterMark(WATERMARK_COLUMN)
+    checker = DQChecker('fact_sales')
+    # Downstream facts reuse this run's sales rows instead of re-querying
+    cache = cache_writer('fact_sales', 'fact_sales', since)
+    checkpoint = get_checkpoint("fact_sales")
+    if checkpoint.completed('transform'):
+        # The extract is not read again; its high-water mark was stored with the checkpoint
+        value = checkpoint.metadata('transform')['high_water_mark']
+        high_water_mark.value = pd.Timestamp(value) if value else None
+
+    def transformed_chunks():
+        for chunk in checkpoint.chunks('extract', extract_chunks, since=since):
+            high_water_mark.observe(chunk)
+            yield transform(chunk)
+
+    def checked_chunks():
+        chunks = checkpoint.chunks('transform', transformed_chunks,
+                                   metadata=lambda: {'high_water_mark': high_water_mark.value})
+        for chunk_t in chunks:
+            chunk_t = track('dq', checker.check, chunk_t)
+            track('cache', cache.append, chunk_t)
+            yield chunk_t
+        track('dq', checker.finalize)
+
+    try:
+        rows = track('load', load_chunks, checked_chunks())
+    except Exception:
+        cache.discard()
+        raise
+    cache.commit()
+    if rows == 0:
+        logger.info(f"No sales rows since {since}; nothing to load.")
+        return
+    checker.commit()
+    set_watermark("fact_sales", high_water_mark.value)
+    logger.info(f"fact_sales pipeline completed: {rows} rows loaded. Watermark advanced to {high_water_mark.value}.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Apply OLTP changes captured by logical replication to the warehouse.
+
+Consumes the CDC replication slot (common/cdc.py) and feeds every
+micro-batch through the existing pipelines. ``cdc.tables`` in the pipeline
+config maps each captured source table to the pipeline that owns it and to
+the source key identifying changed rows. For each batch the changed keys are
+re-extracted with the pipeline's own query (``extract_keys``), so joins and
+renames stay in one place, then run through its ``transform()`` and the
+data-quality rules and written to the warehouse:
+
+* ``mode: replace`` (default): the warehouse rows for those keys are replaced
+  by the re-extracted rows in one transaction; keys that no longer exist in
+  the source (deletes) are removed.
+* ``mode: append``: the re-extracted rows are appended using the table's load
+  strategy, and deleted keys are removed.
+
+The slot only advances after a batch has been loaded.
+
+``inventory`` cannot be captured: ``fact_inventory`` rolls a snapshot state
+forward, so a changed reading maps to no single warehouse row. Configuring it
+(or any pipeline without ``extract_keys``) under ``cdc.tables`` is an error.
+"""
+
+import argparse
+import importlib
+import logging
+import sys
+from pathlib import Path
+from typing import Dict
+
+import pandas as pd
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from common.cdc import CDCConsumer, drop_slot, get_cdc_config
+from common.dq_checks import DQChecker
+from common.instrumentation import instrument_pipeline, track
+from common.sinks import get_sink
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger("cdc_runner")
+
+
+def get_cdc_tables() -> Dict[str, dict]:
+    """Return the ``cdc.tables`` mapping of source tables to pipelines."""
+    tables = get_cdc_config().get('tables') or {}
+    if not tables:
+        raise ValueError("No tables configured under cdc.tables in the pipeline config")
+    return tables
+
+
+def check_cdc_tables(tables: Dict[str, dict]) -> None:
+    """Raise ValueError if a configured table's pipeline cannot apply row changes."""
+    for source_table, config in tables.items():
+        pipeline = config['pipeline']
+        if source_table == 'inventory' or pipeline == 'fact_inventory':
+            raise ValueError(
+                f"cdc.tables.{source_table}: fact_inventory is computed from its snapshot state, not per row; "
+                f"remove it and let the scheduled fact_inventory run (or run_range) pick up inventory changes")
+        if not hasattr(importlib.import_module(f"pipelines.{pipeline}"), 'extract_keys'):
+            raise ValueError(f"cdc.tables.{source_table}: {pipeline} has no extract_keys to re-extract changed rows")
+
+
+def apply_table_changes(source_table: str, changes: pd.DataFrame) -> int:
+    """Re-extract, transform, check and load the rows behind one table's changes."""
+    config = get_cdc_tables()[source_table]
+    pipeline = config['pipeline']
+    key = config['key']
+    target_key = config.get('target_key', key)
+    module = importlib.import_module(f"pipelines.{pipeline}")
+    sink = get_sink()
+
+    keys = changes[key].dropna().unique().tolist()
+    deleted = changes.drop_duplicates(key, keep='last')
+    deleted = deleted.loc[deleted['_op'] == 'delete', key].tolist()
+    df = track('extract', module.extract_keys, key, keys)
+    rows = 0
+    if len(df):
+        df = track('transform', module.transform, df)
+        df = track('dq', DQChecker(pipeline).check, df)
+    if config.get('mode', 'replace') == 'replace':
+        rows = track('load', sink.replace_rows, [df], pipeline, target_key, keys)
+    else:
+        if len(df):
+            rows = track('load', sink.load, [df], pipeline)
+        if deleted:
+            track('load', sink.delete_rows, pipeline, target_key, deleted)
+    logger.info(f"{source_table}: {len(changes)} changes ({len(deleted)} deletes) -> {rows} {pipeline} rows")
+    return rows
+
+
+def apply_batch(frames: Dict[str, pd.DataFrame]) -> None:
+    """Apply one micro-batch, table by table; any failure leaves the slot unconfirmed."""
+    for source_table, changes in frames.items():
+        pipeline = get_cdc_tables()[source_table]['pipeline']
+        with instrument_pipeline(f"cdc_{pipeline}"):
+            apply_table_changes(source_table, changes)
+
+
+def print_batch(frames: Dict[str, pd.DataFrame]) -> None:
+    """Dry-run handler: show what a batch would apply."""
+    for source_table, changes in frames.items():
+        counts = changes['_op'].value_counts().to_dict()
+        print(f"{source_table}: {len(changes)} changes {counts}")
+        print(changes.tail(5).to_string(index=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply OLTP changes from the CDC replication slot to the warehouse')
+    parser.add_argument('--max-batches', type=int, default=None,
+                        help='Stop after this many micro-batches (default: run until interrupted)')
+    parser.add_argument('--idle-timeout', type=float, default=None,
+                        help='Stop once no change has arrived for this many seconds')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Print each micro-batch instead of loading it (the slot still advances)')
+    parser.add_argument('--drop-slot', action='store_true',
+                        help='Drop the replication slot and exit')
+    args = parser.parse_args()
+
+    tables = get_cdc_tables()
+    check_cdc_tables(tables)
+    consumer = CDCConsumer(print_batch if args.dry_run else apply_batch, tables=list(tables))
+    if args.drop_slot:
+        drop_slot(consumer.slot_name)
+        return 0
+    try:
+        batches = consumer.run(max_batches=args.max_batches, idle_timeout=args.idle_timeout)
+    except KeyboardInterrupt:
+        logger.info("Interrupted; unconfirmed changes will be replayed on the next run")
+        return 0
+    except Exception as e:
+        logger.error(f"CDC run failed: {str(e)}", exc_info=True)
+        return 1
+    logger.info(f"Applied {batches} micro-batches")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
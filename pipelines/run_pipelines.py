@@ -2,20 +2,37 @@
 """
 Run all data pipelines in the correct order based on dependencies.
 
+Pipelines are scheduled from PIPELINE_DEPENDENCIES on a thread pool: each
+pipeline starts as soon as all of its own dependencies have succeeded, and a
+failure only skips the pipelines downstream of it.
+
 Dependency order:
-1. dim_date
-2. dim_customer, dim_product, dim_seller (can run in parallel)
-3. dim_campaign (depends on dim_customer, dim_product, dim_seller)
-4. fact_sales (depends on all dimensions)
-5. fact_inventory, fact_cart, fact_marketing (can run in parallel, depend on fact_sales)
+1. dim_date, dim_customer, dim_product, dim_seller (no dependencies)
+2. dim_campaign (depends on dim_customer, dim_product, dim_seller)
+3. fact_sales (depends on all dimensions except dim_campaign)
+4. fact_inventory, fact_cart (depend on fact_sales)
+5. fact_marketing (depends on fact_sales and dim_campaign, whose keys its DQ
+   rules check)
+
+Every run checkpoints the stage outputs of its pipelines (common/checkpoints.py).
+If a run fails, ``--resume <run_id>`` skips the pipelines that succeeded and
+continues the others from their last checkpointed stage.
+
+``--backfill START END`` instead reloads the fact pipelines over an inclusive
+date range, split into day or week shards (``--shard``) that run on a process
+pool (common/backfill.py). Rerunning the same backfill only runs the shards
+that have not finished.
 """
 
 import argparse
 import importlib
 import logging
+import multiprocessing
 import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from datetime import date
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 # Add project root to path
 sys.path.append(str(Path(__file__).parent.parent))
@@ -31,6 +48,10 @@ logging.basicConfig(
 
 logger = logging.getLogger("pipeline_runner")
 
+# Most pipelines are I/O-bound on Postgres and BigQuery, so a handful of
+# threads is enough to run every independent branch of the DAG at once.
+DEFAULT_MAX_WORKERS = 4
+
 # Define pipeline dependencies
 PIPELINE_DEPENDENCIES = {
     'dim_date': {
@@ -67,22 +88,33 @@ PIPELINE_DEPENDENCIES = {
     },
     'fact_marketing': {
         'module': 'pipelines.fact_marketing',
-        'dependencies': ['fact_sales']
+        'dependencies': ['fact_sales', 'dim_campaign']
     }
 }
 
+# Pipelines whose run() takes a logical date range, and so can be backfilled
+DATE_RANGE_PIPELINES = ['fact_sales', 'fact_inventory', 'fact_cart', 'fact_marketing']
+
 
 def run_pipeline(pipeline_name: str, pipelines_to_run: Optional[List[str]] = None) -> bool:
     """Run a single pipeline if it's in the list of pipelines to run."""
     if pipelines_to_run and pipeline_name not in pipelines_to_run:
         logger.info(f"Skipping {pipeline_name} (not in the list of pipelines to run)")
         return True
+    from common.checkpoints import get_checkpoint
+    checkpoint = get_checkpoint(pipeline_name)
+    if checkpoint.is_complete():
+        logger.info(f"Skipping {pipeline_name} (already succeeded in run {checkpoint.run_id})")
+        return True
         
     logger.info(f"Starting {pipeline_name} pipeline...")
     try:
         module_name = PIPELINE_DEPENDENCIES[pipeline_name]['module']
         module = importlib.import_module(module_name)
-        module.run()
+        from common.instrumentation import instrument_pipeline
+        with instrument_pipeline(pipeline_name):
+            module.run()
+        checkpoint.complete()
         logger.info(f"Successfully completed {pipeline_name} pipeline")
         return True
     except Exception as e:
@@ -90,46 +122,151 @@ def run_pipeline(pipeline_name: str, pipelines_to_run: Optional[List[str]] = Non
         return False
 
 
-def run_all_pipelines(pipelines_to_run: Optional[List[str]] = None) -> bool:
-    """Run all pipelines in the correct order based on dependencies."""
-    # Define the execution order
-    execution_order = [
-        # First run all dimension pipelines
-        ['dim_date'],
-        ['dim_customer', 'dim_product', 'dim_seller'],  # Can run in parallel
-        ['dim_campaign'],
-        # Then fact pipelines
-        ['fact_sales'],
-        ['fact_inventory', 'fact_cart', 'fact_marketing']  # Can run in parallel
-    ]
-    
-    success = True
-    
-    for pipeline_group in execution_order:
-        group_success = True
-        
-        # Check if any pipeline in this group should run
-        if pipelines_to_run and not any(p in pipelines_to_run for p in pipeline_group):
-            logger.info(f"Skipping pipeline group: {', '.join(pipeline_group)}")
-            continue
-            
-        logger.info(f"Starting pipeline group: {', '.join(pipeline_group)}")
-        
-        # Run all pipelines in the current group
-        for pipeline in pipeline_group:
-            if not run_pipeline(pipeline, pipelines_to_run):
-                group_success = False
-                success = False
-                logger.error(f"Pipeline {pipeline} failed, but continuing with other pipelines")
-        
-        if not group_success:
-            logger.error(f"One or more pipelines in group {pipeline_group} failed")
-    
-    return success
+def validate_dependencies() -> None:
+    """Raise ValueError if PIPELINE_DEPENDENCIES references unknown pipelines or has a cycle."""
+    for name, config in PIPELINE_DEPENDENCIES.items():
+        unknown = [dep for dep in config['dependencies'] if dep not in PIPELINE_DEPENDENCIES]
+        if unknown:
+            raise ValueError(f"Pipeline {name} depends on unknown pipelines: {unknown}")
+
+    resolved = set()
+    remaining = {name: set(config['dependencies']) for name, config in PIPELINE_DEPENDENCIES.items()}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if deps <= resolved]
+        if not ready:
+            raise ValueError(f"Dependency cycle between pipelines: {sorted(remaining)}")
+        for name in ready:
+            resolved.add(name)
+            del remaining[name]
+
+
+def run_all_pipelines(pipelines_to_run: Optional[List[str]] = None, max_workers: int = DEFAULT_MAX_WORKERS,
+                      run_id: Optional[str] = None) -> bool:
+    """Run all pipelines as a DAG, in parallel where dependencies allow.
+
+    A pipeline is submitted as soon as every one of its dependencies has
+    succeeded. If a pipeline fails, its transitive dependents are skipped and
+    everything else keeps running. Pipelines excluded by ``pipelines_to_run``
+    count as satisfied dependencies. All pipelines share one extract cache
+    (common/extract_cache.py), which is dropped when the run ends. Stage
+    checkpoints are kept only if a pipeline failed; passing the ``run_id`` of
+    such a run resumes it.
+    """
+    validate_dependencies()
+
+    # Every pipeline borrows from one shared connection pool; make sure it can
+    # serve all concurrently running pipelines, each with its parallel extract
+    # queries, without waiting on checkouts.
+    from common.db_utils import get_extract_parallelism, get_shared_engine
+    parallelism = max(get_extract_parallelism(name) for name in PIPELINE_DEPENDENCIES)
+    get_shared_engine(min_pool_size=max_workers * parallelism)
+
+    pending: Dict[str, set] = {
+        name: set(config['dependencies']) for name, config in PIPELINE_DEPENDENCIES.items()
+    }
+    status: Dict[str, str] = {}
+
+    from common.checkpoints import checkpoint_run, discard_run
+    from common.extract_cache import cache_run
+    with checkpoint_run(run_id) as run_id, cache_run(), ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline") as executor:
+        running = {}
+        while pending or running:
+            # Skip everything downstream of a failure; repeat until no new skips
+            # so the skip propagates through chains of dependents.
+            skipped_any = True
+            while skipped_any:
+                skipped_any = False
+                for name in list(pending):
+                    blocked_by = [dep for dep in pending[name] if status.get(dep) in ('failed', 'skipped')]
+                    if blocked_by:
+                        logger.error(f"Skipping {name} because upstream pipelines did not succeed: {', '.join(blocked_by)}")
+                        status[name] = 'skipped'
+                        del pending[name]
+                        skipped_any = True
+
+            ready = [name for name, deps in pending.items() if all(status.get(dep) == 'succeeded' for dep in deps)]
+            for name in ready:
+                del pending[name]
+                running[executor.submit(run_pipeline, name, pipelines_to_run)] = name
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                status[name] = 'succeeded' if future.result() else 'failed'
+                if status[name] == 'failed':
+                    logger.error(f"Pipeline {name} failed; its downstream pipelines will be skipped")
+
+    failed = sorted(name for name, state in status.items() if state != 'succeeded')
+    if failed:
+        logger.error(f"Pipelines that failed or were skipped: {', '.join(failed)}")
+        logger.error(f"Resume this run with --resume {run_id}")
+    else:
+        discard_run(run_id)
+    return not failed
+
+
+def run_shard(pipeline_name: str, start: date, end: date) -> int:
+    """Run one pipeline over the inclusive days ``[start, end]``; returns the rows loaded."""
+    module = importlib.import_module(PIPELINE_DEPENDENCIES[pipeline_name]['module'])
+    from common.instrumentation import instrument_pipeline
+    with instrument_pipeline(pipeline_name, run_id=f"backfill {start}..{end}"):
+        return module.run(start=start, end=end) or 0
+
+
+def run_backfill(start: date, end: date, unit: str = 'day', pipelines_to_run: Optional[List[str]] = None,
+                 max_workers: int = DEFAULT_MAX_WORKERS) -> bool:
+    """Reload the fact pipelines over ``[start, end]``, one (pipeline, shard) task at a time per process.
+
+    Shards run independently of each other and of the dependency order: each
+    reads only its own days from the source. Shards recorded as finished by
+    an earlier run of the same backfill are skipped, and a failed shard does
+    not stop the others.
+    """
+    from common.backfill import BackfillProgress, split_shards
+    from common.config import get_sink_type
+
+    names = [name for name in DATE_RANGE_PIPELINES if not pipelines_to_run or name in pipelines_to_run]
+    for name in pipelines_to_run or []:
+        if name not in DATE_RANGE_PIPELINES:
+            logger.info(f"Skipping {name} (it does not take a date range)")
+    if get_sink_type() == 'duckdb' and max_workers > 1:
+        logger.warning("The DuckDB sink allows one writing process; backfilling on a single process")
+        max_workers = 1
+
+    shards = split_shards(start, end, unit)
+    progress = BackfillProgress(start, end, unit)
+    tasks = [(name, shard) for shard in shards for name in names if not progress.is_done(name, shard)]
+    logger.info(f"Backfilling {', '.join(names)} over {start}..{end}: {len(tasks)} of "
+                f"{len(shards) * len(names)} shards left, {max_workers} at a time")
+
+    failed = []
+    # Spawned workers open their own connection pools and sinks instead of inheriting ours
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {executor.submit(run_shard, name, *shard): (name, shard) for name, shard in tasks}
+        for future in as_completed(futures):
+            name, (shard_start, shard_end) = futures[future]
+            try:
+                rows = future.result()
+            except Exception as e:
+                logger.error(f"Backfill of {name} {shard_start}..{shard_end} failed: {str(e)}")
+                failed.append(f"{name} {shard_start}..{shard_end}")
+                continue
+            progress.mark_done(name, (shard_start, shard_end), rows)
+            logger.info(f"Backfilled {name} {shard_start}..{shard_end}: {rows} rows")
+
+    if failed:
+        logger.error(f"Shards that failed: {', '.join(sorted(failed))}")
+        logger.error("Rerun the same backfill to retry only the unfinished shards")
+    else:
+        logger.info(f"Backfill completed: {progress.rows()} rows loaded")
+    return not failed
 
 
 def main():
-    parser = argparse.ArgumentParser(description='Run data pipelines in the correct order')
+    parser = argparse.ArgumentParser(description='Run data pipelines in dependency order, in parallel where possible')
     parser.add_argument(
         '--pipelines',
         nargs='+',
@@ -137,6 +274,31 @@ def main():
         default=['all'],
         help='List of pipelines to run (default: all)'
     )
+    parser.add_argument(
+        '--max-workers',
+        type=int,
+        default=DEFAULT_MAX_WORKERS,
+        help=f'Maximum number of pipelines to run concurrently (default: {DEFAULT_MAX_WORKERS})'
+    )
+    parser.add_argument(
+        '--resume',
+        metavar='RUN_ID',
+        help='Resume a failed run: skip its succeeded pipelines and reuse the stage checkpoints of the others'
+    )
+    parser.add_argument(
+        '--backfill',
+        nargs=2,
+        metavar=('START', 'END'),
+        type=date.fromisoformat,
+        help=f'Reload the fact pipelines ({", ".join(DATE_RANGE_PIPELINES)}) over the inclusive date range '
+             'START..END (YYYY-MM-DD) on --max-workers processes; a rerun skips finished shards'
+    )
+    parser.add_argument(
+        '--shard',
+        choices=['day', 'week'],
+        default='day',
+        help='Backfill shard size (default: day)'
+    )
     
     args = parser.parse_args()
     
@@ -147,7 +309,24 @@ def main():
     
     logger.info(f"Starting pipeline execution for: {pipelines_to_run if pipelines_to_run else 'all pipelines'}")
     
-    success = run_all_pipelines(pipelines_to_run)
+    if args.max_workers < 1:
+        parser.error('--max-workers must be at least 1')
+    if args.backfill:
+        if args.resume:
+            parser.error('--backfill cannot be combined with --resume')
+        start, end = args.backfill
+        if end < start:
+            parser.error('--backfill END must not be before START')
+        if run_backfill(start, end, args.shard, pipelines_to_run, max_workers=args.max_workers):
+            return 0
+        logger.error("One or more backfill shards failed")
+        return 1
+    if args.resume:
+        from common.checkpoints import run_exists
+        if not run_exists(args.resume):
+            parser.error(f'No checkpoints of run {args.resume} to resume')
+
+    success = run_all_pipelines(pipelines_to_run, max_workers=args.max_workers, run_id=args.resume)
     
     if success:
         logger.info("All pipelines completed successfully!")
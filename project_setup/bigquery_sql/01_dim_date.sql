@@ -6,5 +6,20 @@ CREATE TABLE ecommerce_dw.dim_date (
   week INT64,
   day INT64,
   weekday STRING,
-  is_weekend BOOL
+  is_weekend BOOL,
+  day_of_week INT64,
+  day_name STRING,
+  month_name STRING,
+  iso_year INT64,
+  fiscal_year INT64,
+  fiscal_quarter INT64,
+  fiscal_month INT64,
+  is_holiday BOOL,
+  holiday_name STRING,
+  is_month_start BOOL,
+  is_month_end BOOL,
+  is_quarter_start BOOL,
+  is_quarter_end BOOL,
+  is_year_start BOOL,
+  is_year_end BOOL
 );
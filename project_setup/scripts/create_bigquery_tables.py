@@ -1,13 +1,52 @@
 import os
 import sys
+import argparse
 from google.cloud import bigquery
 from google.oauth2 import service_account
-from google.api_core.exceptions import Conflict
+from google.api_core.exceptions import Conflict, NotFound
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from config.bigquery_config import PROJECT_ID, KEY_PATH, SQL_DIR, DATASET_ID
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from common.bigquery_client import build_table_options_ddl, get_clustering_fields, get_time_partitioning
+from common.bq_schema import parse_ddl
 
 
-def run_ddl_files():
+def apply_table_options(ddl, table):
+    """Append the table's configured PARTITION BY / CLUSTER BY clauses to its DDL."""
+    options = build_table_options_ddl(table)
+    if not options:
+        return ddl
+    return f"{ddl.rstrip().rstrip(';')}\n{options};"
+
+
+def layout_matches(existing, table):
+    """Return True if an existing table already has the configured partitioning and clustering."""
+    wanted = get_time_partitioning(table)
+    current = existing.time_partitioning
+    if (wanted is None) != (current is None):
+        return False
+    if wanted is not None and (wanted.field != current.field or wanted.type_ != current.type_):
+        return False
+    return (get_clustering_fields(table) or None) == (existing.clustering_fields or None)
+
+
+def repartition_table(client, table):
+    """Rewrite an existing table in place with the configured partitioning and clustering."""
+    table_id = f"{PROJECT_ID}.{DATASET_ID}.{table}"
+    try:
+        existing = client.get_table(table_id)
+    except NotFound:
+        return
+    if layout_matches(existing, table):
+        print(f"{table} already has the configured layout.")
+        return
+    options = build_table_options_ddl(table)
+    print(f"Rewriting {table} with {' '.join(options.split()) or 'no partitioning or clustering'}...")
+    client.query(f"CREATE OR REPLACE TABLE `{table_id}`\n{options}\nAS SELECT * FROM `{table_id}`").result()
+    print(f"{table} rewritten.")
+
+
+def run_ddl_files(repartition=False):
     credentials = service_account.Credentials.from_service_account_file(KEY_PATH)
     client = bigquery.Client(credentials=credentials, project=PROJECT_ID)
     # Create dataset if not exists
@@ -23,12 +62,16 @@ def run_ddl_files():
         sql_path = os.path.join(SQL_DIR, sql_file)
         with open(sql_path, 'r') as f:
             ddl = f.read()
+        table = next(iter(parse_ddl(ddl)))
+        ddl = apply_table_options(ddl, table)
         print(f"Running {sql_file}...")
         try:
             client.query(ddl).result()
             print(f"{sql_file} executed successfully.")
         except Conflict as e:
             print(f"Table already exists, skipping {sql_file}.")
+            if repartition:
+                repartition_table(client, table)
             continue
         except Exception as e:
             print(f"Error executing {sql_file}: {e}")
@@ -37,4 +80,8 @@ def run_ddl_files():
 
 
 if __name__ == "__main__":
-    run_ddl_files()
+    parser = argparse.ArgumentParser(description="Create the BigQuery warehouse tables")
+    parser.add_argument('--repartition', action='store_true',
+                        help="Rewrite existing tables whose partitioning or clustering differs from the config")
+    args = parser.parse_args()
+    run_ddl_files(repartition=args.repartition)
@@ -0,0 +1,535 @@
+"""Deterministic synthetic OLTP data generator for load testing.
+
+Generates every table loaded by load_data.py at a TPC-style scale factor
+(SF1 is roughly one million orders) and streams it chunk by chunk to CSV
+files, Parquet files or straight into Postgres with COPY. Memory use depends
+on --chunk-size, not on the scale factor.
+
+Output is reproducible: every chunk draws from its own random generator
+seeded with (seed, table, chunk index), and product prices and campaign
+date ranges are pure functions of their ids, so referencing tables agree
+without keeping the referenced rows in memory.
+
+Foreign keys always point at existing rows, and customers, products and
+sellers are drawn from bounded Zipf distributions, so a small share of them
+accounts for most orders, cart events and campaign reach.
+
+Usage:
+    python scripts/generate_data.py --scale 1 --format csv
+    python scripts/generate_data.py --scale 10 --format parquet --output-dir /tmp/sf10
+    python scripts/generate_data.py --scale 0.01 --format postgres
+"""
+import io
+import os
+import sys
+import math
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+from psycopg2 import sql
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from common.config import PIPELINE_CONFIG
+
+# load_data.py lives next to this script
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from load_data import DATA_DIR, TABLE_LOAD_ORDER, get_connection
+
+DEFAULT_CHUNK_SIZE = 100_000
+DEFAULT_SEED = 42
+DEFAULT_START_DATE = '2023-01-01'
+DEFAULT_END_DATE = '2025-10-31'
+
+# Row counts at SF1; every table scales linearly with the scale factor
+SF1_ROWS = {
+    'customers': 100_000,
+    'sellers': 1_000,
+    'products': 10_000,
+    'marketing_campaigns': 50,
+    'orders': 1_000_000,
+    'campaign_performance': 200_000,
+    'cart_events': 3_000_000,
+}
+WAREHOUSES_PER_SF = 10
+ITEMS_PER_ORDER = 1.5           # order_items per order = 1 + Poisson(ITEMS_PER_ORDER)
+INVENTORY_SNAPSHOTS = 4         # inventory rows per product and warehouse
+
+# Zipf exponents: higher means more concentrated on the most popular ids
+CUSTOMER_SKEW = 0.8
+PRODUCT_SKEW = 1.0
+SELLER_SKEW = 0.9
+
+# First id of each table, matching the sample data in project_setup/data
+ID_OFFSETS = {
+    'customers': 0,
+    'sellers': 100,
+    'products': 1000,
+    'marketing_campaigns': 9000,
+    'orders': 5000,
+    'warehouses': 200,
+}
+
+# Fixed per-table salt so each table's random stream is independent of the others
+TABLE_SEEDS = {table: i for i, table in enumerate(TABLE_LOAD_ORDER)}
+
+CITIES = ['Mumbai', 'Delhi', 'Bangalore', 'Hyderabad', 'Chennai', 'Kolkata', 'Pune', 'Ahmedabad', 'Jaipur', 'Lucknow']
+CITY_WEIGHTS = [0.2, 0.18, 0.16, 0.1, 0.09, 0.08, 0.07, 0.05, 0.04, 0.03]
+ACQUISITION_CHANNELS = ['Organic', 'Ads', 'Referral', 'Social']
+ACQUISITION_WEIGHTS = [0.45, 0.3, 0.1, 0.15]
+CAMPAIGN_CHANNELS = ['Google Ads', 'Facebook', 'Instagram', 'Email', 'YouTube']
+ORDER_STATUSES = ['delivered', 'returned', 'canceled']
+ORDER_STATUS_WEIGHTS = [0.85, 0.07, 0.08]
+CART_EVENT_TYPES = ['add', 'remove', 'checkout', 'purchase']
+CART_EVENT_WEIGHTS = [0.6, 0.15, 0.15, 0.1]
+
+# (category, subcategory, brands, typical unit price)
+CATALOG = [
+    ('Electronics', 'Mobile Phones', ['Xiaomi', 'Apple', 'Samsung', 'OnePlus'], 30000),
+    ('Electronics', 'Wireless Earbuds', ['boAt', 'Noise', 'JBL'], 2500),
+    ('Electronics', 'Smartwatches', ['Noise', 'boAt', 'Fire-Boltt'], 4000),
+    ('Power & Accessories', 'Power Banks', ['Mi', 'Ambrane', 'Anker'], 1500),
+    ('Power & Accessories', 'Wireless Charging Stands', ['Ambrane', 'Belkin'], 2000),
+    ('Power & Accessories', 'Multifunctional Data Cables', ['Portronics', 'Anker'], 500),
+    ('Computing & Storage', 'External Hard Drives', ['Seagate', 'WD'], 5000),
+    ('Computing & Storage', 'Printers', ['HP', 'Canon'], 9000),
+    ('Beauty', 'Face Wash', ['Mamaearth', 'Himalaya'], 300),
+    ('Beauty', 'Beard Oil', ['Beardo', 'Ustraa'], 350),
+    ('Beauty', 'Face Cream', ['Nivea', 'Pond\'s'], 250),
+    ('Beauty', 'Sunscreen', ['Lakme', 'Neutrogena'], 400),
+    ('Beauty', 'Hair Oil', ['Wow', 'Parachute'], 600),
+]
+
+# DATE columns, written as YYYY-MM-DD to CSV and Postgres and as date32 to Parquet
+DATE_COLUMNS = {
+    'customers': ['signup_date'],
+    'sellers': ['join_date'],
+    'marketing_campaigns': ['start_date', 'end_date'],
+    'orders': ['order_date', 'delivery_date'],
+    'inventory': ['restock_date'],
+    'campaign_performance': ['date'],
+}
+
+
+# --- helpers -----------------------------------------------------------------
+
+def get_row_counts(scale):
+    return {table: max(1, int(round(rows * scale))) for table, rows in SF1_ROWS.items()}
+
+
+def chunk_rng(seed, table, chunk_index):
+    return np.random.default_rng([seed, TABLE_SEEDS[table], chunk_index])
+
+
+def hash_unit(ids, salt):
+    """Map integer ids to reproducible floats in [0, 1) (splitmix64)."""
+    x = np.asarray(ids, dtype=np.uint64) + np.uint64((salt * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def zipf_ranks(rng, n, skew, size):
+    """Draw ranks in [1, n] with P(rank) roughly proportional to rank ** -skew.
+
+    Uses the inverse CDF of the continuous bounded power law, so no per-item
+    probability table is needed however large n is.
+    """
+    u = rng.random(size)
+    if math.isclose(skew, 1.0):
+        x = np.power(n + 1.0, u)
+    else:
+        x = np.power(1.0 + u * ((n + 1.0) ** (1.0 - skew) - 1.0), 1.0 / (1.0 - skew))
+    return np.minimum(np.floor(x).astype(np.int64), n)
+
+
+def scatter_ranks(ranks, n):
+    """Spread popularity ranks over the id space so popular ids are not all adjacent."""
+    stride = int(n * 0.6180339887) | 1
+    while math.gcd(stride, n) != 1:
+        stride += 2
+    return (ranks - 1) * stride % n + 1
+
+
+def skewed_ids(rng, table, n, skew, size):
+    return scatter_ranks(zipf_ranks(rng, n, skew, size), n) + ID_OFFSETS[table]
+
+
+def weighted_choice(rng, values, weights, size):
+    return np.asarray(values, dtype=object)[rng.choice(len(values), size=size, p=weights)]
+
+
+def random_dates(rng, start, end, size):
+    days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+    return pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days, size), unit='D')
+
+
+def product_attributes(product_ids):
+    """Catalog entry and prices of products, derived from the id alone."""
+    product_ids = np.asarray(product_ids)
+    entry = (hash_unit(product_ids, 1) * len(CATALOG)).astype(np.int64)
+    base_price = np.array([c[3] for c in CATALOG], dtype=np.float64)[entry]
+    # Prices spread from 0.3x to ~3x the typical price of the subcategory
+    unit_price = np.round(base_price * (0.3 + 2.7 * hash_unit(product_ids, 2) ** 2)) - 1
+    cost_price = np.round(unit_price * (0.6 + 0.25 * hash_unit(product_ids, 3)), 2)
+    return entry, np.maximum(unit_price, 9.0), cost_price
+
+
+def campaign_dates(campaign_ids, start, end):
+    """Start and end date of campaigns, derived from the id alone (14-60 days long)."""
+    campaign_ids = np.asarray(campaign_ids)
+    duration = 14 + (hash_unit(campaign_ids, 4) * 47).astype(np.int64)
+    span = max((pd.Timestamp(end) - pd.Timestamp(start)).days - 60, 1)
+    first = pd.Timestamp(start) + pd.to_timedelta((hash_unit(campaign_ids, 5) * span).astype(np.int64), unit='D')
+    return first, first + pd.to_timedelta(duration - 1, unit='D')
+
+
+def chunk_bounds(total, chunk_size):
+    for index, begin in enumerate(range(0, total, chunk_size)):
+        yield index, begin, min(begin + chunk_size, total)
+
+
+# --- table generators (each yields (table, DataFrame) chunks) ------------------
+
+def generate_customers(counts, seed, chunk_size, start, end):
+    signup_start = (pd.Timestamp(start) - pd.DateOffset(years=3)).date()
+    for index, begin, stop in chunk_bounds(counts['customers'], chunk_size):
+        rng = chunk_rng(seed, 'customers', index)
+        size = stop - begin
+        ids = np.arange(begin, stop) + ID_OFFSETS['customers'] + 1
+        id_str = pd.Series(ids).astype(str)
+        channel = weighted_choice(rng, ACQUISITION_CHANNELS, ACQUISITION_WEIGHTS, size)
+        paid = np.isin(channel, ['Ads', 'Social'])
+        yield 'customers', pd.DataFrame({
+            'customer_id': ids,
+            'customer_name': 'Customer ' + id_str,
+            'email': 'customer' + id_str + '@example.com',
+            'phone': pd.Series(rng.integers(6_000_000_000, 9_999_999_999, size)).astype(str),
+            'location': weighted_choice(rng, CITIES, CITY_WEIGHTS, size),
+            'signup_date': random_dates(rng, signup_start, end, size),
+            'acquisition_channel': channel,
+            'acquisition_cost': np.where(paid, np.round(rng.uniform(50, 500, size), 2), 0.0),
+        })
+
+
+def generate_sellers(counts, seed, chunk_size, start, end):
+    categories = sorted({c[0] for c in CATALOG})
+    for index, begin, stop in chunk_bounds(counts['sellers'], chunk_size):
+        rng = chunk_rng(seed, 'sellers', index)
+        size = stop - begin
+        ids = np.arange(begin, stop) + ID_OFFSETS['sellers'] + 1
+        yield 'sellers', pd.DataFrame({
+            'seller_id': ids,
+            'seller_name': 'Seller ' + pd.Series(ids).astype(str),
+            'location': weighted_choice(rng, CITIES, CITY_WEIGHTS, size),
+            'rating': np.round(3.0 + 2.0 * rng.beta(5, 2, size), 1),
+            'join_date': random_dates(rng, pd.Timestamp(start) - pd.DateOffset(years=5), end, size),
+            'category_specialization': np.asarray(categories, dtype=object)[rng.integers(0, len(categories), size)],
+        })
+
+
+def generate_products(counts, seed, chunk_size, start, end):
+    categories = np.array([c[0] for c in CATALOG], dtype=object)
+    subcategories = np.array([c[1] for c in CATALOG], dtype=object)
+    # All brands in one flat array, indexed by each catalog entry's offset
+    brand_names = np.array([b for c in CATALOG for b in c[2]], dtype=object)
+    brand_counts = np.array([len(c[2]) for c in CATALOG])
+    brand_offsets = np.cumsum(brand_counts) - brand_counts
+    for index, begin, stop in chunk_bounds(counts['products'], chunk_size):
+        ids = np.arange(begin, stop) + ID_OFFSETS['products'] + 1
+        entry, unit_price, cost_price = product_attributes(ids)
+        brands = brand_names[brand_offsets[entry] + (hash_unit(ids, 6) * brand_counts[entry]).astype(np.int64)]
+        yield 'products', pd.DataFrame({
+            'product_id': ids,
+            'product_name': brands + ' ' + subcategories[entry] + ' ' + pd.Series(ids).astype(str).to_numpy(dtype=object),
+            'category': categories[entry],
+            'subcategory': subcategories[entry],
+            'brand': brands,
+            'unit_price': unit_price,
+            'cost_price': cost_price,
+        })
+
+
+def generate_marketing_campaigns(counts, seed, chunk_size, start, end):
+    for index, begin, stop in chunk_bounds(counts['marketing_campaigns'], chunk_size):
+        rng = chunk_rng(seed, 'marketing_campaigns', index)
+        ids = np.arange(begin, stop) + ID_OFFSETS['marketing_campaigns'] + 1
+        first, last = campaign_dates(ids, start, end)
+        yield 'marketing_campaigns', pd.DataFrame({
+            'campaign_id': ids,
+            'campaign_name': 'Campaign ' + pd.Series(ids).astype(str),
+            'start_date': first,
+            'end_date': last,
+            'channel': np.asarray(CAMPAIGN_CHANNELS, dtype=object)[rng.integers(0, len(CAMPAIGN_CHANNELS), len(ids))],
+        })
+
+
+def generate_orders(counts, seed, chunk_size, start, end):
+    """Orders and their items, in order_date order.
+
+    Order ids are assigned in date order across the whole range, so chunks
+    are also contiguous in time, like an OLTP table that grows over time.
+    """
+    n_orders = counts['orders']
+    n_days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+    next_item_id = 1
+    for index, begin, stop in chunk_bounds(n_orders, chunk_size):
+        rng = chunk_rng(seed, 'orders', index)
+        size = stop - begin
+        positions = np.arange(begin, stop)
+        day = ((positions + rng.random(size)) * n_days / n_orders).astype(np.int64)
+        order_date = pd.Timestamp(start) + pd.to_timedelta(day, unit='D')
+        status = weighted_choice(rng, ORDER_STATUSES, ORDER_STATUS_WEIGHTS, size)
+        delivery_date = order_date + pd.to_timedelta(rng.integers(1, 11, size), unit='D')
+        delivery_date = delivery_date.where(status != 'canceled')
+        order_ids = positions + ID_OFFSETS['orders'] + 1
+        yield 'orders', pd.DataFrame({
+            'order_id': order_ids,
+            'customer_id': skewed_ids(rng, 'customers', counts['customers'], CUSTOMER_SKEW, size),
+            'seller_id': skewed_ids(rng, 'sellers', counts['sellers'], SELLER_SKEW, size),
+            'order_date': order_date,
+            'delivery_date': delivery_date,
+            'status': status,
+        })
+
+        items_per_order = 1 + rng.poisson(ITEMS_PER_ORDER, size)
+        n_items = int(items_per_order.sum())
+        product_ids = skewed_ids(rng, 'products', counts['products'], PRODUCT_SKEW, n_items)
+        _, unit_price, _ = product_attributes(product_ids)
+        discounted = rng.random(n_items) < 0.4
+        discount = np.where(discounted, np.round(unit_price * rng.uniform(0.02, 0.2, n_items)), 0.0)
+        yield 'order_items', pd.DataFrame({
+            'order_item_id': np.arange(next_item_id, next_item_id + n_items),
+            'order_id': np.repeat(order_ids, items_per_order),
+            'product_id': product_ids,
+            'quantity': 1 + rng.poisson(0.3, n_items),
+            'unit_price': unit_price,
+            'discount': discount,
+            'tax': np.round((unit_price - discount) * 0.18, 2),
+        })
+        next_item_id += n_items
+
+
+def generate_inventory(counts, seed, chunk_size, start, end):
+    """Stock snapshots for every product in 1-3 warehouses."""
+    n_warehouses = max(3, int(math.ceil(WAREHOUSES_PER_SF * counts['orders'] / SF1_ROWS['orders'])))
+    products_per_chunk = max(1, chunk_size // (2 * INVENTORY_SNAPSHOTS))
+    next_inventory_id = 1
+    range_seconds = int((pd.Timestamp(end) - pd.Timestamp(start)).total_seconds())
+    for index, begin, stop in chunk_bounds(counts['products'], products_per_chunk):
+        rng = chunk_rng(seed, 'inventory', index)
+        product_ids = np.arange(begin, stop) + ID_OFFSETS['products'] + 1
+        warehouse_count = rng.integers(1, 4, len(product_ids))
+        product_ids = np.repeat(product_ids, warehouse_count)
+        warehouse_ids = rng.integers(1, n_warehouses + 1, len(product_ids)) + ID_OFFSETS['warehouses']
+        # Duplicate product/warehouse draws collapse to one location
+        locations = pd.DataFrame({'product_id': product_ids, 'warehouse_id': warehouse_ids}).drop_duplicates()
+        locations = locations.loc[locations.index.repeat(INVENTORY_SNAPSHOTS)].reset_index(drop=True)
+        size = len(locations)
+        last_updated = pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, range_seconds, size), unit='s')
+        locations['stock_available'] = rng.integers(0, 500, size)
+        locations['stock_threshold'] = rng.integers(5, 50, size)
+        locations['restock_date'] = (last_updated - pd.to_timedelta(rng.integers(0, 30, size), unit='D')).normalize()
+        locations['last_updated'] = last_updated
+        locations = locations.sort_values(['product_id', 'warehouse_id', 'last_updated'], kind='stable')
+        locations.insert(0, 'inventory_id', np.arange(next_inventory_id, next_inventory_id + size))
+        next_inventory_id += size
+        yield 'inventory', locations
+
+
+def generate_campaign_performance(counts, seed, chunk_size, start, end):
+    """Daily per-customer campaign metrics, unique on (campaign_id, customer_id, date)."""
+    n_campaigns = counts['marketing_campaigns']
+    mean_days = 37  # mean campaign length in campaign_dates()
+    reach_per_day = max(1.0, counts['campaign_performance'] / (n_campaigns * mean_days))
+    campaigns_per_chunk = max(1, int(chunk_size // (mean_days * reach_per_day)))
+    for index, begin, stop in chunk_bounds(n_campaigns, campaigns_per_chunk):
+        rng = chunk_rng(seed, 'campaign_performance', index)
+        campaign_ids = np.arange(begin, stop) + ID_OFFSETS['marketing_campaigns'] + 1
+        first, last = campaign_dates(campaign_ids, start, end)
+        days = (last - first).days.to_numpy() + 1
+        day_campaign = np.repeat(campaign_ids, days)
+        day_offset = np.arange(days.sum()) - np.repeat(np.cumsum(days) - days, days)
+        day_date = np.repeat(first.to_numpy(), days) + pd.to_timedelta(day_offset, unit='D').to_numpy()
+        reach = rng.poisson(reach_per_day, len(day_campaign))
+        size = int(reach.sum())
+        df = pd.DataFrame({
+            'campaign_id': np.repeat(day_campaign, reach),
+            'customer_id': skewed_ids(rng, 'customers', counts['customers'], CUSTOMER_SKEW, size),
+            'date': np.repeat(day_date, reach),
+        }).drop_duplicates(['campaign_id', 'customer_id', 'date'], ignore_index=True)
+        size = len(df)
+        df['impressions'] = 1 + rng.poisson(20, size)
+        df['clicks'] = rng.binomial(df['impressions'], 0.08)
+        df['conversions'] = rng.binomial(df['clicks'], 0.1)
+        df['cost_spent'] = np.round(df['impressions'] * rng.uniform(0.5, 3.0, size), 2)
+        yield 'campaign_performance', df
+
+
+def generate_cart_events(counts, seed, chunk_size, start, end):
+    """Cart events in event_time order; each chunk covers the next slice of time."""
+    n_events = counts['cart_events']
+    range_start = pd.Timestamp(start)
+    range_seconds = (pd.Timestamp(end) + pd.Timedelta(days=1) - range_start).total_seconds()
+    for index, begin, stop in chunk_bounds(n_events, chunk_size):
+        rng = chunk_rng(seed, 'cart_events', index)
+        size = stop - begin
+        offsets = np.sort(rng.uniform(begin, stop, size)) * range_seconds / n_events
+        yield 'cart_events', pd.DataFrame({
+            'cart_event_id': np.arange(begin, stop) + 1,
+            'customer_id': skewed_ids(rng, 'customers', counts['customers'], CUSTOMER_SKEW, size),
+            'product_id': skewed_ids(rng, 'products', counts['products'], PRODUCT_SKEW, size),
+            'event_time': range_start + pd.to_timedelta(offsets.astype(np.int64), unit='s'),
+            'event_type': weighted_choice(rng, CART_EVENT_TYPES, CART_EVENT_WEIGHTS, size),
+            'quantity': 1 + rng.poisson(0.3, size),
+        })
+
+
+# Generators in FK order; generate_orders also produces order_items
+GENERATORS = [
+    generate_customers,
+    generate_sellers,
+    generate_products,
+    generate_marketing_campaigns,
+    generate_orders,
+    generate_inventory,
+    generate_campaign_performance,
+    generate_cart_events,
+]
+
+
+def generate_all(scale, seed=DEFAULT_SEED, chunk_size=DEFAULT_CHUNK_SIZE, start=DEFAULT_START_DATE, end=DEFAULT_END_DATE):
+    """Yield (table, DataFrame) chunks for every table, referenced tables first."""
+    counts = get_row_counts(scale)
+    for generator in GENERATORS:
+        yield from generator(counts, seed, chunk_size, start, end)
+
+
+# --- sinks -------------------------------------------------------------------
+
+def format_dates(table, df):
+    """Render DATE columns as YYYY-MM-DD for text output."""
+    for col in DATE_COLUMNS.get(table, []):
+        df[col] = df[col].dt.strftime('%Y-%m-%d')
+    return df
+
+
+class CsvSink:
+    """Appends chunks to one <table>.csv file per table."""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.started = set()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write(self, table, df):
+        path = os.path.join(self.output_dir, f"{table}.csv")
+        first = table not in self.started
+        format_dates(table, df).to_csv(path, mode='w' if first else 'a', header=first, index=False)
+        self.started.add(table)
+
+    def close(self):
+        pass
+
+
+class ParquetSink:
+    """Appends chunks as row groups of one <table>.parquet file per table."""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.writers = {}
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write(self, table, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        arrow_table = pa.Table.from_pandas(df, preserve_index=False)
+        for col in DATE_COLUMNS.get(table, []):
+            i = arrow_table.schema.get_field_index(col)
+            arrow_table = arrow_table.set_column(i, col, arrow_table.column(col).cast(pa.date32()))
+        if table not in self.writers:
+            path = os.path.join(self.output_dir, f"{table}.parquet")
+            self.writers[table] = pq.ParquetWriter(path, arrow_table.schema, compression='zstd')
+        self.writers[table].write_table(arrow_table)
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+
+class PostgresSink:
+    """COPYs chunks straight into the OLTP database, committing once per table."""
+
+    def __init__(self, db_config):
+        self.conn = get_connection(db_config)
+        self.cursor = self.conn.cursor()
+        self.current_table = None
+
+    def write(self, table, df):
+        if table != self.current_table:
+            self.conn.commit()
+            self.current_table = table
+        buffer = io.StringIO()
+        format_dates(table, df).to_csv(buffer, header=False, index=False)
+        buffer.seek(0)
+        copy_query = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+            sql.Identifier(table),
+            sql.SQL(',').join(map(sql.Identifier, df.columns))
+        )
+        self.cursor.copy_expert(copy_query.as_string(self.cursor), buffer)
+
+    def close(self):
+        self.conn.commit()
+        self.cursor.close()
+        self.conn.close()
+
+
+def get_sink(output_format, output_dir):
+    if output_format == 'csv':
+        return CsvSink(output_dir)
+    if output_format == 'parquet':
+        return ParquetSink(output_dir)
+    if output_format == 'postgres':
+        db_config = PIPELINE_CONFIG['oltp_db'].copy()
+        db_config["database"] = "ecommerce"
+        return PostgresSink(db_config)
+    raise ValueError(f"Unknown output format: {output_format}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic OLTP data at a given scale factor")
+    parser.add_argument('--scale', type=float, default=1,
+                        help="Scale factor: 1, 10 and 100 are the reference sizes (~1M orders at SF1)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--format', choices=['csv', 'parquet', 'postgres'], default='csv')
+    parser.add_argument('--output-dir', help="Output directory for csv/parquet (default: project_setup/data/generated/sf<scale>)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per generated chunk")
+    parser.add_argument('--start-date', default=DEFAULT_START_DATE)
+    parser.add_argument('--end-date', default=DEFAULT_END_DATE)
+    args = parser.parse_args()
+
+    output_dir = args.output_dir or os.path.join(DATA_DIR, 'generated', f"sf{args.scale:g}")
+    sink = get_sink(args.format, output_dir)
+    rows = {}
+    start = time.perf_counter()
+    try:
+        for table, df in generate_all(args.scale, args.seed, args.chunk_size, args.start_date, args.end_date):
+            rows[table] = rows.get(table, 0) + len(df)
+            sink.write(table, df)
+    finally:
+        sink.close()
+    elapsed = time.perf_counter() - start
+
+    for table in TABLE_LOAD_ORDER:
+        print(f"{table:<22}{rows.get(table, 0):>12}")
+    total = sum(rows.values())
+    print(f"Generated {total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/sec)"
+          + (f" into {output_dir}" if args.format != 'postgres' else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,10 @@
 import os
 import sys
-import csv
+import time
+import argparse
 import psycopg2
 from psycopg2 import sql
-import yaml
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 # Add project root to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
@@ -12,6 +12,8 @@ from common.config import PIPELINE_CONFIG
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
 
+DEFAULT_WORKERS = 4
+
 # Define table load order based on foreign key dependencies
 TABLE_LOAD_ORDER = [
     'customers',
@@ -25,57 +27,190 @@ TABLE_LOAD_ORDER = [
     'cart_events',
 ]
 
+# Tables referenced by each table's foreign keys (see project_setup/sql).
+# A table is loaded as soon as every table it references has been loaded,
+# so independent tables are copied concurrently.
+TABLE_DEPENDENCIES = {
+    'customers': [],
+    'sellers': [],
+    'products': [],
+    'marketing_campaigns': [],
+    'orders': ['customers', 'sellers'],
+    'order_items': ['orders', 'products'],
+    'inventory': ['products'],
+    'campaign_performance': ['marketing_campaigns', 'customers'],
+    'cart_events': ['customers', 'products'],
+}
+
+
+def get_connection(db_config):
+    conn = psycopg2.connect(
+        host=db_config['host'],
+        port=db_config['port'],
+        database=db_config['database'],
+        user=db_config['user'],
+        password=db_config['password']
+    )
+    with conn.cursor() as cur:
+        # Each table commits once at the end of its COPY, so losing the last
+        # few milliseconds on a crash only means reloading that table
+        cur.execute("SET synchronous_commit TO off")
+    return conn
+
+
+def get_secondary_indexes(cursor, table_name):
+    """Return (name, definition) of the indexes on a table that do not back a constraint.
+
+    Primary key and unique constraint indexes are kept: foreign keys from
+    other tables depend on them.
+    """
+    cursor.execute(
+        """
+        SELECT i.indexname, i.indexdef
+        FROM pg_indexes i
+        WHERE i.schemaname = current_schema()
+          AND i.tablename = %s
+          AND NOT EXISTS (
+              SELECT 1 FROM pg_constraint c
+              WHERE c.conrelid = %s::regclass AND c.conname = i.indexname
+          )
+        """,
+        (table_name, table_name)
+    )
+    return cursor.fetchall()
+
+
+def drop_indexes(cursor, table_name):
+    indexes = get_secondary_indexes(cursor, table_name)
+    for index_name, _ in indexes:
+        cursor.execute(sql.SQL("DROP INDEX {}").format(sql.Identifier(index_name)))
+    if indexes:
+        print(f"Dropped {len(indexes)} indexes on {table_name}.")
+    return indexes
+
+
+def recreate_indexes(cursor, table_name, indexes):
+    for _, index_def in indexes:
+        cursor.execute(index_def)
+    if indexes:
+        print(f"Rebuilt {len(indexes)} indexes on {table_name}.")
+
 
 def load_csv_to_table(cursor, table_name, csv_path):
-    with open(csv_path, newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        rows = list(reader)
-        if not rows:
+    """Stream a CSV file into a table with COPY FROM STDIN.
+
+    The column list is taken from the CSV header, so files may list columns
+    in any order. Returns the number of rows copied.
+    """
+    with open(csv_path, 'rb') as csvfile:
+        header = csvfile.readline().decode('utf-8-sig').strip()
+        if not header:
             print(f"No data in {csv_path}, skipping.")
-            return
-        columns = rows[0].keys()
-        placeholders = ','.join(['%s'] * len(columns))
-        insert_query = sql.SQL("INSERT INTO {} ({}) VALUES ({})").format(
+            return 0
+        columns = [col.strip() for col in header.split(',')]
+        copy_query = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
             sql.Identifier(table_name),
-            sql.SQL(',').join(map(sql.Identifier, columns)),
-            sql.SQL(placeholders)
+            sql.SQL(',').join(map(sql.Identifier, columns))
         )
-        values = [tuple(row[col] for col in columns) for row in rows]
-        cursor.executemany(insert_query.as_string(cursor), values)
-        print(f"Loaded {len(rows)} rows into {table_name}.")
+        cursor.copy_expert(copy_query.as_string(cursor), csvfile, size=1024 * 1024)
+    return cursor.rowcount
+
+
+def load_table(db_config, table_name, csv_path, rebuild_indexes=False):
+    """Load one table in its own connection and transaction.
+
+    Returns (rows, seconds). When ``rebuild_indexes`` is set, secondary
+    indexes are dropped before the COPY and rebuilt afterwards, inside the
+    same transaction.
+    """
+    conn = get_connection(db_config)
+    try:
+        with conn.cursor() as cur:
+            start = time.perf_counter()
+            indexes = drop_indexes(cur, table_name) if rebuild_indexes else []
+            rows = load_csv_to_table(cur, table_name, csv_path)
+            recreate_indexes(cur, table_name, indexes)
+        conn.commit()
+        return rows, time.perf_counter() - start
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def load_tables(db_config, data_files, workers=DEFAULT_WORKERS, rebuild_indexes=False):
+    """Load every table with a CSV file, in parallel where foreign keys allow.
+
+    Tables without a CSV file are skipped and treated as already loaded.
+    Raises the first load error after the tables already running have finished.
+    """
+    tables = [t for t in TABLE_LOAD_ORDER if t in data_files]
+    for table_name in TABLE_LOAD_ORDER:
+        if table_name not in data_files:
+            print(f"No CSV file for table {table_name}, skipping.")
+
+    pending = list(tables)
+    loaded = set()
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        running = {}
+        while pending or running:
+            for table_name in list(pending):
+                dependencies = [d for d in TABLE_DEPENDENCIES.get(table_name, []) if d in tables]
+                if all(d in loaded for d in dependencies):
+                    pending.remove(table_name)
+                    print(f"Loading {data_files[table_name]} into {table_name}...")
+                    future = executor.submit(load_table, db_config, table_name, data_files[table_name], rebuild_indexes)
+                    running[future] = table_name
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                table_name = running.pop(future)
+                try:
+                    rows, seconds = future.result()
+                except Exception as e:
+                    # Start nothing new; let the tables already loading finish
+                    pending.clear()
+                    wait(running)
+                    raise RuntimeError(f"Error loading {data_files[table_name]} into {table_name}: {e}") from e
+                loaded.add(table_name)
+                results[table_name] = (rows, seconds)
+                print(f"Loaded {rows} rows into {table_name} in {seconds:.2f}s "
+                      f"({rows / seconds if seconds else 0:,.0f} rows/sec).")
+    return results
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Bulk load the CSV seed data into the OLTP database")
+    parser.add_argument('--data-dir', default=DATA_DIR, help="Directory containing <table>.csv files")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f"Maximum number of tables loaded concurrently (default: {DEFAULT_WORKERS})")
+    parser.add_argument('--drop-indexes', action='store_true',
+                        help="Drop secondary indexes before loading each table and rebuild them afterwards")
+    args = parser.parse_args()
+
     # Get database configuration
     db_config = PIPELINE_CONFIG['oltp_db'].copy()
     db_config["database"] = "ecommerce"  # Ensure we're using the ecommerce database
-    
+
     # Get list of CSV files to load
-    data_files = {f.replace('.csv', ''): os.path.join(DATA_DIR, f) 
-                 for f in os.listdir(DATA_DIR) if f.endswith('.csv')}
-    
-    # Connect to the database
-    with psycopg2.connect(
-        host=db_config['host'],
-        port=db_config['port'],
-        database=db_config['database'],
-        user=db_config['user'],
-        password=db_config['password']
-    ) as conn:
-        with conn.cursor() as cur:
-            for table_name in TABLE_LOAD_ORDER:
-                if table_name not in data_files:
-                    print(f"No CSV file for table {table_name}, skipping.")
-                    continue
-                csv_path = data_files[table_name]
-                print(f"Loading {csv_path} into {table_name}...")
-                try:
-                    load_csv_to_table(cur, table_name, csv_path)
-                except Exception as e:
-                    print(f"Error loading {csv_path} into {table_name}: {e}")
-                    conn.rollback()
-                    sys.exit(1)
-            conn.commit()
+    data_files = {f.replace('.csv', ''): os.path.join(args.data_dir, f)
+                 for f in os.listdir(args.data_dir) if f.endswith('.csv')}
+
+    start = time.perf_counter()
+    try:
+        results = load_tables(db_config, data_files, workers=args.workers, rebuild_indexes=args.drop_indexes)
+    except Exception as e:
+        print(e)
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+
+    total_rows = sum(rows for rows, _ in results.values())
+    print(f"\n{'table':<22}{'rows':>12}{'seconds':>10}{'rows/sec':>14}")
+    for table_name, (rows, seconds) in results.items():
+        print(f"{table_name:<22}{rows:>12}{seconds:>10.2f}{rows / seconds if seconds else 0:>14,.0f}")
+    print(f"{'total':<22}{total_rows:>12}{elapsed:>10.2f}{total_rows / elapsed if elapsed else 0:>14,.0f}")
     print("All data loaded successfully.")
 
 